@@ -0,0 +1,235 @@
+"""Benchmark a bulk campaign end to end against a fake bot.
+
+For each sheet size a synthetic contact workbook is pushed through the real
+dashboard routes, with benchmarks/fake_bot.py answering the bridge in place
+of WhatsApp:
+
+- parse: ``/upload_excel`` until its job finishes (read, normalise, seed);
+- validate: the background registration check with the bot;
+- send: ``/start_bulk_messaging`` until the campaign finishes, polling
+  ``/get_progress`` meanwhile (its latency is reported too);
+- persist: time spent writing statuses into the workbook during the send,
+  and the ``/download_excel`` that follows.
+
+Each size runs in its own process so peak RSS is per size. Sending isn't
+rate limited unless ``--rate`` is given. Results are stored and compared
+with the last run of the same parameters (see bench_results).
+
+    python benchmarks/bench_bulk_send.py
+    python benchmarks/bench_bulk_send.py --sizes 1000 20000 --send-latency 0.01
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+import bench_results  # noqa: E402
+
+STAGES = ('parse', 'validate', 'send', 'persist', 'download')
+POLL_SECONDS = 0.05
+
+
+def generate_contacts(path, rows):
+    """A sheet of ``rows`` pending contacts with some duplicate and invalid numbers."""
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Name", "Phone Number"])
+    for i in range(rows):
+        if i % 50 == 49:
+            number = "12345"
+        elif i % 50 == 48:
+            number = f"+52 1 55 {i - 1:08d}"
+        else:
+            number = f"+52 1 55 {i:08d}"
+        sheet.append([f"Contact {i}", number])
+    workbook.save(path)
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def start_fake_bot(args):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_bot.py'), '--port', '0',
+         '--send-latency', str(args.send_latency), '--check-latency', str(args.check_latency),
+         '--not-registered', str(args.not_registered), '--errors', str(args.errors)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def wait_for(check, timeout):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Benchmark stage didn't finish in time")
+        time.sleep(POLL_SECONDS)
+
+
+def run_size(args):
+    """Measure one sheet size in this process; prints the result as JSON."""
+    rows = args.child
+    workdir = tempfile.mkdtemp(prefix='bench_bulk_send_')
+    bot, port = start_fake_bot(args)
+    os.environ.update({
+        'BOT_BRIDGE_PORT': str(port),
+        'SEND_RATE_PER_MINUTE': str(args.rate or 6e7),
+        'SEND_BURST': '1' if args.rate else '1000000',
+        'LOG_LEVEL': 'WARNING',
+        # The simulated send failures would log an error each
+        'LOG_LEVELS': 'socketio.server=WARNING,dashboard=CRITICAL',
+        'BOT_PING_INTERVAL': '0',
+    })
+    os.chdir(workdir)
+    try:
+        sheet_path = os.path.join(workdir, 'contacts.xlsx')
+        generate_contacts(sheet_path, rows)
+
+        sys.path.insert(0, REPO_ROOT)
+        import dashboard  # noqa: E402  (imports after chdir so state lands in workdir)
+        from campaign_store import WORKBOOK_SAVE_SECONDS  # noqa: E402
+        from campaign_scheduler import FINISHED_STATES  # noqa: E402
+
+        # Serve files from the scratch directory instead of the checkout
+        dashboard.app.root_path = workdir
+        dashboard.set_bot_connected_flag(True)
+        client = dashboard.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+
+        # Time the validation thread that parsing starts
+        validation = {}
+        validate = dashboard.validate_campaign_numbers
+
+        def timed_validate(file_path):
+            started = time.perf_counter()
+            validate(file_path)
+            validation['seconds'] = time.perf_counter() - started
+        dashboard.validate_campaign_numbers = timed_validate
+
+        result = {'rows': rows, 'seconds': {}, 'peak_rss_mib': {}}
+
+        def stage_done(name, seconds):
+            result['seconds'][name] = seconds
+            result['peak_rss_mib'][name] = peak_rss_mib()
+
+        started = time.perf_counter()
+        with open(sheet_path, 'rb') as f:
+            upload = client.post('/upload_excel', data={'excel_file': (f, 'contacts.xlsx')},
+                                 content_type='multipart/form-data').get_json()
+        assert upload['success'], upload
+        job_url = f"/jobs/{upload['job_id']}"
+        wait_for(lambda: client.get(job_url).get_json()['state'] in ('succeeded', 'failed'),
+                 args.timeout)
+        job = client.get(job_url).get_json()
+        assert job['state'] == 'succeeded', job
+        stage_done('parse', time.perf_counter() - started)
+
+        wait_for(lambda: 'seconds' in validation, args.timeout)
+        stage_done('validate', validation['seconds'])
+
+        saves_before = WORKBOOK_SAVE_SECONDS.totals()
+        started = time.perf_counter()
+        start = client.post('/start_bulk_messaging', json={
+            'filename': upload['filename'], 'message': 'Hello {name}'}).get_json()
+        assert start['success'], start
+        campaign = dashboard.campaign_scheduler.get(start['campaign_id'])
+        progress_ms = []
+
+        def campaign_finished():
+            polled = time.perf_counter()
+            client.get(f"/get_progress/{upload['filename']}")
+            progress_ms.append((time.perf_counter() - polled) * 1000)
+            return campaign.state in FINISHED_STATES
+        wait_for(campaign_finished, args.timeout)
+        send_seconds = time.perf_counter() - started
+        saves_after = WORKBOOK_SAVE_SECONDS.totals()
+        stage_done('send', send_seconds)
+        result['peak_rss_mib']['persist'] = peak_rss_mib()
+        result['seconds']['persist'] = saves_after[1] - saves_before[1]
+        result['workbook_saves'] = saves_after[0] - saves_before[0]
+
+        started = time.perf_counter()
+        response = client.get(f"/download_excel/{upload['filename']}")
+        response.get_data()
+        assert response.status_code == 200, response.status_code
+        stage_done('download', time.perf_counter() - started)
+
+        progress_ms.sort()
+        result['get_progress_ms'] = {
+            'p50': progress_ms[len(progress_ms) // 2],
+            'max': progress_ms[-1],
+        }
+        result['campaign_state'] = campaign.state
+        result['progress'] = client.get(f"/get_progress/{upload['filename']}").get_json()
+        print(json.dumps(result), flush=True)
+    finally:
+        bot.terminate()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--send-latency", type=float, default=0.002,
+                        help="seconds the fake bot takes per send")
+    parser.add_argument("--check-latency", type=float, default=0.01,
+                        help="seconds the fake bot takes per check_numbers batch")
+    parser.add_argument("--not-registered", type=float, default=0.05)
+    parser.add_argument("--errors", type=float, default=0.01)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="SEND_RATE_PER_MINUTE (default: unlimited)")
+    parser.add_argument("--timeout", type=float, default=3600)
+    parser.add_argument("--no-save", action="store_true", help="don't store the results")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_size(args)
+        return
+
+    params = {key: getattr(args, key) for key in
+              ('sizes', 'send_latency', 'check_latency', 'not_registered', 'errors', 'rate')}
+    child_args = [arg for arg in sys.argv[1:] if arg != '--no-save']
+    values = {}
+    print(f"{'rows':>8} {'stage':>9} {'seconds':>9} {'peak RSS MiB':>13}")
+    for rows in args.sizes:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(rows)] + child_args,
+            check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for stage in STAGES:
+            seconds = result['seconds'][stage]
+            print(f"{rows:>8} {stage:>9} {seconds:>9.3f} {result['peak_rss_mib'][stage]:>13.1f}")
+            values[f'{rows}.{stage}_seconds'] = round(seconds, 4)
+        values[f'{rows}.peak_rss_mib'] = round(max(result['peak_rss_mib'].values()), 1)
+        values[f'{rows}.get_progress_p50_ms'] = round(result['get_progress_ms']['p50'], 3)
+        progress = result['progress']
+        print(f"{rows:>8} {'':>9} {result['campaign_state']}, "
+              f"{result['workbook_saves']} workbook saves, get_progress p50 "
+              f"{result['get_progress_ms']['p50']:.2f} ms, sent {progress['success_count']}, "
+              f"failed {progress['fail_count']}, "
+              f"not on WhatsApp {progress['not_on_whatsapp_count']}")
+
+    run = {'values': values}
+    bench_results.compare(run, bench_results.previous('bulk_send', params))
+    if not args.no_save:
+        bench_results.record('bulk_send', params, values)
+
+
+if __name__ == "__main__":
+    main()
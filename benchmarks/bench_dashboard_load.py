@@ -0,0 +1,280 @@
+"""Load test the dashboard with many simulated browser sessions.
+
+Starts the dashboard on a local gevent server (or targets ``--url``) and
+runs ``--clients`` simulated dashboards for ``--duration`` seconds. Each one
+logs in, holds a Socket.IO connection (Engine.IO long-polling, answering
+pings) and polls the JSON endpoints the page polls, one request every
+``--interval`` seconds. Meanwhile a bulk campaign of ``--campaign-rows``
+contacts runs against benchmarks/fake_bot.py, and every client subscribes
+to its progress events.
+
+Reports request latency percentiles per endpoint, errors, throughput,
+Socket.IO events received, and the server's peak RSS when it runs in this
+process. Results are stored and compared with the last run of the same
+parameters (see bench_results).
+
+    python benchmarks/bench_dashboard_load.py
+    python benchmarks/bench_dashboard_load.py --clients 200 --duration 60
+    python benchmarks/bench_dashboard_load.py --url http://127.0.0.1:8080 --campaign-rows 0
+"""
+from gevent import monkey
+monkey.patch_all(ssl=False)
+
+import argparse  # noqa: E402
+import collections  # noqa: E402
+import http.client  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import random  # noqa: E402
+import shutil  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import urllib.parse  # noqa: E402
+
+import gevent  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+import bench_results  # noqa: E402
+from bench_bulk_send import generate_contacts, peak_rss_mib, start_fake_bot  # noqa: E402
+
+ENDPOINTS = ('/bot_status', '/campaigns', '/system_info', '/get_ignore_list')
+# Engine.IO v4 joins the packets of one polling response with this separator
+PACKET_SEPARATOR = '\x1e'
+
+
+def endpoint_name(endpoint):
+    """/get_progress/<file> and the like are reported under their first segment."""
+    return endpoint.strip('/').split('/', 1)[0]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.events = collections.Counter()
+        self.socket_clients = 0
+
+    def percentile(self, values, fraction):
+        return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class DashboardClient:
+    """One browser tab: a login cookie, HTTP polling and a Socket.IO connection."""
+
+    def __init__(self, host, port, stats):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.cookie = None
+
+    def _connection(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def request(self, connection, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, data
+
+    def login(self, username, password):
+        connection = self._connection()
+        body = urllib.parse.urlencode({'username': username, 'password': password})
+        status, _ = self.request(connection, 'POST', '/login', body,
+                                 {'Content-Type': 'application/x-www-form-urlencoded'})
+        connection.close()
+        if status != 302:
+            raise RuntimeError(f"Login failed with status {status}")
+
+    def poll_endpoints(self, endpoints, interval, until):
+        connection = self._connection()
+        # Spread the clients out instead of polling in lockstep
+        gevent.sleep(random.uniform(0, interval))
+        while time.monotonic() < until:
+            endpoint = random.choice(endpoints)
+            started = time.perf_counter()
+            try:
+                status, _ = self.request(connection, 'GET', endpoint)
+            except (OSError, http.client.HTTPException):
+                self.stats.errors[endpoint] += 1
+                connection.close()
+                connection = self._connection()
+                continue
+            elapsed = time.perf_counter() - started
+            if status != 200:
+                self.stats.errors[endpoint] += 1
+            self.stats.latencies[endpoint_name(endpoint)].append(elapsed * 1000)
+            gevent.sleep(interval)
+        connection.close()
+
+    def socket_session(self, campaign_id, until):
+        connection = self._connection()
+        base = '/socket.io/?EIO=4&transport=polling'
+        try:
+            status, data = self.request(connection, 'GET', base)
+            handshake = json.loads(data.decode()[1:])
+            url = f"{base}&sid={handshake['sid']}"
+            self.request(connection, 'POST', url, '40')
+            self.stats.socket_clients += 1
+            if campaign_id:
+                subscribe = json.dumps(['subscribe_campaign', {'campaign_id': campaign_id}])
+                self.request(connection, 'POST', url, '42' + subscribe)
+            while time.monotonic() < until:
+                status, data = self.request(connection, 'GET', url)
+                if status != 200:
+                    self.stats.errors['socket.io'] += 1
+                    return
+                for packet in data.decode().split(PACKET_SEPARATOR):
+                    if packet == '2':
+                        # Engine.IO ping; a client that doesn't answer is dropped
+                        self.request(connection, 'POST', url, '3')
+                    elif packet.startswith('42'):
+                        self.stats.events[json.loads(packet[2:])[0]] += 1
+            self.request(connection, 'POST', url, '1')
+        except (OSError, ValueError, http.client.HTTPException):
+            self.stats.errors['socket.io'] += 1
+        finally:
+            connection.close()
+
+
+def start_local_server(args, workdir):
+    """Import the dashboard into this process and serve it on a free port."""
+    bot, port = start_fake_bot(args)
+    os.environ.update({
+        'BOT_BRIDGE_PORT': str(port),
+        'SEND_RATE_PER_MINUTE': str(args.rate),
+        'SEND_BURST': '1',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_LEVELS': 'socketio.server=WARNING,dashboard=CRITICAL',
+        'BOT_PING_INTERVAL': '0',
+    })
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    import dashboard  # noqa: E402  (imports after chdir so state lands in workdir)
+    from gevent.pywsgi import WSGIServer
+
+    dashboard.app.root_path = workdir
+    dashboard.set_bot_connected_flag(True)
+    server = WSGIServer(('127.0.0.1', 0), dashboard.app, log=None)
+    server.start()
+    return dashboard, server, bot
+
+
+def start_campaign(dashboard, rows, workdir):
+    """Upload a sheet and start sending it; returns (campaign ID, progress URL)."""
+    client = dashboard.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    path = os.path.join(workdir, 'load_contacts.xlsx')
+    generate_contacts(path, rows)
+    with open(path, 'rb') as f:
+        upload = client.post('/upload_excel', data={'excel_file': (f, 'load_contacts.xlsx')},
+                             content_type='multipart/form-data').get_json()
+    while client.get(f"/jobs/{upload['job_id']}").get_json()['state'] not in (
+            'succeeded', 'failed'):
+        gevent.sleep(0.05)
+    start = client.post('/start_bulk_messaging', json={
+        'filename': upload['filename'], 'message': 'Hello {name}'}).get_json()
+    return start['campaign_id'], f"/get_progress/{upload['filename']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between one client's requests")
+    parser.add_argument("--url", help="an already running dashboard (default: start one here)")
+    parser.add_argument("--username", default=os.environ.get('DASHBOARD_USERNAME'))
+    parser.add_argument("--password", default=os.environ.get('DASHBOARD_PASSWORD'))
+    parser.add_argument("--campaign-rows", type=int, default=1000,
+                        help="contacts in the background campaign (0 for none)")
+    parser.add_argument("--rate", type=float, default=6000,
+                        help="SEND_RATE_PER_MINUTE of the background campaign")
+    parser.add_argument("--send-latency", type=float, default=0.01)
+    parser.add_argument("--check-latency", type=float, default=0.01)
+    parser.add_argument("--not-registered", type=float, default=0.05)
+    parser.add_argument("--errors", type=float, default=0.01)
+    parser.add_argument("--no-save", action="store_true", help="don't store the results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_dashboard_load_')
+    server = bot = None
+    try:
+        endpoints = list(ENDPOINTS)
+        campaign_id = None
+        if args.url:
+            target = urllib.parse.urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+            username, password = args.username, args.password
+        else:
+            dashboard, server, bot = start_local_server(args, workdir)
+            host, port = '127.0.0.1', server.server_port
+            username, password = dashboard.DASHBOARD_USERNAME, dashboard.DASHBOARD_PASSWORD
+            if args.campaign_rows:
+                campaign_id, progress_url = start_campaign(dashboard, args.campaign_rows, workdir)
+                endpoints.append(progress_url)
+
+        stats = Stats()
+        clients = [DashboardClient(host, port, stats) for _ in range(args.clients)]
+        gevent.joinall([gevent.spawn(client.login, username, password) for client in clients],
+                       raise_error=True)
+
+        until = time.monotonic() + args.duration
+        greenlets = []
+        for client in clients:
+            greenlets.append(gevent.spawn(client.socket_session, campaign_id, until))
+            greenlets.append(gevent.spawn(client.poll_endpoints, endpoints, args.interval, until))
+        # Long polls only return on an event or a ping, so don't wait for the last ones
+        gevent.joinall(greenlets, timeout=args.duration + 5)
+        gevent.killall(greenlets)
+
+        values = {}
+        total_requests = sum(len(latencies) for latencies in stats.latencies.values())
+        print(f"{args.clients} clients for {args.duration:.0f}s: {total_requests} requests "
+              f"({total_requests / args.duration:.1f}/s), "
+              f"{stats.socket_clients} Socket.IO connections")
+        print(f"{'endpoint':>16} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+        for name, latencies in sorted(stats.latencies.items()):
+            latencies.sort()
+            p50, p95, p99 = (stats.percentile(latencies, f) for f in (0.5, 0.95, 0.99))
+            errors = sum(count for endpoint, count in stats.errors.items()
+                         if endpoint_name(endpoint) == name)
+            print(f"{name:>16} {len(latencies):>9} {p50:>8.2f} {p95:>8.2f} "
+                  f"{p99:>8.2f} {latencies[-1]:>8.2f} {errors:>7}")
+            values[f'{name}.p50_ms'] = round(p50, 3)
+            values[f'{name}.p95_ms'] = round(p95, 3)
+        values['errors'] = sum(stats.errors.values())
+        print(f"Socket.IO errors: {stats.errors['socket.io']}, events received: "
+              f"{dict(stats.events)}")
+        if server is not None:
+            values['server_peak_rss_mib'] = round(peak_rss_mib(), 1)
+            print(f"Server peak RSS: {values['server_peak_rss_mib']:.1f} MiB")
+
+        params = {key: getattr(args, key) for key in
+                  ('clients', 'duration', 'interval', 'url', 'campaign_rows', 'rate',
+                   'send_latency')}
+        bench_results.compare({'values': values},
+                              bench_results.previous('dashboard_load', params))
+        if not args.no_save:
+            bench_results.record('dashboard_load', params, values)
+    finally:
+        if server is not None:
+            server.stop(timeout=1)
+        if bot is not None:
+            bot.terminate()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
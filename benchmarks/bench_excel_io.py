@@ -0,0 +1,102 @@
+"""Benchmark contact sheet ingestion: full-fidelity cell walk vs streaming.
+
+Generates contact sheets of increasing size and reports wall time and peak
+Python heap for the old ``load_workbook`` + ``sheet.cell`` loop and for what
+an upload does now: stream the rows into a ``CampaignStore`` (``seed``) and
+read its counters (``progress``). The streaming reader's peak should stay
+flat as the sheet grows while the legacy loop grows linearly.
+
+    python benchmarks/bench_excel_io.py
+    python benchmarks/bench_excel_io.py --sizes 1000 10000 --no-legacy
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from campaign_store import CampaignStore  # noqa: E402
+
+
+def generate_sheet(path, rows):
+    """Write a contact sheet with ``rows`` data rows, a fifth already processed."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Name", "Phone Number", "Status"])
+    for i in range(rows):
+        status = "Success" if i % 5 == 0 else None
+        sheet.append([f"Contact {i}", f"+52155{i:08d}", status])
+    workbook.save(path)
+
+
+def legacy_summary(file_path):
+    """The original upload_excel/get_progress loop."""
+    workbook = openpyxl.load_workbook(file_path)
+    sheet = workbook.active
+    total_numbers = 0
+    processed_numbers = 0
+    for row in range(2, sheet.max_row + 1):
+        phone_number = str(sheet.cell(row=row, column=2).value or "")
+        status = str(sheet.cell(row=row, column=3).value or "").strip().lower()
+        if phone_number:
+            total_numbers += 1
+            if status in ["success", "fail", "number doesn't exist on whatsapp"]:
+                processed_numbers += 1
+    return {"total_numbers": total_numbers, "processed_numbers": processed_numbers}
+
+
+def store_summary(file_path):
+    """Seed a fresh campaign store from the sheet and read its counters."""
+    store = CampaignStore(file_path, state_folder=tempfile.mkdtemp(
+        dir=os.path.dirname(file_path)))
+    try:
+        store.seed()
+        return store.progress()
+    finally:
+        store.close()
+
+
+def measure(func, *args):
+    """Return (result, seconds, peak MiB); timing and tracing use separate runs."""
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+
+    # tracemalloc slows allocation-heavy code down a lot, so trace a second run
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--no-legacy", action="store_true",
+                        help="only run the streaming reader")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'reader':>10} {'seconds':>9} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            path = os.path.join(tmp, f"contacts_{rows}.xlsx")
+            generate_sheet(path, rows)
+
+            runs = [("streaming", store_summary)]
+            if not args.no_legacy:
+                runs.append(("legacy", legacy_summary))
+
+            for label, func in runs:
+                result, elapsed, peak = measure(func, path)
+                assert result["total_numbers"] == rows, result
+                print(f"{rows:>8} {label:>10} {elapsed:>9.3f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
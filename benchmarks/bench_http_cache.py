@@ -0,0 +1,114 @@
+"""Measure bytes served for repeated QR code and image polls.
+
+Replays a dashboard polling the QR code once a second and reloading an image
+grid every minute, first the old way (a new ``?t=`` URL and a full download
+every time) and then with the cache headers (stable URLs revalidated with
+If-None-Match). Both replays request the same resources. Also checks that
+Range requests only return the requested bytes.
+
+    python benchmarks/bench_http_cache.py
+    python benchmarks/bench_http_cache.py --polls 600 --images 24
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def body_size(response):
+    return len(response.get_data())
+
+
+# Seconds between reloads of the image grid, in both replays
+IMAGE_RELOAD_EVERY = 60
+
+
+def naive_polls(client, polls, image_urls):
+    """Every poll and grid reload downloads the full file."""
+    served = requests = 0
+    for i in range(polls):
+        served += body_size(client.get(f'/get_qr_code?t={i}'))
+        requests += 1
+        if i % IMAGE_RELOAD_EVERY == 0:
+            for url in image_urls:
+                served += body_size(client.get(url))
+                requests += 1
+    return served, requests
+
+
+def cached_polls(client, polls, image_urls, qr_url):
+    """The same polls and reloads, revalidated with If-None-Match.
+
+    A browser wouldn't even ask again for the immutable images, so
+    revalidating them overstates what caching costs, never what it saves.
+    """
+    served = requests = 0
+    etags = {}
+
+    def fetch(url):
+        headers = {'If-None-Match': etags[url]} if url in etags else {}
+        response = client.get(url, headers=headers)
+        etags[url] = response.headers.get('ETag', etags.get(url))
+        return body_size(response)
+
+    for i in range(polls):
+        served += fetch(qr_url)
+        requests += 1
+        if i % IMAGE_RELOAD_EVERY == 0:
+            for url in image_urls:
+                served += fetch(url)
+                requests += 1
+    return served, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--polls", type=int, default=300,
+                        help="QR polls, one per second (default: 5 minutes)")
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--image-kb", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_http_cache_')
+    os.chdir(workdir)
+    try:
+        import dashboard  # noqa: E402  (imports after chdir so state lands in workdir)
+        from bot_events import BotStateNotifier  # noqa: E402
+
+        # Serve files from the scratch directory instead of the checkout
+        dashboard.app.root_path = workdir
+        client = dashboard.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+
+        with open('qr_code.png', 'wb') as f:
+            f.write(os.urandom(4 * 1024))
+        image_urls = []
+        os.makedirs('pics', exist_ok=True)
+        for i in range(args.images):
+            with open(os.path.join('pics', f'image-{i}.jpg'), 'wb') as f:
+                f.write(os.urandom(args.image_kb * 1024))
+            image_urls.append(f'/pics/image-{i}.jpg')
+
+        qr_url = BotStateNotifier(lambda: (False, True), None).qr_code_url()
+        naive, naive_requests = naive_polls(client, args.polls, image_urls)
+        cached, cached_requests = cached_polls(client, args.polls, image_urls, qr_url)
+        print(f"{args.polls} QR polls, {args.images} x {args.image_kb} KiB images")
+        print(f"  full downloads: {naive / 1024:10.1f} KiB in {naive_requests} requests")
+        print(f"  with caching:   {cached / 1024:10.1f} KiB in {cached_requests} requests "
+              f"({100.0 * cached / naive:.1f}%)")
+
+        response = client.get(image_urls[0], headers={'Range': 'bytes=0-1023'})
+        assert response.status_code == 206 and body_size(response) == 1024
+        print(f"  range request:  {response.status_code}, {body_size(response)} bytes")
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
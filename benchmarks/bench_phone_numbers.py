@@ -0,0 +1,101 @@
+"""Benchmark phone number validation: the original checks vs the normaliser.
+
+Generates a column the way openpyxl returns it (formatted strings, ints and
+floats, some invalid values and repeats) and times:
+
+- the original path (``str()``, ``is_valid_phone_number`` at upload,
+  ``normalize_number`` at send time), which rejects every formatted number
+  and neither dedupes nor produces E.164;
+- ``phone_numbers.normalize_numbers`` over the whole column.
+
+    python benchmarks/bench_phone_numbers.py
+    python benchmarks/bench_phone_numbers.py --sizes 10000 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from phone_numbers import normalize_numbers  # noqa: E402
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def generate_column(size, seed=0):
+    """Mixed cells: formatted text, numeric cells, bad values and repeats."""
+    rng = random.Random(seed)
+    column = []
+    for i in range(size):
+        subscriber = rng.randint(0, 99999999)
+        kind = i % 10
+        if kind < 4:
+            column.append(f"+52 55 {subscriber // 10000:04d}-{subscriber % 10000:04d}")
+        elif kind < 7:
+            column.append(5215500000000 + subscriber)
+        elif kind == 7:
+            column.append(float(525500000000 + subscriber))
+        elif kind == 8:
+            column.append(f"(55) {subscriber:08d}")
+        else:
+            column.append(rng.choice(["", None, "n/a", "123", column[-1]]))
+    return column
+
+
+def is_valid_phone_number(number):
+    """The original upload-time check."""
+    if number.startswith('+'):
+        number = number[1:]
+    return number.isdigit() and 8 <= len(number) <= 15
+
+
+def normalize_number(number):
+    """The original send-time formatting."""
+    digits = _NON_DIGITS.sub('', str(number))
+    if digits.startswith('00'):
+        digits = digits[2:]
+    return digits
+
+
+def legacy_per_cell(column):
+    valid = []
+    for value in column:
+        text = str(value if value is not None else "")
+        valid.append(normalize_number(text) if is_valid_phone_number(text) else None)
+    return valid
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--country-code", default="52")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        column = generate_column(size)
+        legacy, legacy_seconds = measure(legacy_per_cell, column)
+        (numbers, reasons), new_seconds = measure(
+            normalize_numbers, column, args.country_code)
+
+        print(f"{size:>9} cells")
+        print(f"  original:    {legacy_seconds:8.3f}s  "
+              f"{sum(1 for n in legacy if n):>9} accepted")
+        print(f"  normaliser:  {new_seconds:8.3f}s  "
+              f"{sum(1 for n in numbers if n):>9} accepted")
+        rejected = Counter(reason for reason in reasons if reason)
+        print("  rejected: " + ", ".join(
+            f"{reason} {count}" for reason, count in rejected.most_common()))
+
+
+if __name__ == "__main__":
+    main()
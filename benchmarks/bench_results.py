@@ -0,0 +1,84 @@
+"""Stored benchmark results, for spotting regressions between runs.
+
+Each run appends one JSON line to ``benchmarks/results/<benchmark>.jsonl``
+with the time, the git commit, the parameters and the measured values.
+``compare`` prints every value next to the last run with the same
+parameters and flags the ones that got worse by more than the threshold.
+The results directory is not tracked by git.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# Relative change that counts as a regression, unless the absolute change is
+# within the noise floor (50 ms, 0.05 MiB...)
+REGRESSION_THRESHOLD = 0.15
+NOISE_FLOOR = 0.05
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(RESULTS_DIR), timeout=10).decode().strip()
+    except Exception:
+        return None
+
+
+def results_path(benchmark, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, f'{benchmark}.jsonl')
+
+
+def load(benchmark, results_dir=RESULTS_DIR):
+    path = results_path(benchmark, results_dir)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous(benchmark, params, results_dir=RESULTS_DIR):
+    """The last stored run with the same parameters, or None."""
+    for run in reversed(load(benchmark, results_dir)):
+        if run.get('params') == params:
+            return run
+    return None
+
+
+def record(benchmark, params, values, results_dir=RESULTS_DIR):
+    """Append a run; ``values`` maps a name to a number where lower is better."""
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'params': params,
+        'values': values,
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    with open(results_path(benchmark, results_dir), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, sort_keys=True) + '\n')
+    return run
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD, noise_floor=NOISE_FLOOR):
+    """Print current values against ``baseline``; returns the regressed names."""
+    if baseline is None:
+        print("No earlier run with these parameters to compare with")
+        return []
+    print(f"Compared with {baseline['time']} ({baseline.get('commit') or 'unknown commit'}):")
+    regressions = []
+    for name, value in sorted(current['values'].items()):
+        before = baseline['values'].get(name)
+        if not before or value is None:
+            print(f"  {name:<40} {value!s:>12}")
+            continue
+        change = (value - before) / before
+        flag = ''
+        if change > threshold and value - before > noise_floor:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"  {name:<40} {value:>12.4f} {before:>12.4f} {change:>+8.1%}{flag}")
+    return regressions
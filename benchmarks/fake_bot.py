@@ -0,0 +1,134 @@
+"""A stand-in for the Node bot's bridge, with configurable latency.
+
+Speaks the JSON-lines protocol of bridge.js (``ping``, ``check_numbers``,
+``send_message``, ``update_ignore_list``) without WhatsApp, so the bulk send
+path can be measured. Whether a number is "on WhatsApp" or its send fails is
+derived from the number itself, so validation and sending agree and runs
+are repeatable.
+
+Used by the other benchmarks, or on its own in place of ``node index.js``
+while load testing a real dashboard:
+
+    python benchmarks/fake_bot.py --port 8091 --send-latency 0.2
+"""
+import argparse
+import json
+import random
+import socketserver
+import threading
+import time
+import zlib
+
+
+class FakeBot:
+    """Threaded TCP server answering bridge commands after a fake delay."""
+
+    def __init__(self, host='127.0.0.1', port=0, send_latency=0.05, jitter=0.0,
+                 check_latency=0.01, not_registered_ratio=0.05, error_ratio=0.01):
+        self.send_latency = send_latency
+        self.jitter = jitter
+        self.check_latency = check_latency
+        self.not_registered_ratio = not_registered_ratio
+        self.error_ratio = error_ratio
+        self.counts = {'ping': 0, 'check_numbers': 0, 'numbers_checked': 0,
+                       'sent': 0, 'not_registered': 0, 'errors': 0}
+        self._counts_lock = threading.Lock()
+        bot = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    request = json.loads(line)
+                    response = dict(bot.answer(request), id=request.get('id'))
+                    self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-bot')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, name, amount=1):
+        with self._counts_lock:
+            self.counts[name] += amount
+
+    def _fraction(self, number):
+        # A stable value in [0, 1) per number
+        return (zlib.crc32(str(number).encode()) % 10000) / 10000
+
+    def registered(self, number):
+        return self._fraction(number) >= self.not_registered_ratio
+
+    def _delay(self, seconds):
+        if self.jitter:
+            seconds += random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def answer(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'ping':
+            self._count('ping')
+            return {'ok': True}
+        if cmd == 'check_numbers':
+            numbers = request.get('numbers') or []
+            self._delay(self.check_latency)
+            self._count('check_numbers')
+            self._count('numbers_checked', len(numbers))
+            return {'ok': True, 'registered': {n: self.registered(n) for n in numbers}}
+        if cmd == 'send_message':
+            number = request.get('number')
+            self._delay(self.send_latency)
+            if not request.get('skip_check') and not self.registered(number):
+                self._count('not_registered')
+                return {'ok': True, 'status': 'not_registered'}
+            # Failures are picked from the top of the range, apart from unregistered numbers
+            if self._fraction(number) >= 1 - self.error_ratio:
+                self._count('errors')
+                return {'ok': False, 'error': 'Simulated send failure'}
+            self._count('sent')
+            return {'ok': True, 'status': 'success'}
+        if cmd == 'update_ignore_list':
+            return {'ok': True, 'added': request.get('added', []),
+                    'removed': request.get('removed', [])}
+        return {'ok': False, 'error': f"Unknown command: {cmd}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--send-latency", type=float, default=0.05, help="seconds per send")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds per send")
+    parser.add_argument("--check-latency", type=float, default=0.01,
+                        help="seconds per check_numbers batch")
+    parser.add_argument("--not-registered", type=float, default=0.05,
+                        help="share of numbers not on WhatsApp")
+    parser.add_argument("--errors", type=float, default=0.01, help="share of sends that fail")
+    args = parser.parse_args()
+
+    bot = FakeBot(args.host, args.port, args.send_latency, args.jitter, args.check_latency,
+                  args.not_registered, args.errors).start()
+    print(f"Fake bot bridge listening on {bot.host}:{bot.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"  {bot.counts}")
+    except KeyboardInterrupt:
+        bot.stop()
+
+
+if __name__ == "__main__":
+    main()
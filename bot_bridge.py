@@ -0,0 +1,172 @@
+"""JSON-lines command channel to the running WhatsApp bot process.
+
+The Node bot (see bridge.js) listens on a local TCP port and accepts one JSON
+object per line. Every request carries an ``id`` and a ``cmd``; the bot answers
+with one JSON line echoing the ``id`` plus ``ok`` and any result fields.
+"""
+import itertools
+import json
+import logging
+import os
+import select
+import socket
+import threading
+
+BOT_BRIDGE_HOST = os.environ.get('BOT_BRIDGE_HOST', '127.0.0.1')
+BOT_BRIDGE_PORT = int(os.environ.get('BOT_BRIDGE_PORT', '8091'))
+BOT_BRIDGE_TIMEOUT = float(os.environ.get('BOT_BRIDGE_TIMEOUT', '60'))
+
+# Send results reported by the bot
+SEND_SUCCESS = 'success'
+SEND_NOT_REGISTERED = 'not_registered'
+SEND_ERROR = 'error'
+
+# Commands that are harmless to repeat if their answer was lost
+IDEMPOTENT_COMMANDS = {'ping', 'check_numbers', 'update_ignore_list'}
+
+logger = logging.getLogger(__name__)
+
+
+class BotBridgeError(Exception):
+    """Raised when the bot cannot be reached or answers with garbage."""
+
+
+class BotBridge:
+    """Long-lived connection to the bot's command socket.
+
+    Requests are serialised over a single connection; the connection is opened
+    lazily and re-opened if the bot was restarted in the meantime. A request
+    the bot may already have received is only repeated for IDEMPOTENT_COMMANDS,
+    so a lost answer never sends a message twice.
+    """
+
+    def __init__(self, host=BOT_BRIDGE_HOST, port=BOT_BRIDGE_PORT, timeout=BOT_BRIDGE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._reader = sock.makefile('r', encoding='utf-8', newline='\n')
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        for resource in (self._reader, self._sock):
+            if resource is not None:
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+        self._sock = None
+        self._reader = None
+
+    def _stale(self):
+        # A connection the bot closed (e.g. it restarted) reads as EOF right away
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return self._sock.recv(1, socket.MSG_PEEK) == b''
+        except OSError:
+            return True
+
+    def _send(self, payload):
+        if self._sock is not None and self._stale():
+            self._close()
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+
+    def _receive(self, request_id):
+        while True:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError('Bot closed the bridge connection')
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring malformed bridge line: {line!r}")
+                continue
+            # Drop late answers to requests that already timed out
+            if response.get('id') == request_id:
+                return response
+
+    def request(self, cmd, **params):
+        """Send one command and return the bot's decoded response."""
+        payload = dict(params, id=next(self._ids), cmd=cmd)
+        with self._lock:
+            for attempt in range(2):
+                sent = False
+                try:
+                    self._send(payload)
+                    sent = True
+                    return self._receive(payload['id'])
+                except OSError as e:
+                    self._close()
+                    retry = (attempt == 0 and not isinstance(e, socket.timeout)
+                             and (not sent or cmd in IDEMPOTENT_COMMANDS))
+                    if not retry:
+                        raise BotBridgeError(f"Bot bridge request '{cmd}' failed: {str(e)}") from e
+
+    def ping(self):
+        """Return True if the bot answers on the bridge."""
+        try:
+            return bool(self.request('ping').get('ok'))
+        except BotBridgeError:
+            return False
+
+    def check_numbers(self, numbers):
+        """Return {number: registered on WhatsApp} for a batch of numbers."""
+        response = self.request('check_numbers', numbers=list(numbers))
+        if not response.get('ok'):
+            raise BotBridgeError(response.get('error', 'Unknown bot error'))
+        registered = response.get('registered', {})
+        return {number: bool(registered.get(number)) for number in numbers}
+
+    def send_message(self, number, message, media_path=None, skip_check=False,
+                     media_id=None):
+        """Send a text (or captioned image) message.
+
+        ``skip_check`` skips the registration lookup for numbers already known
+        to be on WhatsApp. ``media_id`` names immutable media, letting the bot
+        reuse its encoded payload across recipients. Returns a dict with ``status`` set to one of
+        SEND_SUCCESS, SEND_NOT_REGISTERED or SEND_ERROR, and ``error`` for
+        failures.
+        """
+        params = {'number': number, 'message': message}
+        if media_path:
+            params['media_path'] = os.path.abspath(media_path)
+            if media_id:
+                params['media_id'] = media_id
+        if skip_check:
+            params['skip_check'] = True
+        try:
+            response = self.request('send_message', **params)
+        except BotBridgeError as e:
+            return {'status': SEND_ERROR, 'error': str(e)}
+
+        if not response.get('ok'):
+            return {'status': SEND_ERROR, 'error': response.get('error', 'Unknown bot error')}
+        status = response.get('status')
+        if status not in (SEND_SUCCESS, SEND_NOT_REGISTERED):
+            return {'status': SEND_ERROR, 'error': f"Unexpected send status: {status!r}"}
+        return {'status': status}
+
+    def update_ignore_list(self, added=(), removed=()):
+        """Add and remove ignore list numbers in the bot, which owns the file.
+
+        Returns the (added, removed) numbers that actually changed.
+        """
+        response = self.request('update_ignore_list', added=list(added), removed=list(removed))
+        if not response.get('ok'):
+            raise BotBridgeError(response.get('error', 'Unknown bot error'))
+        return response.get('added', []), response.get('removed', [])
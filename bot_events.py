@@ -0,0 +1,118 @@
+"""Event-driven bot status and QR code notifications.
+
+State changes are pushed the moment they happen: the bot process exiting,
+the bot reporting itself connected/disconnected, or the bot announcing a new
+QR code. A slow file watch on the QR image runs only while the bot is
+connecting, as a fallback for bots that don't announce their QR codes.
+"""
+import logging
+import os
+import threading
+
+from http_cache import file_version
+
+QR_CODE_FILE = 'qr_code.png'
+QR_WATCH_INTERVAL = float(os.environ.get('QR_WATCH_INTERVAL', '2'))
+
+logger = logging.getLogger(__name__)
+
+
+class BotStateNotifier:
+    """Emits ``bot_status`` and ``qr_code`` events when they change.
+
+    ``get_state()`` returns (connected, running); ``emit(event, payload)``
+    broadcasts to all dashboard clients.
+    """
+
+    def __init__(self, get_state, emit, qr_code_file=QR_CODE_FILE,
+                 qr_watch_interval=QR_WATCH_INTERVAL):
+        self.get_state = get_state
+        self.emit = emit
+        self.qr_code_file = qr_code_file
+        self.qr_watch_interval = qr_watch_interval
+        self._last_status = None
+        self._last_qr = None
+        self._lock = threading.Lock()
+        self._qr_watch = None
+
+    def status_payload(self):
+        connected, running = self.get_state()
+        status = 'connected' if connected else 'disconnected'
+        if running and not connected:
+            status = 'connecting'
+        return {
+            'connected': connected,
+            'status': status,
+            'bot_running': running
+        }
+
+    def qr_code_url(self):
+        """QR image URL that only changes when a new QR code is written."""
+        version = file_version(self.qr_code_file)
+        return f'/get_qr_code?v={version}' if version else None
+
+    def qr_payload(self, exists=None):
+        if exists is None:
+            exists = os.path.exists(self.qr_code_file)
+        return {
+            'exists': exists,
+            'qr_code_url': self.qr_code_url() if exists else None,
+            'status': 'waiting_for_scan' if exists else 'no_qr'
+        }
+
+    def publish(self):
+        """Emit the bot status if it changed since the last emit."""
+        payload = self.status_payload()
+        with self._lock:
+            if payload == self._last_status:
+                return
+            self._last_status = payload
+        self.emit('bot_status', payload)
+
+        # Only watch for QR codes while the bot is connecting
+        if payload['status'] == 'connecting':
+            self._start_qr_watch()
+        else:
+            self._stop_qr_watch()
+
+    def publish_qr(self, exists=None):
+        """Emit the QR code availability if it changed since the last emit."""
+        if exists is None:
+            exists = os.path.exists(self.qr_code_file)
+        connected, running = self.get_state()
+        # Only relevant while connecting or once connected
+        if not (connected or running):
+            return
+        with self._lock:
+            # A new QR code replaces the old one, so always announce it
+            if not exists and self._last_qr is False:
+                return
+            self._last_qr = exists
+        self.emit('qr_code', self.qr_payload(exists))
+
+    def _start_qr_watch(self):
+        with self._lock:
+            if self._qr_watch is not None:
+                return
+            stop = self._qr_watch = threading.Event()
+
+        def watch():
+            last_mtime = None
+            while not stop.wait(self.qr_watch_interval):
+                try:
+                    mtime = os.path.getmtime(self.qr_code_file)
+                except OSError:
+                    mtime = None
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    self.publish_qr(mtime is not None)
+
+        watcher = threading.Thread(target=watch, name='qr-code-watcher')
+        watcher.daemon = True
+        watcher.start()
+
+    def _stop_qr_watch(self):
+        with self._lock:
+            stop, self._qr_watch = self._qr_watch, None
+        if stop is not None:
+            stop.set()
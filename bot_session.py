@@ -0,0 +1,154 @@
+"""Teardown of the bot's WhatsApp session for resets.
+
+The session directory is a full Chromium profile and can hold hundreds of
+MB, so a reset doesn't delete it in place. ``retire`` renames it aside (a
+single atomic rename on the same filesystem) so a fresh bot can start at
+once, and a background cleaner deletes the retired tree. The cleaner walks
+the tree itself and pauses every ``SESSION_CLEANUP_BATCH`` entries so that
+under gevent it doesn't hold up requests, and it records how long each
+cleanup took. Trees left behind by an interrupted cleanup are picked up
+again by ``sweep``.
+"""
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+BOT_AUTH_DIR = '.wwebjs_auth'
+# Retired session directories are renamed to <dir><RETIRED_SUFFIX><id>
+RETIRED_SUFFIX = '.retired-'
+SESSION_CLEANUP_BATCH = 200
+# Pause between batches; gevent doesn't run timers or I/O on a sleep(0)
+SESSION_CLEANUP_YIELD_SECONDS = 0.001
+# Renames of a directory still held open by the exiting browser can fail
+# briefly on Windows
+RETIRE_ATTEMPTS = 5
+RETIRE_RETRY_SECONDS = 0.2
+
+logger = logging.getLogger(__name__)
+
+
+def retire(path):
+    """Rename ``path`` aside; returns the new path, or None if it didn't exist."""
+    if not os.path.exists(path):
+        return None
+    retired = f"{path}{RETIRED_SUFFIX}{uuid.uuid4().hex[:12]}"
+    for attempt in range(RETIRE_ATTEMPTS):
+        try:
+            os.rename(path, retired)
+            return retired
+        except PermissionError:
+            if attempt == RETIRE_ATTEMPTS - 1:
+                raise
+            time.sleep(RETIRE_RETRY_SECONDS)
+
+
+class DirectoryCleaner:
+    """Deletes directory trees in a background thread, timing each one."""
+
+    def __init__(self, history=20):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._queued = set()
+        self._history = collections.deque(maxlen=history)
+        self.runs = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+
+    def delete(self, path):
+        """Queue ``path`` for deletion and return at once."""
+        with self._lock:
+            if path in self._queued:
+                return
+            self._queued.add(path)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name='session-cleaner')
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put(path)
+
+    def sweep(self, path):
+        """Queue the retired copies of ``path`` left over from earlier resets."""
+        directory, name = os.path.split(os.path.abspath(path))
+        prefix = name + RETIRED_SUFFIX
+        try:
+            leftovers = [os.path.join(os.path.dirname(path), entry.name)
+                         for entry in os.scandir(directory)
+                         if entry.name.startswith(prefix) and entry.is_dir()]
+        except OSError as e:
+            logger.error(f"Error looking for retired sessions: {str(e)}")
+            return 0
+        for leftover in leftovers:
+            self.delete(leftover)
+        return len(leftovers)
+
+    def stats(self):
+        with self._lock:
+            last = self._history[-1] if self._history else None
+            return {
+                'pending': len(self._queued),
+                'runs': self.runs,
+                'failures': self.failures,
+                'total_seconds': self.total_seconds,
+                'last': last,
+                'recent': list(self._history),
+            }
+
+    def _work(self):
+        while True:
+            path = self._queue.get()
+            started = time.perf_counter()
+            files, errors = self._remove_tree(path)
+            seconds = time.perf_counter() - started
+            with self._lock:
+                self._queued.discard(path)
+                self.runs += 1
+                self.total_seconds += seconds
+                if errors:
+                    self.failures += 1
+                self._history.append({
+                    'path': path,
+                    'seconds': seconds,
+                    'files': files,
+                    'errors': errors,
+                    'finished_at': time.time(),
+                })
+            if errors:
+                logger.warning(f"Removed {path} with {errors} errors in {seconds:.2f}s; "
+                               f"what is left is retried on the next sweep")
+            else:
+                logger.info(f"Removed {path} ({files} files) in {seconds:.2f}s")
+
+    def _remove_tree(self, path):
+        """Delete ``path`` bottom-up, yielding every batch; returns (files, errors)."""
+        files = errors = 0
+        entries = 0
+        for root, dirnames, filenames in os.walk(path, topdown=False):
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(root, filename))
+                    files += 1
+                except OSError:
+                    errors += 1
+                entries += 1
+                if entries % SESSION_CLEANUP_BATCH == 0:
+                    time.sleep(SESSION_CLEANUP_YIELD_SECONDS)
+            for dirname in dirnames:
+                target = os.path.join(root, dirname)
+                try:
+                    # Symlinked directories are listed here but not walked into
+                    if os.path.islink(target):
+                        os.remove(target)
+                    else:
+                        os.rmdir(target)
+                except OSError:
+                    errors += 1
+        try:
+            os.rmdir(path)
+        except OSError:
+            errors += 1
+        return files, errors
@@ -0,0 +1,329 @@
+"""Supervisor for the Node WhatsApp bot process.
+
+The supervisor owns the child process. ``start``, ``stop`` and ``restart``
+only queue a command and return at once; a supervisor thread carries them
+out, stopping the bot with SIGTERM and escalating to SIGKILL after
+``BOT_STOP_TIMEOUT`` seconds. A bot that exits on its own is restarted after
+a backoff that doubles per crash (from ``BOT_RESTART_BACKOFF_INITIAL`` up
+to ``BOT_RESTART_BACKOFF_MAX``) and resets once a run lasts
+``BOT_STABLE_SECONDS``.
+
+While the bot runs it is pinged over the bridge every ``BOT_PING_INTERVAL``
+seconds; after ``BOT_PING_FAILURES`` missed pings in a row it is treated as
+hung and restarted. Its stdout and stderr are still passed through to the
+dashboard's, and the last ``BOT_LOG_LINES`` lines are kept in memory.
+"""
+import collections
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+BOT_COMMAND = ['node', 'index.js']
+BOT_STOP_TIMEOUT = float(os.environ.get('BOT_STOP_TIMEOUT', '5'))
+BOT_RESTART_BACKOFF_INITIAL = float(os.environ.get('BOT_RESTART_BACKOFF_INITIAL', '1'))
+BOT_RESTART_BACKOFF_MAX = float(os.environ.get('BOT_RESTART_BACKOFF_MAX', '60'))
+BOT_STABLE_SECONDS = 60
+BOT_PING_INTERVAL = float(os.environ.get('BOT_PING_INTERVAL', '15'))
+BOT_PING_TIMEOUT = float(os.environ.get('BOT_PING_TIMEOUT', '5'))
+BOT_PING_FAILURES = int(os.environ.get('BOT_PING_FAILURES', '3'))
+# Pings start this long after a start, once the bridge is listening
+BOT_PING_GRACE = 30
+BOT_LOG_LINES = int(os.environ.get('BOT_LOG_LINES', '1000'))
+
+# Supervisor states
+STOPPED = 'stopped'
+RUNNING = 'running'
+STOPPING = 'stopping'
+RESTARTING = 'restarting'
+
+logger = logging.getLogger(__name__)
+
+
+class BotSupervisor:
+    """Starts, stops, watches and restarts the bot process.
+
+    ``ping()`` returns whether the bot answers its liveness check;
+    ``on_change(supervisor)`` is called whenever the state changes.
+    """
+
+    def __init__(self, command=BOT_COMMAND, ping=None, on_change=None,
+                 stop_timeout=BOT_STOP_TIMEOUT,
+                 backoff_initial=BOT_RESTART_BACKOFF_INITIAL,
+                 backoff_max=BOT_RESTART_BACKOFF_MAX,
+                 ping_interval=BOT_PING_INTERVAL, ping_failures=BOT_PING_FAILURES,
+                 ping_grace=BOT_PING_GRACE, log_lines=BOT_LOG_LINES):
+        self.command = command
+        self.ping = ping
+        self.on_change = on_change
+        self.stop_timeout = stop_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.ping_interval = ping_interval
+        self.ping_failures = ping_failures
+        self.ping_grace = ping_grace
+
+        self.state = STOPPED
+        self.restarts = 0
+        self.last_exit_code = None
+        self.last_error = None
+        self.responsive = None
+        self._process = None
+        self._started_at = None
+        # Whether the bot should be running; crashes are restarted only if so
+        self._desired = False
+        self._backoff = backoff_initial
+        self._restart_at = None
+        self._kill_at = None
+        # Set by restart(): start again (after the hook) once the bot exits
+        self._restart_pending = False
+        self._before_start = None
+        self._output = collections.deque(maxlen=log_lines)
+        self._commands = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # Commands; each returns immediately
+
+    def start(self):
+        self._send('start')
+
+    def stop(self):
+        self._send('stop')
+
+    def restart(self, before_start=None):
+        """Stop the bot if it runs, call ``before_start()``, then start it."""
+        self._send('restart', before_start)
+
+    def _send(self, *command):
+        self._ensure_threads()
+        self._commands.put(command)
+
+    def _ensure_threads(self):
+        # Started lazily so importing the app doesn't spawn threads
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='bot-supervisor')
+            self._thread.daemon = True
+            self._thread.start()
+            if self.ping is not None and self.ping_interval > 0:
+                pinger = threading.Thread(target=self._ping_loop, name='bot-pinger')
+                pinger.daemon = True
+                pinger.start()
+
+    # State
+
+    @property
+    def pid(self):
+        process = self._process
+        return process.pid if process is not None and process.poll() is None else None
+
+    def is_running(self):
+        return self.pid is not None
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            'state': self.state,
+            'pid': self.pid,
+            'responsive': self.responsive,
+            'restarts': self.restarts,
+            'uptime': now - self._started_at if self.is_running() else None,
+            'next_restart_in': max(0.0, self._restart_at - now) if self._restart_at else None,
+            'last_exit_code': self.last_exit_code,
+            'last_error': self.last_error,
+        }
+
+    def output(self, lines=None):
+        """The bot's most recent output lines, oldest first."""
+        output = list(self._output)
+        return output[-lines:] if lines else output
+
+    def _set_state(self, state):
+        self.state = state
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(self)
+        except Exception as e:
+            logger.error(f"Error reporting bot state {state}: {str(e)}")
+
+    # Supervisor thread
+
+    def _loop(self):
+        while True:
+            try:
+                command = self._commands.get(timeout=self._next_deadline())
+            except queue.Empty:
+                command = None
+            try:
+                if command is not None:
+                    self._handle(*command)
+                self._run_timers()
+            except Exception as e:
+                logger.error(f"Bot supervisor error: {str(e)}")
+
+    def _next_deadline(self):
+        deadlines = [t for t in (self._restart_at, self._kill_at) if t is not None]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _handle(self, name, *args):
+        if name == 'start':
+            self._desired = True
+            self._backoff = self.backoff_initial
+            if self._process is None:
+                self._restart_at = None
+                self._start_now()
+        elif name == 'stop':
+            self._desired = False
+            self._restart_at = None
+            self._restart_pending = False
+            self._before_start = None
+            self._terminate()
+        elif name == 'restart':
+            self._desired = True
+            self._backoff = self.backoff_initial
+            self._restart_at = None
+            self._before_start = args[0]
+            if self._process is None:
+                self._start_now()
+            else:
+                self._restart_pending = True
+                self._terminate()
+        elif name == 'exited':
+            self._exited(args[0])
+        elif name == 'unresponsive':
+            if args[0] is self._process and self.state == RUNNING:
+                logger.warning(f"Bot (pid {args[0].pid}) stopped answering pings, restarting it")
+                self._terminate()
+
+    def _run_timers(self):
+        now = time.monotonic()
+        if self._kill_at is not None and now >= self._kill_at:
+            self._kill_at = None
+            if self._process is not None and self._process.poll() is None:
+                logger.warning(f"Bot (pid {self._process.pid}) ignored SIGTERM, killing it")
+                self._process.kill()
+        if self._restart_at is not None and now >= self._restart_at:
+            self._restart_at = None
+            self.restarts += 1
+            self._start_now()
+
+    def _start_now(self):
+        before_start, self._before_start = self._before_start, None
+        if before_start is not None:
+            try:
+                before_start()
+            except Exception as e:
+                logger.error(f"Error preparing bot start: {str(e)}")
+        try:
+            process = subprocess.Popen(
+                self.command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            self.last_error = f"Failed to start bot: {str(e)}"
+            logger.error(self.last_error)
+            self._schedule_restart()
+            return
+
+        self._process = process
+        self._started_at = time.monotonic()
+        self.responsive = None
+        self.last_error = None
+        for stream, echo, name in ((process.stdout, sys.stdout, 'stdout'),
+                                   (process.stderr, sys.stderr, 'stderr')):
+            reader = threading.Thread(
+                target=self._capture, args=(stream, echo, name), name=f'bot-{name}')
+            reader.daemon = True
+            reader.start()
+        waiter = threading.Thread(target=self._wait, args=(process,), name='bot-waiter')
+        waiter.daemon = True
+        waiter.start()
+        self._set_state(RUNNING)
+
+    def _terminate(self):
+        process = self._process
+        if process is None:
+            self._set_state(STOPPED)
+            return
+        if process.poll() is None:
+            process.terminate()
+            self._kill_at = time.monotonic() + self.stop_timeout
+        self._set_state(STOPPING)
+
+    def _exited(self, process):
+        if process is not self._process:
+            return
+        self._process = None
+        self._kill_at = None
+        self.responsive = None
+        self.last_exit_code = process.returncode
+        ran_for = time.monotonic() - self._started_at
+
+        if self._restart_pending:
+            self._restart_pending = False
+            self._start_now()
+        elif self._desired:
+            self.last_error = f"Bot exited with code {process.returncode}"
+            logger.warning(f"{self.last_error} after {ran_for:.0f}s")
+            if ran_for >= BOT_STABLE_SECONDS:
+                self._backoff = self.backoff_initial
+            self._schedule_restart()
+        else:
+            self._set_state(STOPPED)
+
+    def _schedule_restart(self):
+        if not self._desired:
+            self._set_state(STOPPED)
+            return
+        logger.info(f"Restarting bot in {self._backoff:.0f}s")
+        self._restart_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self.backoff_max)
+        self._set_state(RESTARTING)
+
+    # Helper threads
+
+    def _wait(self, process):
+        try:
+            process.wait()
+        except Exception as e:
+            logger.error(f"Error waiting for bot process: {str(e)}")
+        self._commands.put(('exited', process))
+
+    def _capture(self, stream, echo, name):
+        try:
+            for line in iter(stream.readline, b''):
+                text = line.decode('utf-8', 'replace').rstrip('\r\n')
+                self._output.append({'time': time.time(), 'stream': name, 'line': text})
+                echo.write(text + '\n')
+                echo.flush()
+        except (OSError, ValueError) as e:
+            logger.debug(f"Bot {name} closed: {str(e)}")
+        finally:
+            stream.close()
+
+    def _ping_loop(self):
+        failures = 0
+        while True:
+            time.sleep(self.ping_interval)
+            process = self._process
+            if (process is None or self.state != RUNNING or
+                    time.monotonic() - self._started_at < self.ping_grace):
+                failures = 0
+                continue
+            responsive = bool(self.ping())
+            if process is not self._process:
+                failures = 0
+                continue
+            if responsive != self.responsive:
+                self.responsive = responsive
+                self._set_state(self.state)
+            failures = 0 if responsive else failures + 1
+            if failures >= self.ping_failures:
+                failures = 0
+                self._commands.put(('unresponsive', process))
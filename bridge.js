@@ -0,0 +1,147 @@
+const net = require('net');
+const { MessageMedia } = require('whatsapp-web.js');
+const functions = require('./functions');
+
+const BRIDGE_HOST = process.env.BOT_BRIDGE_HOST || '127.0.0.1';
+const BRIDGE_PORT = parseInt(process.env.BOT_BRIDGE_PORT || '8091', 10);
+const MEDIA_CACHE_SIZE = parseInt(process.env.BOT_MEDIA_CACHE_SIZE || '8', 10);
+
+// Encoded media by media ID. Media IDs are content hashes, so an entry never
+// goes stale and every recipient of a campaign reuses the same payload.
+const mediaCache = new Map();
+
+function loadMedia(request) {
+    if (!request.media_id) {
+        return MessageMedia.fromFilePath(request.media_path);
+    }
+
+    let media = mediaCache.get(request.media_id);
+    if (media) {
+        // Move it to the end so the least recently used entry goes first
+        mediaCache.delete(request.media_id);
+    } else {
+        media = MessageMedia.fromFilePath(request.media_path);
+    }
+    mediaCache.set(request.media_id, media);
+    if (mediaCache.size > MEDIA_CACHE_SIZE) {
+        mediaCache.delete(mediaCache.keys().next().value);
+    }
+    return media;
+}
+
+// Command handlers for the dashboard bridge. Each receives the decoded request
+// and resolves to the fields merged into the response line.
+function createHandlers(client) {
+    const ensureReady = () => {
+        if (!client.info) {
+            throw new Error('WhatsApp client is not ready');
+        }
+    };
+
+    return {
+        ping: async () => ({}),
+
+        check_numbers: async (request) => {
+            ensureReady();
+            const registered = {};
+            for (const number of request.numbers || []) {
+                registered[number] = await client.isRegisteredUser(`${number}@c.us`);
+            }
+            return { registered };
+        },
+
+        send_message: async (request) => {
+            ensureReady();
+
+            const chatId = `${request.number}@c.us`;
+
+            // Check if number exists on WhatsApp, unless the dashboard already knows
+            if (!request.skip_check) {
+                const isRegistered = await client.isRegisteredUser(chatId);
+                if (!isRegistered) {
+                    return { status: 'not_registered' };
+                }
+            }
+
+            if (request.media_path) {
+                const media = loadMedia(request);
+                await client.sendMessage(chatId, media, { caption: request.message });
+            } else {
+                await client.sendMessage(chatId, request.message);
+            }
+            return { status: 'success' };
+        },
+
+        // The dashboard applied this change itself, so it isn't notified back
+        update_ignore_list: async (request) => (
+            functions.updateIgnoreList(request.added || [], request.removed || [], false)
+        ),
+    };
+}
+
+async function handleLine(handlers, socket, line) {
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (error) {
+        console.error('Bridge received malformed request:', error.message);
+        return;
+    }
+
+    const response = { id: request.id };
+    const handler = handlers[request.cmd];
+    if (!handler) {
+        Object.assign(response, { ok: false, error: `Unknown command: ${request.cmd}` });
+    } else {
+        try {
+            Object.assign(response, await handler(request), { ok: true });
+        } catch (error) {
+            Object.assign(response, { ok: false, error: error.message });
+        }
+    }
+
+    if (!socket.destroyed) {
+        socket.write(JSON.stringify(response) + '\n');
+    }
+}
+
+// Start the JSON-lines command server used by the dashboard for bulk sends
+function startBridge(client) {
+    const handlers = createHandlers(client);
+
+    const server = net.createServer((socket) => {
+        socket.setEncoding('utf8');
+        socket.setNoDelay(true);
+        let buffer = '';
+
+        socket.on('data', (chunk) => {
+            buffer += chunk;
+            let newline;
+            while ((newline = buffer.indexOf('\n')) !== -1) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (line) {
+                    handleLine(handlers, socket, line);
+                }
+            }
+        });
+
+        socket.on('error', (error) => {
+            console.error('Bridge connection error:', error.message);
+        });
+    });
+
+    server.on('error', (error) => {
+        console.error('Bridge server error:', error);
+    });
+
+    server.listen(BRIDGE_PORT, BRIDGE_HOST, () => {
+        console.log(`Dashboard bridge listening on ${BRIDGE_HOST}:${BRIDGE_PORT}`);
+    });
+
+    return server;
+}
+
+module.exports = {
+    startBridge
+};
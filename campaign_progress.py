@@ -0,0 +1,92 @@
+"""Throttled Socket.IO progress updates for bulk messaging campaigns.
+
+Each campaign has a Socket.IO room. The send loop reports every finished row
+to the campaign's ProgressTracker, which coalesces them into at most one
+``campaign_progress`` event per ``PROGRESS_EMIT_INTERVAL`` seconds, so the
+cost of an update doesn't depend on how many dashboards are watching.
+"""
+import os
+import threading
+import time
+
+PROGRESS_EMIT_INTERVAL = float(os.environ.get('PROGRESS_EMIT_INTERVAL', '1.0'))
+
+# Weight of the newest interval in the send rate estimate
+RATE_SMOOTHING = 0.2
+
+
+def campaign_room(campaign_id):
+    return f'campaign:{campaign_id}'
+
+
+class ProgressTracker:
+    """Coalesces per-row updates of one campaign into throttled emits.
+
+    ``snapshot()`` returns the campaign's current counters and state and is
+    only called when an event actually goes out. ``emit(payload)`` sends it
+    to the campaign's room.
+    """
+
+    def __init__(self, campaign_id, snapshot, emit, min_interval=PROGRESS_EMIT_INTERVAL):
+        self.campaign_id = campaign_id
+        self.snapshot = snapshot
+        self.emit = emit
+        self.min_interval = min_interval
+        self.last_row = None
+        self._seconds_per_row = None
+        self._last_row_at = None
+        self._last_emit = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def row_done(self, row):
+        """Record a finished row and schedule a coalesced update."""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_row_at is not None:
+                interval = now - self._last_row_at
+                if self._seconds_per_row is None:
+                    self._seconds_per_row = interval
+                else:
+                    self._seconds_per_row += RATE_SMOOTHING * \
+                        (interval - self._seconds_per_row)
+            self._last_row_at = now
+            self.last_row = row
+
+            if self._timer is not None:
+                # An update is already scheduled and will pick this row up
+                return
+            wait = self._last_emit + self.min_interval - now
+            if wait > 0:
+                self._timer = threading.Timer(wait, self._emit_scheduled)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def _emit_scheduled(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Emit the current progress now, e.g. on a state change."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._last_emit = time.monotonic()
+        self.emit(self.payload())
+
+    def payload(self):
+        """Current counters, last row, observed send rate and ETA."""
+        payload = dict(self.snapshot(), campaign_id=self.campaign_id,
+                       last_row=self.last_row, send_rate_per_minute=None,
+                       eta_seconds=None)
+        seconds_per_row = self._seconds_per_row
+        progress = payload.get('progress')
+        if seconds_per_row and progress:
+            payload['send_rate_per_minute'] = 60.0 / seconds_per_row
+            remaining = progress['total_numbers'] - progress['processed_numbers']
+            payload['eta_seconds'] = max(0, int(remaining * seconds_per_row))
+        return payload
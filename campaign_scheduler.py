@@ -0,0 +1,257 @@
+"""Queueing, pacing and control of bulk messaging campaigns.
+
+Campaigns are queued on a bounded pool of worker threads. Sends are paced by
+a token bucket per WhatsApp account, so campaigns sharing a session share
+its send rate instead of each sleeping on its own.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+CAMPAIGN_WORKERS = int(os.environ.get('CAMPAIGN_WORKERS', '2'))
+SEND_RATE_PER_MINUTE = float(os.environ.get('SEND_RATE_PER_MINUTE', '3'))
+SEND_BURST = int(os.environ.get('SEND_BURST', '1'))
+# Finished campaigns are forgotten this long after they finish
+CAMPAIGN_RETENTION_SECONDS = int(os.environ.get('CAMPAIGN_RETENTION_SECONDS', '86400'))
+DEFAULT_ACCOUNT = 'default'
+
+# Campaign states
+QUEUED = 'queued'
+RUNNING = 'running'
+PAUSED = 'paused'
+# Cancel was requested; the runner is still finishing its current row
+CANCELLING = 'cancelling'
+CANCELLED = 'cancelled'
+COMPLETED = 'completed'
+FAILED = 'failed'
+FINISHED_STATES = {CANCELLED, COMPLETED, FAILED}
+
+logger = logging.getLogger(__name__)
+
+
+class CampaignError(Exception):
+    """Raised for invalid campaign operations (unknown id, bad state...)."""
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available, else return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, stop_event=None):
+        """Block until a token is available; False if ``stop_event`` fired first."""
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return True
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+
+class Campaign:
+    """One queued or running bulk send and its control flags."""
+
+    def __init__(self, campaign_id, file_path, account, run_kwargs):
+        self.id = campaign_id
+        self.file_path = file_path
+        self.account = account
+        self.run_kwargs = run_kwargs
+        self.state = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.bucket = None
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait_turn(self):
+        """Wait while paused, then for a send slot. False means stop sending."""
+        self._resume.wait()
+        if self.cancelled:
+            return False
+        if not self.bucket.acquire(self._cancel):
+            return False
+        # Paused while waiting for the slot
+        self._resume.wait()
+        return not self.cancelled
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': os.path.basename(self.file_path),
+            'account': self.account,
+            'state': self.state,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class CampaignScheduler:
+    """Runs campaigns on a bounded worker pool with per-account rate limits.
+
+    ``runner(campaign, **run_kwargs)`` does the sending and must call
+    ``campaign.wait_turn()`` before every message. ``on_state_change(campaign)``
+    is called after every state transition.
+    """
+
+    def __init__(self, runner, max_workers=CAMPAIGN_WORKERS,
+                 rate_per_minute=SEND_RATE_PER_MINUTE, burst=SEND_BURST,
+                 retention=CAMPAIGN_RETENTION_SECONDS, on_state_change=None):
+        self.runner = runner
+        self.on_state_change = on_state_change
+        self.max_workers = max(1, max_workers)
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.retention = retention
+        self._campaigns = {}
+        self._buckets = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _bucket_for(self, account):
+        with self._lock:
+            bucket = self._buckets.get(account)
+            if bucket is None:
+                bucket = self._buckets[account] = TokenBucket(
+                    self.rate_per_minute / 60.0, self.burst)
+            return bucket
+
+    def _ensure_workers(self):
+        # Workers are started lazily so importing the app doesn't spawn threads
+        with self._lock:
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name=f'campaign-worker-{len(self._workers)}')
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _notify(self, campaign):
+        if self.on_state_change is None:
+            return
+        try:
+            self.on_state_change(campaign)
+        except Exception as e:
+            logger.error(f"Error reporting state of campaign {campaign.id}: {str(e)}")
+
+    def _work(self):
+        while True:
+            campaign = self._queue.get()
+            try:
+                with self._lock:
+                    # Cancelled while queued; cancel() already finished it
+                    if campaign.cancelled:
+                        continue
+                    campaign.state = PAUSED if not campaign._resume.is_set() else RUNNING
+                    campaign.started_at = time.time()
+                self._notify(campaign)
+                self.runner(campaign, **campaign.run_kwargs)
+                campaign.state = CANCELLED if campaign.cancelled else COMPLETED
+            except Exception as e:
+                logger.error(f"Campaign {campaign.id} failed: {str(e)}")
+                campaign.state = FAILED
+                campaign.error = str(e)
+            finally:
+                campaign.finished_at = campaign.finished_at or time.time()
+                self._queue.task_done()
+            self._notify(campaign)
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        for campaign_id, campaign in list(self._campaigns.items()):
+            if campaign.state in FINISHED_STATES and campaign.finished_at < cutoff:
+                del self._campaigns[campaign_id]
+
+    def submit(self, campaign_id, file_path, account=DEFAULT_ACCOUNT, **run_kwargs):
+        """Queue a campaign; a campaign id can only be active once at a time.
+
+        A cancelled campaign stays active until its runner has returned.
+        """
+        with self._lock:
+            self._purge()
+            existing = self._campaigns.get(campaign_id)
+            if existing is not None and existing.state not in FINISHED_STATES:
+                raise CampaignError('This campaign is already queued or running')
+            campaign = Campaign(campaign_id, file_path, account, run_kwargs)
+            self._campaigns[campaign_id] = campaign
+        campaign.bucket = self._bucket_for(account)
+        self._ensure_workers()
+        self._queue.put(campaign)
+        return campaign
+
+    def get(self, campaign_id):
+        campaign = self._campaigns.get(campaign_id)
+        if campaign is None:
+            raise CampaignError('Campaign not found')
+        return campaign
+
+    def list(self):
+        with self._lock:
+            campaigns = list(self._campaigns.values())
+        return sorted(campaigns, key=lambda c: c.created_at, reverse=True)
+
+    def pause(self, campaign_id):
+        campaign = self.get(campaign_id)
+        if campaign.state not in (QUEUED, RUNNING):
+            raise CampaignError(f'Cannot pause a {campaign.state} campaign')
+        campaign._resume.clear()
+        campaign.state = PAUSED
+        self._notify(campaign)
+        return campaign
+
+    def resume(self, campaign_id):
+        campaign = self.get(campaign_id)
+        if campaign.state != PAUSED:
+            raise CampaignError(f'Cannot resume a {campaign.state} campaign')
+        campaign.state = RUNNING if campaign.started_at else QUEUED
+        campaign._resume.set()
+        self._notify(campaign)
+        return campaign
+
+    def cancel(self, campaign_id):
+        """Stop a campaign; a running one is CANCELLING until its runner returns."""
+        campaign = self.get(campaign_id)
+        with self._lock:
+            if campaign.state in FINISHED_STATES or campaign.state == CANCELLING:
+                raise CampaignError(f'Cannot cancel a {campaign.state} campaign')
+            campaign._cancel.set()
+            # Wake it up if it is paused so it can stop
+            campaign._resume.set()
+            if campaign.started_at is None:
+                # Still queued; the worker will skip it
+                campaign.state = CANCELLED
+                campaign.finished_at = time.time()
+            else:
+                campaign.state = CANCELLING
+        self._notify(campaign)
+        return campaign
@@ -0,0 +1,346 @@
+"""Per-campaign send state, kept apart from the uploaded workbook.
+
+Each uploaded contact sheet gets a small SQLite database (WAL mode) holding
+one row per contact plus running counters. The send loop records outcomes
+here as they happen, progress queries read the counters in constant time,
+and the ``.xlsx`` is only rewritten from this state on download, at timed
+checkpoints and when the campaign finishes. Rewriting it is CPU-bound, so
+under gevent it runs on the hub's native thread pool.
+"""
+import atexit
+import collections
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from excel_io import (iter_contact_rows, write_statuses, PROCESSED_STATUSES,
+                      STATUS_SUCCESS, STATUS_FAIL, STATUS_NOT_ON_WHATSAPP,
+                      STATUS_INVALID_NUMBER, STATUS_DUPLICATE, STATUS_SUPPRESSED)
+from phone_numbers import PhoneNormalizer, EMPTY, DUPLICATE
+import prometheus_metrics
+
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:
+    gevent = None
+
+CAMPAIGN_STATE_FOLDER = 'campaign_state'
+
+# How often a running campaign writes its progress back into the workbook.
+# Each checkpoint rewrites the whole file, so row-based checkpoints (off by
+# default) make a long campaign quadratic
+CHECKPOINT_EVERY_ROWS = int(os.environ.get('CHECKPOINT_EVERY_ROWS', '0'))
+CHECKPOINT_EVERY_SECONDS = float(
+    os.environ.get('CHECKPOINT_EVERY_SECONDS', '300'))
+
+# Phone numbers are normalised this many rows at a time while seeding
+NORMALIZE_BATCH_ROWS = 10000
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_SAVE_SECONDS = prometheus_metrics.histogram(
+    'dashboard_workbook_save_duration_seconds',
+    'Time spent writing campaign statuses back into a workbook')
+
+# Counter incremented for each processed status
+STATUS_COUNTERS = {
+    STATUS_SUCCESS: 'success_count',
+    STATUS_FAIL: 'fail_count',
+    STATUS_NOT_ON_WHATSAPP: 'not_on_whatsapp_count',
+    STATUS_INVALID_NUMBER: 'invalid_count',
+    STATUS_DUPLICATE: 'duplicate_count',
+    STATUS_SUPPRESSED: 'suppressed_count',
+}
+COUNTER_NAMES = ('total_numbers', 'processed_numbers',
+                 'success_count', 'fail_count', 'not_on_whatsapp_count',
+                 'invalid_count', 'duplicate_count', 'suppressed_count',
+                 'cache_hits', 'cache_misses')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    row INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT '',
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _run_blocking(func, *args):
+    """Run ``func`` off the gevent hub when gevent is patched in, else inline."""
+    if gevent is not None and monkey.is_module_patched('threading'):
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+
+class CampaignStore:
+    """Row outcomes and counters for one contact sheet."""
+
+    def __init__(self, workbook_path, state_folder=CAMPAIGN_STATE_FOLDER):
+        os.makedirs(state_folder, exist_ok=True)
+        self.workbook_path = workbook_path
+        self.db_path = os.path.join(
+            state_folder, os.path.basename(workbook_path) + '.db')
+        self._lock = threading.Lock()
+        self._materialize_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def seed(self, rows=None, suppression_reason=None):
+        """Load contacts from the workbook once; later calls are no-ops.
+
+        ``suppression_reason(number)`` optionally returns why an accepted
+        number must not be messaged (see suppression.SuppressionIndex), or
+        None; such rows are settled as suppressed.
+        """
+        with self._lock:
+            if self._meta('seeded') == '1':
+                return
+            self._seed(rows, suppression_reason)
+
+    def _seed(self, rows, suppression_reason):
+        if rows is None:
+            rows = iter_contact_rows(self.workbook_path)
+
+        counters = dict.fromkeys(COUNTER_NAMES, 0)
+        rejection_reasons = collections.Counter()
+        normalizer = PhoneNormalizer()
+
+        def contacts():
+            rows_iter = iter(rows)
+            while True:
+                batch = list(itertools.islice(rows_iter, NORMALIZE_BATCH_ROWS))
+                if not batch:
+                    return
+                numbers, reasons = normalizer.normalize(
+                    [phone_number for _, _, phone_number, _ in batch])
+                for (row, name, phone_number, status), number, reason in zip(
+                        batch, numbers, reasons):
+                    if status not in PROCESSED_STATUSES:
+                        status = ''
+                    if reason == EMPTY:
+                        phone_number = ''
+                    elif number:
+                        phone_number = number
+                        if not status and suppression_reason is not None:
+                            suppressed = suppression_reason(number)
+                            if suppressed:
+                                status = STATUS_SUPPRESSED
+                                rejection_reasons[suppressed] += 1
+                    elif not status:
+                        # Numbers that can't be sent to are settled right away
+                        status = STATUS_DUPLICATE if reason == DUPLICATE else STATUS_INVALID_NUMBER
+                        rejection_reasons[reason] += 1
+                    if phone_number:
+                        counters['total_numbers'] += 1
+                        if status:
+                            counters['processed_numbers'] += 1
+                            counters[STATUS_COUNTERS[status]] += 1
+                    yield row, name, phone_number, status
+
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.execute('DELETE FROM contacts')
+            self._conn.executemany(
+                'INSERT INTO contacts (row, name, phone, status) VALUES (?, ?, ?, ?)',
+                contacts())
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)',
+                counters.items())
+            self._set_meta('seeded', 1)
+            self._set_meta('rejection_reasons', json.dumps(rejection_reasons))
+            # Rejected numbers got a status the workbook doesn't have yet
+            self._set_meta('version', 1 if rejection_reasons else 0)
+            self._set_meta('materialized_version', 0)
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def rejection_reasons(self):
+        """Why numbers were rejected or suppressed when the sheet was loaded, {reason: count}."""
+        with self._lock:
+            return json.loads(self._meta('rejection_reasons', '{}'))
+
+    def pending_rows(self):
+        """Return [(row, name, phone_number)] still waiting to be sent."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT row, name, phone FROM contacts "
+                "WHERE status = '' AND phone <> '' ORDER BY row").fetchall()
+
+    def _add_counters(self, deltas):
+        self._conn.executemany(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            [(name, delta) for name, delta in deltas.items()])
+
+    def add_counters(self, **deltas):
+        """Bump named counters, e.g. add_counters(cache_hits=3)."""
+        with self._lock:
+            self._add_counters(deltas)
+
+    def record_outcome(self, row, status, **counters):
+        """Store the send result for one row and update the counters.
+
+        Extra keyword arguments are counter deltas applied in the same
+        transaction.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                previous = self._conn.execute(
+                    'SELECT status FROM contacts WHERE row = ?', (row,)).fetchone()
+                previous = previous[0] if previous else ''
+                self._conn.execute(
+                    'UPDATE contacts SET status = ?, updated_at = ? WHERE row = ?',
+                    (status, time.time(), row))
+
+                deltas = dict(counters)
+                deltas[STATUS_COUNTERS[status]] = deltas.get(STATUS_COUNTERS[status], 0) + 1
+                if previous:
+                    previous_counter = STATUS_COUNTERS[previous]
+                    deltas[previous_counter] = deltas.get(previous_counter, 0) - 1
+                else:
+                    deltas['processed_numbers'] = deltas.get('processed_numbers', 0) + 1
+                self._add_counters(deltas)
+                self._conn.execute(
+                    "UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def progress(self):
+        """Return the running counters; a constant-time lookup."""
+        with self._lock:
+            progress = dict.fromkeys(COUNTER_NAMES, 0)
+            progress.update(self._conn.execute(
+                'SELECT name, value FROM counters').fetchall())
+        total = progress['total_numbers']
+        progress['progress_percentage'] = (
+            progress['processed_numbers'] / total * 100) if total > 0 else 0
+        lookups = progress['cache_hits'] + progress['cache_misses']
+        progress['cache_hit_rate'] = (
+            progress['cache_hits'] / lookups) if lookups > 0 else None
+        return progress
+
+    def materialize(self, blocking=False):
+        """Write the recorded statuses back into the workbook if anything changed.
+
+        The workbook is written on the thread pool unless ``blocking`` is set.
+        """
+        # Only one writer at a time; sends keep recording while we write
+        with self._materialize_lock:
+            with self._lock:
+                version = self._meta('version', '0')
+                if version == self._meta('materialized_version', '0'):
+                    return False
+                statuses = self._conn.execute(
+                    "SELECT row, status FROM contacts WHERE status <> ''").fetchall()
+
+            started = time.perf_counter()
+            if blocking:
+                write_statuses(self.workbook_path, statuses)
+            else:
+                _run_blocking(write_statuses, self.workbook_path, statuses)
+            WORKBOOK_SAVE_SECONDS.observe(time.perf_counter() - started)
+
+            with self._lock:
+                self._set_meta('materialized_version', version)
+            return True
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_campaign_store(workbook_path, rows=None, suppression_reason=None):
+    """Return the shared store for a workbook, seeding it on first use.
+
+    ``rows`` optionally supplies the contact rows instead of re-reading the
+    workbook (see excel_io.iter_contact_rows); ``suppression_reason`` is
+    passed on to CampaignStore.seed.
+    """
+    key = os.path.abspath(workbook_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = CampaignStore(workbook_path)
+    store.seed(rows, suppression_reason)
+    return store
+
+
+def flush_all_stores():
+    """Write every store with unsaved outcomes back to its workbook."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        try:
+            # The hub may already be gone at exit
+            store.materialize(blocking=True)
+        except Exception as e:
+            logger.error(f"Error flushing campaign state for {store.workbook_path}: {str(e)}")
+
+
+# Don't leave workbooks behind their campaign state when the server stops
+atexit.register(flush_all_stores)
+
+
+class Checkpointer:
+    """Flushes a campaign store to its workbook every T seconds (or N rows).
+
+    Call ``row_done`` after each recorded outcome and ``flush`` when the
+    campaign stops for any reason.
+    """
+
+    def __init__(self, store, every_rows=CHECKPOINT_EVERY_ROWS,
+                 every_seconds=CHECKPOINT_EVERY_SECONDS):
+        self.store = store
+        self.every_rows = every_rows
+        self.every_seconds = every_seconds
+        self._rows_since_flush = 0
+        self._last_flush = time.monotonic()
+
+    def row_done(self):
+        self._rows_since_flush += 1
+        rows_due = self.every_rows > 0 and self._rows_since_flush >= self.every_rows
+        time_due = (self.every_seconds > 0 and
+                    time.monotonic() - self._last_flush >= self.every_seconds)
+        if rows_due or time_due:
+            self.flush()
+
+    def flush(self):
+        self._rows_since_flush = 0
+        self._last_flush = time.monotonic()
+        return self.store.materialize()
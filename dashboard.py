@@ -1,43 +1,99 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, g
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from functools import wraps
-import json
 import os
 import logging
-import subprocess
-import signal
-import shutil
 import time
 import threading
 from datetime import datetime, timedelta
-import platform
 import sys
 import psutil
 from dotenv import load_dotenv
 import uuid
-import tempfile
-import re
-import random
+import hmac
+import secrets
 import werkzeug.utils
 from werkzeug.utils import secure_filename
-import openpyxl
-from openpyxl.styles import PatternFill
+
+# Load environment variables; the modules below read their settings on import
+load_dotenv()
+
+from excel_io import (open_contact_sheet, count_columns, iter_contact_rows,
+                      STATUS_SUCCESS, STATUS_FAIL, STATUS_NOT_ON_WHATSAPP,
+                      STATUS_SUPPRESSED)
+from campaign_store import get_campaign_store, Checkpointer
+from campaign_scheduler import CampaignScheduler, CampaignError
+from job_queue import JobQueue, JobError
+from registration_cache import RegistrationCache
+from phone_numbers import whatsapp_number
+from suppression import SuppressionIndex
+from ignore_list import IgnoreListStore, clean_numbers, IGNORE_LIST_PAGE_SIZE
+from campaign_progress import ProgressTracker, campaign_room
+from bot_events import BotStateNotifier
+from system_metrics import MetricsSampler, static_system_info
+from media_store import MediaStore, MediaError, media_extension
+from image_catalog import ImageCatalog, IMAGE_KEYWORDS_FILE
+from http_cache import send_cached_file, send_upload
+from image_ingest import (ingest_image, remove_image_files, ImageIngestError,
+                          DuplicateImageError, THUMBNAILS_SUBFOLDER)
+from bot_bridge import BotBridge, BotBridgeError, SEND_SUCCESS, SEND_NOT_REGISTERED
+from bot_supervisor import BotSupervisor, BOT_PING_TIMEOUT
+from bot_session import DirectoryCleaner, retire, BOT_AUTH_DIR
+from session_store import init_session_store
+import prometheus_metrics
+from logging_config import configure_logging
 
 # Monkey patch for gevent compatibility with Python 3.12
 # We're not using WebSockets, so we don't need gevent's WebSocket support
 from gevent import monkey
 monkey.patch_all(ssl=False)
 
-# Load environment variables
-load_dotenv()
+# Logging is configured from the environment (see logging_config)
+configure_logging()
 
 app = Flask(__name__)
 # Get secret key from environment variable
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'default_secret_key')
+# Login sessions are stored server-side (see session_store)
+init_session_store(app)
+# Metrics served at /metrics (see prometheus_metrics) to logged-in sessions and
+# scrapers sending METRICS_TOKEN; METRICS_PUBLIC opens it to anyone
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '').lower() in ('1', 'true', 'yes')
+# Shared secret the bot sends with its notifications; without one a random
+# token is made here and the bot, our child process, inherits it
+BOT_NOTIFY_TOKEN = os.environ.get('BOT_NOTIFY_TOKEN') or secrets.token_urlsafe(32)
+os.environ['BOT_NOTIFY_TOKEN'] = BOT_NOTIFY_TOKEN
+http_requests = prometheus_metrics.counter(
+    'dashboard_http_requests_total', 'HTTP requests by route, method and status',
+    ('route', 'method', 'status'))
+http_request_seconds = prometheus_metrics.histogram(
+    'dashboard_http_request_duration_seconds', 'HTTP request latency by route',
+    ('route', 'method'))
+socketio_clients = prometheus_metrics.gauge(
+    'dashboard_socketio_clients', 'Connected Socket.IO clients')
+socketio_emits = prometheus_metrics.counter(
+    'dashboard_socketio_emits_total', 'Socket.IO events emitted by event name',
+    ('event',))
+bulk_messages = prometheus_metrics.counter(
+    'dashboard_bulk_messages_total', 'Bulk campaign rows by outcome', ('status',))
+bulk_send_seconds = prometheus_metrics.histogram(
+    'dashboard_bulk_send_duration_seconds', 'Time for the bot to send one bulk message')
+
+
+class CountingSocketIO(SocketIO):
+    """SocketIO that counts the events it emits, including emit() in handlers."""
+
+    def emit(self, event, *args, **kwargs):
+        socketio_emits.inc(event=event)
+        return super().emit(event, *args, **kwargs)
+
+
 # Initialize SocketIO with gevent
-socketio = SocketIO(app, cors_allowed_origins="*",
-                    async_mode='gevent', logger=True, engineio_logger=True)
-logging.basicConfig(level=logging.DEBUG)
+socketio = CountingSocketIO(app, cors_allowed_origins="*",
+                            async_mode='gevent',
+                            logger=logging.getLogger('socketio.server'),
+                            engineio_logger=logging.getLogger('engineio.server'))
 
 # Create uploads directory if it doesn't exist
 UPLOAD_FOLDER = 'uploads'
@@ -56,11 +112,71 @@ if not os.path.exists(PICS_FOLDER):
 # Configure pics upload
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png'}
 
-# Add these global variables at the top level
-bot_process = None
+# The bot process, its status, the campaign scheduler (and its send rate
+# limit), upload jobs and the ignore list all live in this process: a second
+# worker would run its own bot and send the same rows again
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+if WEB_CONCURRENCY > 1:
+    raise RuntimeError(
+        f"WEB_CONCURRENCY is {WEB_CONCURRENCY}; the dashboard supports only one worker")
+
+# Set by the bot through /set_bot_connected and /set_bot_disconnected
 bot_connected = False
-# Flag to control background threads
-should_run_background_tasks = True
+
+
+def is_bot_connected():
+    return bot_connected
+
+
+def set_bot_connected_flag(connected):
+    global bot_connected
+    bot_connected = connected
+
+
+# Persistent command channel to the running bot, used for bulk sends
+bot_bridge = BotBridge()
+# Cached answers to "is this number on WhatsApp?"
+registration_cache = RegistrationCache()
+# The bot's ignore list, parsed once and re-read only when it changes; each
+# change is applied to the suppression index and broadcast to the
+# dashboards as a delta
+ignore_list_store = IgnoreListStore(
+    on_change=lambda delta: on_ignore_list_change(delta))
+# Ignored, opted-out and recently contacted numbers, skipped by every campaign
+suppression_index = SuppressionIndex(ignore_list_store)
+# Numbers per registration lookup sent to the bot in the validation pass
+VALIDATION_BATCH_SIZE = int(os.environ.get('VALIDATION_BATCH_SIZE', '50'))
+# Rows parsed between heartbeats of an upload job
+JOB_HEARTBEAT_ROWS = 500
+
+
+def on_bot_process_change(supervisor):
+    """Keep the connection flag and the dashboards in step with the bot process."""
+    if not supervisor.is_running():
+        # A bot that crashed never reported itself disconnected
+        set_bot_connected_flag(False)
+    bot_state.publish()
+
+
+# Owns the bot process: non-blocking start/stop, crash restarts with backoff,
+# liveness pings over the bridge and a buffer of its output
+bot_supervisor = BotSupervisor(
+    ping=BotBridge(timeout=BOT_PING_TIMEOUT).ping,
+    on_change=on_bot_process_change)
+
+
+def is_bot_running():
+    return bot_supervisor.is_running()
+
+
+# Deletes retired WhatsApp sessions in the background after resets
+session_cleaner = DirectoryCleaner()
+
+
+# Pushes bot status and QR code changes to dashboards as they happen
+bot_state = BotStateNotifier(
+    get_state=lambda: (is_bot_connected(), is_bot_running()),
+    emit=lambda event, payload: socketio.emit(event, payload))
 
 # Get dashboard credentials from environment variables
 DASHBOARD_USERNAME = os.environ.get('DASHBOARD_USERNAME', 'bot')
@@ -77,14 +193,6 @@ def allowed_file(filename):
 # Helper function to validate phone number
 
 
-def is_valid_phone_number(number):
-    # Remove plus sign if present
-    if number.startswith('+'):
-        number = number[1:]
-    # Check if the number contains only digits and has a reasonable length
-    return number.isdigit() and 8 <= len(number) <= 15
-
-
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -94,6 +202,34 @@ def login_required(f):
     return decorated_function
 
 
+def bot_required(f):
+    """Only the bot, which sends BOT_NOTIFY_TOKEN in X-Bot-Token, may call this."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get('X-Bot-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), BOT_NOTIFY_TOKEN.encode('utf-8')):
+            return jsonify({"success": False, "message": "Forbidden"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The rule, not the path, so /pics/<filename> is a single series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.observe(
+            time.perf_counter() - started, route=route, method=request.method)
+        http_requests.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -128,91 +264,83 @@ def index():
 def get_qr_code():
     qr_code_file = 'qr_code.png'
     if os.path.exists(qr_code_file):
-        return send_file(qr_code_file, mimetype='image/png')
+        # The file is rewritten in place, so clients revalidate it every time
+        return send_cached_file(qr_code_file, mimetype='image/png')
     return jsonify({"message": "QR code not available"})
 
 
 @app.route('/bot_status')
 @login_required
 def bot_status():
-    global bot_connected
-    return jsonify({"connected": bot_connected})
+    return jsonify({
+        "connected": is_bot_connected(),
+        "supervisor": bot_supervisor.status(),
+        "session_cleanup": session_cleaner.stats()
+    })
+
+
+@app.route('/bot_logs')
+@login_required
+def bot_logs():
+    """The bot's most recent stdout/stderr lines, oldest first"""
+    return jsonify({
+        "success": True,
+        "lines": bot_supervisor.output(request.args.get('lines', type=int))
+    })
 
 
 @app.route('/is_bot_ready')
 @login_required
 def is_bot_ready():
-    global bot_connected
-    return jsonify({"ready": bot_connected})
+    return jsonify({"ready": is_bot_connected()})
 
 
 @app.route('/qr_code_exists')
 @login_required
 def qr_code_exists():
-    global bot_process, bot_connected
-
     # Check if bot is running but not connected (connecting state)
-    bot_running = bot_process is not None and bot_process.poll() is None
-    is_connecting = bot_running and not bot_connected
+    bot_running = is_bot_running()
+    is_connecting = bot_running and not is_bot_connected()
 
     # Only check for QR code if we're in a connecting state
     qr_exists = os.path.exists('qr_code.png') if is_connecting else False
 
     return jsonify({
         "exists": qr_exists,
+        "qr_code_url": bot_state.qr_code_url() if qr_exists else None,
         "is_connecting": is_connecting,
         "bot_running": bot_running
     })
 
 
 @app.route('/set_bot_connected', methods=['POST'])
+@bot_required
 def set_bot_connected():
-    global bot_connected
-    bot_connected = True
+    set_bot_connected_flag(True)
     if os.path.exists('qr_code.png'):
         os.remove('qr_code.png')
+    bot_state.publish()
+    bot_state.publish_qr(False)
     return jsonify({"message": "Bot connection status updated", "ready": True})
 
 
-@app.route('/reset_bot')
-@login_required
-def reset_bot():
-    global bot_process, bot_connected
+@app.route('/set_qr_ready', methods=['POST'])
+@bot_required
+def set_qr_ready():
+    """Called by the bot once a new QR code image has been written."""
+    bot_state.publish_qr(True)
+    return jsonify({"message": "QR code status updated"})
 
-    # Update UI immediately
-    socketio.emit('bot_status', {'connected': False, 'status': 'resetting'})
 
-    # Stop the bot if it's running
-    if bot_process is not None and bot_process.poll() is None:
-        try:
-            os.kill(bot_process.pid, signal.SIGTERM)
-            bot_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            # Force kill if it doesn't terminate gracefully
-            os.kill(bot_process.pid, signal.SIGKILL)
-        except Exception as e:
-            app.logger.error(f"Error stopping bot during reset: {str(e)}")
-
-        bot_process = None
-
-    # Clear the auth directory
-    cache_dir = '.wwebjs_auth'
-    if os.path.exists(cache_dir):
-        max_attempts = 5
-        for attempt in range(max_attempts):
-            try:
-                shutil.rmtree(cache_dir)
-                break
-            except PermissionError:
-                if attempt < max_attempts - 1:
-                    time.sleep(1)
-                else:
-                    return jsonify({
-                        "message": "Failed to remove cache. Please try again.",
-                        "connected": False,
-                        "error": True,
-                        "status": "error"
-                    })
+def clear_bot_session():
+    """Retire the saved WhatsApp session and remove the QR code (runs while the bot is stopped)."""
+    # A rename, however big the profile is; the tree is deleted in the background
+    started = time.perf_counter()
+    retired = retire(BOT_AUTH_DIR)
+    if retired:
+        app.logger.info(f"Retired {BOT_AUTH_DIR} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    # Also picks up sessions left over from interrupted cleanups
+    session_cleaner.sweep(BOT_AUTH_DIR)
 
     # Remove old QR code if it exists
     if os.path.exists('qr_code.png'):
@@ -221,137 +349,80 @@ def reset_bot():
         except PermissionError:
             pass
 
-    # Start the bot
-    try:
-        bot_process = subprocess.Popen(['node', 'index.js'])
-
-        # Wait a moment to check if the process started successfully
-        time.sleep(1)
-        if bot_process.poll() is not None:
-            # Process terminated immediately
-            return jsonify({
-                "message": "Failed to restart bot. Check server logs for details.",
-                "connected": False,
-                "error": True,
-                "status": "error"
-            })
 
-        bot_connected = False
+@app.route('/reset_bot')
+@login_required
+def reset_bot():
+    # Update UI immediately
+    socketio.emit('bot_status', {'connected': False, 'status': 'resetting'})
+    set_bot_connected_flag(False)
 
-        # Emit status update via WebSocket
-        socketio.emit(
-            'bot_status', {'connected': False, 'status': 'connecting'})
+    # The supervisor stops the bot, clears the session and starts it again
+    bot_supervisor.restart(before_start=clear_bot_session)
 
-        return jsonify({
-            "message": "Bot reset successfully. Please wait for the QR code to appear.",
-            "connected": False,
-            "status": "connecting"
-        })
-    except Exception as e:
-        app.logger.error(f"Error restarting bot after reset: {str(e)}")
-        return jsonify({
-            "message": f"Error restarting bot: {str(e)}",
-            "connected": False,
-            "error": True,
-            "status": "error"
-        })
+    return jsonify({
+        "message": "Bot reset started. Please wait for the QR code to appear.",
+        "connected": False,
+        "status": "connecting"
+    })
 
 
 @app.route('/set_bot_disconnected', methods=['POST'])
+@bot_required
 def set_bot_disconnected():
-    global bot_connected
-    bot_connected = False
+    set_bot_connected_flag(False)
+    bot_state.publish()
     return jsonify({'message': 'Bot disconnected status updated'})
 
 
 @app.route('/start_bot')
 @login_required
 def start_bot():
-    global bot_process, bot_connected
-
     # If bot is already running, return success
-    if bot_process is not None and bot_process.poll() is None:
+    if is_bot_running():
+        connected = is_bot_connected()
         return jsonify({
             "message": "Bot is already running",
-            "connected": bot_connected,
-            "status": "connecting" if not bot_connected else "connected"
+            "connected": connected,
+            "status": "connecting" if not connected else "connected"
         })
 
     # Check if auth directory exists and has session data
-    auth_dir = '.wwebjs_auth'
-    session_exists = os.path.exists(auth_dir) and os.path.exists(
-        os.path.join(auth_dir, 'session'))
+    session_exists = os.path.exists(BOT_AUTH_DIR) and os.path.exists(
+        os.path.join(BOT_AUTH_DIR, 'session'))
 
-    # Start the bot
-    try:
-        bot_process = subprocess.Popen(['node', 'index.js'])
-
-        # Wait a moment to check if the process started successfully
-        time.sleep(1)
-        if bot_process.poll() is not None:
-            # Process terminated immediately
-            return jsonify({
-                "message": "Failed to start bot. Check server logs for details.",
-                "connected": False,
-                "error": True,
-                "status": "error"
-            })
+    # The supervisor starts the bot and reports failures through bot_status
+    bot_supervisor.start()
 
-        # Emit status update via WebSocket
-        socketio.emit(
-            'bot_status', {'connected': False, 'status': 'connecting'})
+    # Emit status update via WebSocket
+    socketio.emit(
+        'bot_status', {'connected': False, 'status': 'connecting'})
 
-        # If we have a session, we might reconnect automatically
-        connection_message = "Bot started successfully. Attempting to reconnect to existing session..." if session_exists else "Bot started successfully. Waiting for connection..."
+    # If we have a session, we might reconnect automatically
+    connection_message = "Bot starting. Attempting to reconnect to existing session..." if session_exists else "Bot starting. Waiting for connection..."
 
-        return jsonify({
-            "message": connection_message,
-            "connected": False,
-            "status": "connecting",
-            "session_exists": session_exists
-        })
-    except Exception as e:
-        app.logger.error(f"Error starting bot: {str(e)}")
-        return jsonify({
-            "message": f"Error starting bot: {str(e)}",
-            "connected": False,
-            "error": True,
-            "status": "error"
-        })
+    return jsonify({
+        "message": connection_message,
+        "connected": False,
+        "status": "connecting",
+        "session_exists": session_exists
+    })
 
 
 @app.route('/stop_bot')
 @login_required
 def stop_bot():
-    global bot_process, bot_connected
-
-    # If bot is running, stop it
-    if bot_process is not None and bot_process.poll() is None:
-        try:
-            os.kill(bot_process.pid, signal.SIGTERM)
-            # Wait up to 5 seconds for process to terminate
-            bot_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            # Force kill if it doesn't terminate gracefully
-            os.kill(bot_process.pid, signal.SIGKILL)
-        except Exception as e:
-            app.logger.error(f"Error stopping bot: {str(e)}")
-            return jsonify({
-                "message": f"Error stopping bot: {str(e)}",
-                "connected": bot_connected,
-                "error": True
-            })
-
-        bot_process = None
+    # The supervisor sends SIGTERM and kills the bot if it doesn't exit in time
+    bot_supervisor.stop()
 
     # Update connection status
-    bot_connected = False
+    set_bot_connected_flag(False)
 
     # Emit status update via WebSocket
     socketio.emit('bot_status', {'connected': False, 'status': 'stopped'})
 
     return jsonify({
-        "message": "Bot stopped successfully",
+        "message": "Bot is stopping",
         "connected": False,
         "status": "stopped"
     })
@@ -374,7 +445,7 @@ def serve_login_js():
 @app.route('/upload_excel', methods=['POST'])
 @login_required
 def upload_excel():
-    if not bot_connected:
+    if not is_bot_connected():
         return jsonify({
             "success": False,
             "message": "WhatsApp bot is not connected. Please connect the bot first."
@@ -410,76 +481,145 @@ def upload_excel():
     try:
         # Save the uploaded file
         file.save(file_path)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error saving file: {str(e)}"
+        })
 
+    # Parse and validate the sheet in the background
+    try:
+        job = upload_jobs.submit('upload_excel', parse_contact_sheet, file_path)
+    except JobError as e:
+        os.remove(file_path)
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        })
+
+    return jsonify({
+        "success": True,
+        "message": "File uploaded, checking its contents",
+        "filename": filename,
+        "job_id": job.id,
+        "state": job.state
+    })
+
+
+def parse_contact_sheet(job, file_path):
+    """Validate an uploaded sheet and seed its campaign state (a background job)."""
+    def reject(message):
+        # The upload is unusable, so don't keep it around
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise ValueError(message)
+
+    try:
         # Process the Excel file to validate its structure
+        workbook, sheet = open_contact_sheet(file_path)
         try:
-            workbook = openpyxl.load_workbook(file_path)
-            sheet = workbook.active
+            column_count = count_columns(sheet)
+        finally:
+            workbook.close()
+    except Exception as e:
+        reject(f"Error processing Excel file: {str(e)}")
 
-            # Check if the file has the required structure
-            if sheet.max_column < 2:
-                os.remove(file_path)  # Clean up
-                return jsonify({
-                    "success": False,
-                    "message": "Invalid Excel format. The file must have at least 2 columns (Name and Phone Number)."
-                })
+    # Check if the file has the required structure
+    if column_count < 2:
+        reject("Invalid Excel format. The file must have at least 2 columns (Name and Phone Number).")
 
-            # Count valid numbers
-            total_numbers = 0
-            processed_numbers = 0
-            invalid_numbers = 0
+    # Seed the campaign state; numbers are normalised, validated and
+    # deduped in batches as the rows stream in
+    def checked_rows():
+        for rows_read, contact in enumerate(iter_contact_rows(file_path), 1):
+            # Report progress and let the dashboard serve other requests
+            if rows_read % JOB_HEARTBEAT_ROWS == 0:
+                job.heartbeat(rows_read=rows_read)
+            yield contact
 
-            # Start from the second row (skip header)
-            for row in range(2, sheet.max_row + 1):
-                phone_number = str(sheet.cell(row=row, column=2).value or "")
-                status = str(sheet.cell(
-                    row=row, column=3).value or "").strip().lower()
+    try:
+        suppression_index.refresh()
+        suppression_index.purge_expired()
+        store = get_campaign_store(file_path, rows=checked_rows(),
+                                   suppression_reason=suppression_index.reason)
+        summary = store.progress()
+    except Exception as e:
+        reject(f"Error processing Excel file: {str(e)}")
 
-                if phone_number:
-                    total_numbers += 1
+    # Check which numbers are on WhatsApp in the background
+    validation_thread = threading.Thread(
+        target=validate_campaign_numbers, args=(file_path,))
+    validation_thread.daemon = True
+    validation_thread.start()
 
-                    # Check if this number has already been processed
-                    if status in ["success", "fail", "number doesn't exist on whatsapp"]:
-                        processed_numbers += 1
+    total_numbers = summary["total_numbers"]
+    processed_numbers = summary["processed_numbers"]
+    return {
+        "filename": os.path.basename(file_path),
+        "total_numbers": total_numbers,
+        "processed_numbers": processed_numbers,
+        "remaining_numbers": total_numbers - processed_numbers,
+        "invalid_numbers": summary["invalid_count"],
+        "duplicate_numbers": summary["duplicate_count"],
+        "suppressed_numbers": summary["suppressed_count"],
+        "rejection_reasons": store.rejection_reasons()
+    }
 
-                    # Check if phone number is valid
-                    if not is_valid_phone_number(phone_number):
-                        invalid_numbers += 1
 
-            # Save the processed file
-            workbook.save(file_path)
+def notify_job_update(job):
+    """Push job state changes to the dashboards; /jobs/<id> has the same data."""
+    socketio.emit('job_update', job.to_dict())
 
-            # Return success response with session ID and file info
-            return jsonify({
-                "success": True,
-                "message": "File uploaded successfully",
-                "filename": filename,
-                "total_numbers": total_numbers,
-                "processed_numbers": processed_numbers,
-                "remaining_numbers": total_numbers - processed_numbers,
-                "invalid_numbers": invalid_numbers
-            })
 
-        except Exception as e:
-            # If there's an error processing the Excel file, remove it and return error
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            return jsonify({
-                "success": False,
-                "message": f"Error processing Excel file: {str(e)}"
-            })
+# Uploaded sheets are parsed here, a few at a time
+upload_jobs = JobQueue(on_update=notify_job_update)
 
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "message": f"Error saving file: {str(e)}"
-        })
+
+@app.route('/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    try:
+        job = upload_jobs.get(job_id)
+    except JobError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    return jsonify(dict(job.to_dict(), success=True))
+
+
+# Content-addressed store for campaign images
+media_store = MediaStore()
+
+
+@app.route('/upload_media', methods=['POST'])
+@login_required
+def upload_media():
+    """Store a campaign image once; campaigns then refer to it by media_id."""
+    if 'media' not in request.files:
+        return jsonify({"message": "No media part", "success": False})
+
+    file = request.files['media']
+    if file.filename == '':
+        return jsonify({"message": "No media selected", "success": False})
+
+    try:
+        ext = media_extension(file.filename, file.mimetype)
+        # Copied in chunks from the spooled upload, never held in memory whole
+        media = media_store.put_stream(file.stream, ext)
+    except MediaError as e:
+        return jsonify({"message": str(e), "success": False})
+
+    return jsonify({
+        "message": "Media uploaded successfully",
+        "success": True,
+        "media_id": media['media_id'],
+        "mimetype": media['mimetype'],
+        "bytes": media['bytes']
+    })
 
 
 @app.route('/start_bulk_messaging', methods=['POST'])
 @login_required
 def start_bulk_messaging():
-    if not bot_connected:
+    if not is_bot_connected():
         return jsonify({
             "success": False,
             "message": "WhatsApp bot is not connected. Please connect the bot first."
@@ -503,21 +643,89 @@ def start_bulk_messaging():
             "message": "Message text is required"
         })
 
-    # Check if image was uploaded
-    has_image = data.get('has_image', False)
-    image_data = data.get('image_data', None)
+    # The campaign image is uploaded beforehand to /upload_media
+    media_id = data.get('media_id')
+    try:
+        if media_id:
+            if media_store.get(media_id) is None:
+                return jsonify({
+                    "success": False,
+                    "message": "Image not found, please upload it again"
+                })
+        elif data.get('has_image') and data.get('image_data'):
+            # Older dashboards still send the image inline as a data URL
+            media_id = media_store.put_data_url(data['image_data'])['media_id']
+    except MediaError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        })
+
+    # Queue the campaign; the scheduler paces it against the account's send rate
+    try:
+        campaign = campaign_scheduler.submit(
+            filename, file_path, message_text=message_text, media_id=media_id)
+    except CampaignError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        })
+
+    return jsonify({
+        "success": True,
+        "message": "Bulk messaging started in the background",
+        "campaign_id": campaign.id,
+        "state": campaign.state
+    })
+
+
+def campaign_info(campaign):
+    """Campaign details plus its current send counters."""
+    info = campaign.to_dict()
+    try:
+        info["progress"] = get_campaign_store(campaign.file_path).progress()
+    except Exception as e:
+        app.logger.error(f"Error reading progress for campaign {campaign.id}: {str(e)}")
+        info["progress"] = None
+    return info
 
-    # Start a background thread to process the messages
-    thread = threading.Thread(
-        target=process_bulk_messages,
-        args=(file_path, message_text, has_image, image_data)
-    )
-    thread.daemon = True
-    thread.start()
 
+@app.route('/campaigns')
+@login_required
+def list_campaigns():
+    """List queued, running and finished campaigns."""
     return jsonify({
         "success": True,
-        "message": "Bulk messaging started in the background"
+        "campaigns": [campaign_info(c) for c in campaign_scheduler.list()]
+    })
+
+
+@app.route('/campaigns/<campaign_id>/<action>', methods=['POST'])
+@login_required
+def control_campaign(campaign_id, action):
+    """Pause, resume or cancel a campaign."""
+    actions = {
+        'pause': campaign_scheduler.pause,
+        'resume': campaign_scheduler.resume,
+        'cancel': campaign_scheduler.cancel,
+    }
+    if action not in actions:
+        return jsonify({
+            "success": False,
+            "message": f"Unknown campaign action: {action}"
+        }), 404
+
+    try:
+        campaign = actions[action](campaign_id)
+    except CampaignError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        })
+
+    return jsonify({
+        "success": True,
+        "campaign": campaign_info(campaign)
     })
 
 
@@ -533,6 +741,12 @@ def download_excel(filename):
             "message": "File not found"
         }), 404
 
+    # Bring the workbook up to date with the recorded send outcomes
+    try:
+        get_campaign_store(file_path).materialize()
+    except Exception as e:
+        app.logger.error(f"Error updating Excel file before download: {str(e)}")
+
     # Return the file for download
     return send_file(file_path, as_attachment=True)
 
@@ -550,44 +764,9 @@ def get_progress(filename):
         }), 404
 
     try:
-        # Load the Excel file to check progress
-        workbook = openpyxl.load_workbook(file_path)
-        sheet = workbook.active
-
-        total_numbers = 0
-        processed_numbers = 0
-        success_count = 0
-        fail_count = 0
-        not_on_whatsapp_count = 0
-
-        # Start from the second row (skip header)
-        for row in range(2, sheet.max_row + 1):
-            phone_number = str(sheet.cell(row=row, column=2).value or "")
-            status = str(sheet.cell(
-                row=row, column=3).value or "").strip().lower()
-
-            if phone_number:
-                total_numbers += 1
-
-                if status == "success":
-                    processed_numbers += 1
-                    success_count += 1
-                elif status == "fail":
-                    processed_numbers += 1
-                    fail_count += 1
-                elif status in ["number doesn't exist on whatsapp", "number doesn't exist on whatsapp"]:
-                    processed_numbers += 1
-                    not_on_whatsapp_count += 1
-
-        return jsonify({
-            "success": True,
-            "total_numbers": total_numbers,
-            "processed_numbers": processed_numbers,
-            "success_count": success_count,
-            "fail_count": fail_count,
-            "not_on_whatsapp_count": not_on_whatsapp_count,
-            "progress_percentage": (processed_numbers / total_numbers * 100) if total_numbers > 0 else 0
-        })
+        # Read the running counters from the campaign state
+        progress = get_campaign_store(file_path).progress()
+        return jsonify(dict(progress, success=True))
 
     except Exception as e:
         return jsonify({
@@ -596,311 +775,301 @@ def get_progress(filename):
         })
 
 
-def process_bulk_messages(file_path, message_text, has_image, image_data):
+def process_bulk_messages(campaign, message_text, media_id=None):
+    file_path = campaign.file_path
+    tracker = get_progress_tracker(campaign)
+    checkpointer = None
     try:
-        # Load the Excel file
-        workbook = openpyxl.load_workbook(file_path)
-        sheet = workbook.active
-
-        # Define status cell colors
-        success_fill = PatternFill(
-            start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-        fail_fill = PatternFill(start_color="FFC7CE",
-                                end_color="FFC7CE", fill_type="solid")
-        not_on_whatsapp_fill = PatternFill(
-            start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-
-        # Create a temporary file for the image if provided
-        temp_image_path = None
-        if has_image and image_data:
-            # Remove the data:image/jpeg;base64, prefix
-            image_data = image_data.split(
-                ',')[1] if ',' in image_data else image_data
-
-            # Create a temporary file
-            temp_fd, temp_image_path = tempfile.mkstemp(suffix='.jpg')
-            os.close(temp_fd)
-
-            # Write the decoded image data to the temporary file
-            with open(temp_image_path, 'wb') as f:
-                import base64
-                f.write(base64.b64decode(image_data))
-
-        # Process each row in the Excel file
-        for row in range(2, sheet.max_row + 1):
-            # Get the name and phone number
-            name = str(sheet.cell(row=row, column=1).value or "")
-            phone_number = str(sheet.cell(row=row, column=2).value or "")
-            status = str(sheet.cell(
-                row=row, column=3).value or "").strip().lower()
-
-            # Skip rows that have already been processed
-            if status in ["success", "fail", "number doesn't exist on whatsapp"]:
+        # Send state lives in the campaign store; the workbook is only
+        # rewritten at checkpoints, when the campaign stops, or on download
+        store = get_campaign_store(file_path)
+        checkpointer = Checkpointer(store)
+
+        # Every recipient gets the same stored image
+        media_path = media_store.path(media_id) if media_id else None
+
+        # Pick up ignore list edits made since the upload
+        suppression_index.refresh()
+
+        # Process each row that hasn't been sent yet
+        for row, name, phone_number in store.pending_rows():
+            if campaign.cancelled:
+                break
+
+            # The number as WhatsApp knows it (digits only, no + or 00 prefix)
+            phone_number = whatsapp_number(phone_number)
+
+            # Ignore list changes reach the index through on_ignore_list_change
+            # and opt-outs are written to it directly, so it is current here
+            if phone_number in suppression_index:
+                store.record_outcome(row, STATUS_SUPPRESSED)
+                bulk_messages.inc(status=STATUS_SUPPRESSED)
+                checkpointer.row_done()
+                tracker.row_done(row)
                 continue
 
-            # Skip empty phone numbers
-            if not phone_number:
+            # Numbers already known not to be on WhatsApp need no round trip.
+            # Cache hits and misses are counted by the validation pass only
+            registered = registration_cache.get(phone_number)
+            if registered is False:
+                store.record_outcome(row, STATUS_NOT_ON_WHATSAPP)
+                bulk_messages.inc(status=STATUS_NOT_ON_WHATSAPP)
+                checkpointer.row_done()
+                tracker.row_done(row)
                 continue
 
-            # Format the phone number (remove + if present)
-            if phone_number.startswith('+'):
-                phone_number = phone_number[1:]
+            # Wait while paused and for the next send slot of this account
+            if not campaign.wait_turn():
+                break
 
             # Replace placeholders in the message
             personalized_message = message_text.replace('{name}', name)
 
-            # Send the message
+            # Send the message through the running bot
             try:
-                # Create payload for sending message
-                if has_image and temp_image_path:
-                    # Run JavaScript to send message with image
-                    send_script = f"""
-                    const {MessageMedia} = require('whatsapp-web.js');
-                    const fs = require('fs');
-                    
-                    (async () => {{
-                        try {{
-                            // Check if number exists on WhatsApp
-                            const isRegistered = await client.isRegisteredUser('{phone_number}@c.us');
-                            if (!isRegistered) {{
-                                console.log('NUMBER_NOT_ON_WHATSAPP');
-                                return;
-                            }}
-                            
-                            // Send the image with caption
-                            const media = MessageMedia.fromFilePath('{temp_image_path.replace('\\', '\\\\')}');
-                            await client.sendMessage('{phone_number}@c.us', media, {{ caption: `{personalized_message}` }});
-                            console.log('SUCCESS');
-                        }} catch(error) {{
-                            console.log('ERROR: ' + error.message);
-                        }}
-                    }})();
-                    """
-
-                    # Write the script to a temporary file
-                    temp_script_fd, temp_script_path = tempfile.mkstemp(
-                        suffix='.js')
-                    os.close(temp_script_fd)
-                    with open(temp_script_path, 'w') as f:
-                        f.write(send_script)
-
-                    # Run the script with Node.js
-                    process = subprocess.Popen(
-                        ['node', temp_script_path],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True
-                    )
-                    stdout, stderr = process.communicate()
-
-                    # Clean up the temporary script
-                    os.remove(temp_script_path)
-
-                    # Check the result
-                    if 'SUCCESS' in stdout:
-                        status = "Success"
-                        sheet.cell(row=row, column=3).fill = success_fill
-                    elif 'NUMBER_NOT_ON_WHATSAPP' in stdout:
-                        status = "Number Doesn't Exist on WhatsApp"
-                        sheet.cell(
-                            row=row, column=3).fill = not_on_whatsapp_fill
-                    else:
-                        status = "Fail"
-                        sheet.cell(row=row, column=3).fill = fail_fill
+                send_started = time.perf_counter()
+                result = bot_bridge.send_message(
+                    phone_number, personalized_message, media_path=media_path,
+                    skip_check=registered is True, media_id=media_id)
+                bulk_send_seconds.observe(time.perf_counter() - send_started)
+
+                # Check the result
+                if result['status'] == SEND_SUCCESS:
+                    status = STATUS_SUCCESS
+                    registration_cache.set(phone_number, True)
+                    suppression_index.record_contacted(phone_number)
+                elif result['status'] == SEND_NOT_REGISTERED:
+                    status = STATUS_NOT_ON_WHATSAPP
+                    registration_cache.set(phone_number, False)
                 else:
-                    # Run JavaScript to send text message only
-                    send_script = f"""
-                    (async () => {{
-                        try {{
-                            // Check if number exists on WhatsApp
-                            const isRegistered = await client.isRegisteredUser('{phone_number}@c.us');
-                            if (!isRegistered) {{
-                                console.log('NUMBER_NOT_ON_WHATSAPP');
-                                return;
-                            }}
-                            
-                            // Send the message
-                            await client.sendMessage('{phone_number}@c.us', `{personalized_message}`);
-                            console.log('SUCCESS');
-                        }} catch(error) {{
-                            console.log('ERROR: ' + error.message);
-                        }}
-                    }})();
-                    """
-
-                    # Write the script to a temporary file
-                    temp_script_fd, temp_script_path = tempfile.mkstemp(
-                        suffix='.js')
-                    os.close(temp_script_fd)
-                    with open(temp_script_path, 'w') as f:
-                        f.write(send_script)
-
-                    # Run the script with Node.js
-                    process = subprocess.Popen(
-                        ['node', temp_script_path],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True
-                    )
-                    stdout, stderr = process.communicate()
-
-                    # Clean up the temporary script
-                    os.remove(temp_script_path)
-
-                    # Check the result
-                    if 'SUCCESS' in stdout:
-                        status = "Success"
-                        sheet.cell(row=row, column=3).fill = success_fill
-                    elif 'NUMBER_NOT_ON_WHATSAPP' in stdout:
-                        status = "Number Doesn't Exist on WhatsApp"
-                        sheet.cell(
-                            row=row, column=3).fill = not_on_whatsapp_fill
-                    else:
-                        status = "Fail"
-                        sheet.cell(row=row, column=3).fill = fail_fill
+                    status = STATUS_FAIL
+                    app.logger.error(
+                        f"Error sending message to {phone_number}: {result.get('error')}",
+                        extra={'campaign_id': campaign.id, 'row': row})
 
             except Exception as e:
-                status = "Fail"
-                sheet.cell(row=row, column=3).fill = fail_fill
-                print(f"Error sending message to {phone_number}: {str(e)}")
+                status = STATUS_FAIL
+                app.logger.error(f"Error sending message to {phone_number}: {str(e)}",
+                                 extra={'campaign_id': campaign.id, 'row': row})
 
-            # Update the status in the Excel file
-            sheet.cell(row=row, column=3).value = status
+            # Record the outcome in the campaign state
+            store.record_outcome(row, status)
+            bulk_messages.inc(status=status)
+            checkpointer.row_done()
+            tracker.row_done(row)
 
-            # Save the workbook after each message to preserve progress
-            workbook.save(file_path)
+    except Exception as e:
+        app.logger.exception(f"Error processing bulk messages: {str(e)}",
+                             extra={'campaign_id': campaign.id})
+        raise
 
-            # Add a random delay between messages (10-30 seconds)
-            delay = random.randint(10, 30)
-            time.sleep(delay)
+    finally:
+        # Always checkpoint when the campaign stops, even after an error
+        if checkpointer is not None:
+            try:
+                checkpointer.flush()
+            except Exception as e:
+                app.logger.error(f"Error saving bulk messaging results: {str(e)}",
+                                 extra={'campaign_id': campaign.id})
 
-        # Clean up temporary image file if it exists
-        if temp_image_path and os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
+
+def validate_campaign_numbers(file_path):
+    """Look up which pending numbers are on WhatsApp ahead of sending.
+
+    Runs after upload_excel. Numbers with a fresh cached answer are skipped;
+    the rest are checked with the bot in batches and cached. This is where
+    the campaign's cache hits and misses are counted, once per number.
+    """
+    try:
+        store = get_campaign_store(file_path)
+        numbers = list(dict.fromkeys(
+            whatsapp_number(phone_number) for _, _, phone_number in store.pending_rows()))
+
+        cached = registration_cache.get_many(numbers)
+        unknown = [number for number in numbers if number not in cached]
+        store.add_counters(cache_hits=len(cached), cache_misses=len(unknown))
+
+        for i in range(0, len(unknown), VALIDATION_BATCH_SIZE):
+            batch = unknown[i:i + VALIDATION_BATCH_SIZE]
+            registration_cache.set_many(bot_bridge.check_numbers(batch))
 
     except Exception as e:
-        print(f"Error processing bulk messages: {str(e)}")
+        app.logger.error(f"Error validating numbers for {file_path}: {str(e)}",
+                         extra={'workbook': os.path.basename(file_path)})
+
+
+# Throttled progress pushers, one per campaign: {campaign_id: (campaign, tracker)}
+progress_trackers = {}
+
+
+def get_progress_tracker(campaign):
+    """Return the progress tracker pushing this campaign's updates to its room."""
+    tracked, tracker = progress_trackers.get(campaign.id, (None, None))
+    # A campaign restarted under the same ID gets a new tracker
+    if tracked is not campaign:
+        # Drop the trackers of campaigns the scheduler has forgotten
+        known = {c.id for c in campaign_scheduler.list()}
+        for stale_id in set(progress_trackers) - known:
+            progress_trackers.pop(stale_id, None)
+        tracker = ProgressTracker(
+            campaign.id,
+            snapshot=lambda: campaign_info(campaign),
+            emit=lambda payload: socketio.emit(
+                'campaign_progress', payload, to=campaign_room(campaign.id)))
+        progress_trackers[campaign.id] = (campaign, tracker)
+    return tracker
+
+
+def notify_campaign_state(campaign):
+    """Push a campaign's state changes to its room right away."""
+    get_progress_tracker(campaign).flush()
+
+
+# Bulk campaigns are queued here and paced per WhatsApp account
+campaign_scheduler = CampaignScheduler(
+    process_bulk_messages, on_state_change=notify_campaign_state)
 
 # WebSocket event handlers
 
 
 @socketio.on('connect')
 def handle_connect():
-    """Handle WebSocket connection."""
-    global bot_connected, bot_process
+    """Handle WebSocket connection; only logged-in dashboards may connect."""
+    if 'logged_in' not in session:
+        return False
     client_id = request.sid
     app.logger.info(f"Client connected: {client_id}")
-
-    # Check if bot process is running
-    bot_running = bot_process is not None and bot_process.poll() is None
-
-    # Determine status
-    status = 'connected' if bot_connected else 'disconnected'
-    if bot_running and not bot_connected:
-        status = 'connecting'
+    socketio_clients.inc()
+    metrics_sampler.start()
 
     # Send initial status
-    emit('bot_status', {
-        'connected': bot_connected,
-        'status': status,
-        'bot_running': bot_running
-    })
+    status = bot_state.status_payload()
+    emit('bot_status', status)
 
     # Only send QR code info if the bot is in a connecting state
     # or if it's already connected
-    if status == 'connecting' or bot_connected:
-        qr_exists = os.path.exists('qr_code.png')
-        emit('qr_code', {
-            'exists': qr_exists,
-            'qr_code_url': f'/get_qr_code?t={int(time.time())}' if qr_exists else None,
-            'status': 'waiting_for_scan' if qr_exists else 'no_qr'
-        })
+    if status['status'] == 'connecting' or status['connected']:
+        emit('qr_code', bot_state.qr_payload())
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
     app.logger.info(f"Client disconnected: {request.sid}")
+    socketio_clients.dec()
 
-# Background task for sending updates
 
+@socketio.on('subscribe_campaign')
+def handle_subscribe_campaign(data):
+    """Join a campaign's room to receive its campaign_progress events."""
+    if 'logged_in' not in session:
+        return
+    campaign_id = (data or {}).get('campaign_id')
+    if not campaign_id:
+        return
+    join_room(campaign_room(campaign_id))
 
-def background_update_task():
-    """Background task to periodically update clients with latest information."""
-    global should_run_background_tasks, bot_connected, bot_process
+    # Send the current state right away instead of waiting for the next row
+    try:
+        campaign = campaign_scheduler.get(campaign_id)
+    except CampaignError:
+        return
+    emit('campaign_progress', get_progress_tracker(campaign).payload())
 
-    last_qr_status = False
-    last_bot_status = bot_connected
-    last_bot_running = bot_process is not None and bot_process.poll() is None
 
-    while should_run_background_tasks:
-        try:
-            # Check if bot process is running
-            bot_running = bot_process is not None and bot_process.poll() is None
-
-            # Determine status
-            status = 'connected' if bot_connected else 'disconnected'
-            if bot_running and not bot_connected:
-                status = 'connecting'
-
-            # Check if QR code exists
-            qr_exists = os.path.exists('qr_code.png')
-
-            # Only emit QR code updates if the bot is in a connecting state
-            # or if it's already connected
-            if (status == 'connecting' or bot_connected) and qr_exists != last_qr_status:
-                socketio.emit('qr_code', {
-                    'exists': qr_exists,
-                    'qr_code_url': f'/get_qr_code?t={int(time.time())}' if qr_exists else None,
-                    'status': 'waiting_for_scan' if qr_exists else 'no_qr'
-                })
-                last_qr_status = qr_exists
-
-            # Check bot status and emit if changed
-            if bot_connected != last_bot_status or bot_running != last_bot_running:
-                socketio.emit('bot_status', {
-                    'connected': bot_connected,
-                    'status': status,
-                    'bot_running': bot_running
-                })
-                last_bot_status = bot_connected
-                last_bot_running = bot_running
-
-            time.sleep(1)
-        except Exception as e:
-            app.logger.error(f"Error in background task: {str(e)}")
-            time.sleep(5)  # Wait longer if there's an error
+@socketio.on('unsubscribe_campaign')
+def handle_unsubscribe_campaign(data):
+    campaign_id = (data or {}).get('campaign_id')
+    if campaign_id:
+        leave_room(campaign_room(campaign_id))
 
 
 def get_system_info():
     """Helper function to get system information"""
+    # Sampling starts with the first dashboard that asks for it
+    metrics_sampler.start()
+    static_info = static_system_info()
+
     # Get server time
     server_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # Get system uptime
-    try:
-        uptime_seconds = time.time() - psutil.boot_time()
-        uptime = str(timedelta(seconds=int(uptime_seconds)))
-    except:
+    if static_info["boot_time"] is not None:
+        uptime = str(timedelta(seconds=int(time.time() - static_info["boot_time"])))
+    else:
         uptime = "Unknown"
 
-    # Get Node.js version if available
-    try:
-        node_version = subprocess.check_output(
-            ['node', '--version']).decode().strip()
-    except:
-        node_version = "Not installed"
-
-    # Get Python version
-    python_version = f"{platform.python_version()} ({platform.python_implementation()})"
-
     return {
         "server_time": server_time,
         "uptime": uptime,
-        "node_version": node_version,
-        "python_version": python_version
+        "node_version": static_info["node_version"],
+        "python_version": static_info["python_version"],
+        "metrics": metrics_sampler.latest()
     }
 
 
+def publish_system_metrics(sample):
+    """Push each metrics sample to dashboards if enabled."""
+    if SYSTEM_METRICS_PUSH:
+        socketio.emit('system_metrics', sample)
+
+
+# Live CPU/memory/fd metrics of the dashboard and the bot, kept in memory
+SYSTEM_METRICS_PUSH = os.environ.get(
+    'SYSTEM_METRICS_PUSH', '').lower() in ('1', 'true', 'yes')
+metrics_sampler = MetricsSampler(
+    get_processes=lambda: {
+        "dashboard": os.getpid(),
+        "bot": bot_supervisor.pid
+    },
+    on_sample=publish_system_metrics)
+
+
+@app.route('/system_metrics')
+@login_required
+def system_metrics():
+    """Recent process metrics samples, oldest first."""
+    metrics_sampler.start()
+    return jsonify({
+        "success": True,
+        "interval": metrics_sampler.interval,
+        "samples": metrics_sampler.history()
+    })
+
+
+# Read from their owners when /metrics is scraped
+prometheus_metrics.callback_gauge(
+    'dashboard_bot_restarts_total', 'Automatic restarts of the bot process',
+    lambda: bot_supervisor.restarts, type_name='counter')
+prometheus_metrics.callback_gauge(
+    'dashboard_bot_running', 'Whether the bot process is running',
+    lambda: int(is_bot_running()))
+prometheus_metrics.callback_gauge(
+    'dashboard_session_cleanups_total', 'Retired WhatsApp sessions deleted',
+    lambda: session_cleaner.runs, type_name='counter')
+prometheus_metrics.callback_gauge(
+    'dashboard_session_cleanup_seconds_total', 'Time spent deleting retired sessions',
+    lambda: session_cleaner.total_seconds, type_name='counter')
+
+
+def metrics_authorized():
+    """Whether this request may read /metrics."""
+    if METRICS_PUBLIC or 'logged_in' in session:
+        return True
+    if not METRICS_TOKEN:
+        return False
+    authorization = request.headers.get('Authorization', '')
+    return hmac.compare_digest(authorization.encode('utf-8'),
+                               f'Bearer {METRICS_TOKEN}'.encode('utf-8'))
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics; needs a login or METRICS_TOKEN unless METRICS_PUBLIC is set."""
+    if not metrics_authorized():
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return prometheus_metrics.render(), 200, {'Content-Type': prometheus_metrics.CONTENT_TYPE}
+
+
 @app.route('/upload_image', methods=['POST'])
 @login_required
 def upload_image():
@@ -923,49 +1092,33 @@ def upload_image():
         return jsonify({"message": "At least one valid keyword is required", "success": False})
 
     if file and allowed_image_file(file.filename):
-        # Generate a unique filename using uuid
-        filename = secure_filename(file.filename)
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{str(uuid.uuid4())}.{file_ext}"
-
         # Create pics directory if it doesn't exist
-        if not os.path.exists('pics'):
-            os.makedirs('pics')
+        if not os.path.exists(PICS_FOLDER):
+            os.makedirs(PICS_FOLDER)
 
-        # Save the file
-        file_path = os.path.join('pics', unique_filename)
-        file.save(file_path)
-
-        # Update the image_keywords.json file
+        # Hash, downscale and thumbnail the upload under a unique filename
+        try:
+            unique_filename, metadata = ingest_image(
+                file.read(), PICS_FOLDER, find_by_hash=image_catalog.find_by_hash)
+        except DuplicateImageError as e:
+            return jsonify({"message": str(e), "success": False,
+                            "duplicate_of": e.filename})
+        except ImageIngestError as e:
+            return jsonify({"message": str(e), "success": False})
+
+        # Tag the image in the catalogue
         try:
-            # Load existing data
-            if os.path.exists('image_keywords.json'):
-                with open('image_keywords.json', 'r') as f:
-                    try:
-                        image_data = json.load(f)
-                    except json.JSONDecodeError:
-                        image_data = {}
-            else:
-                image_data = {}
-
-            # Update data with new image
-            for keyword in keyword_list:
-                if keyword not in image_data:
-                    image_data[keyword] = []
-
-                # Add the image if not already present
-                if unique_filename not in image_data[keyword]:
-                    image_data[keyword].append(unique_filename)
-
-            # Save the updated data
-            with open('image_keywords.json', 'w') as f:
-                json.dump(image_data, f, indent=2)
+            image_catalog.add(unique_filename, keyword_list, metadata)
 
             return jsonify({
                 "message": "Image uploaded successfully",
                 "success": True,
                 "filename": unique_filename,
-                "keywords": keyword_list
+                "keywords": keyword_list,
+                "width": metadata["width"],
+                "height": metadata["height"],
+                "bytes": metadata["bytes"],
+                "original_bytes": metadata["original_bytes"]
             })
 
         except Exception as e:
@@ -977,48 +1130,21 @@ def upload_image():
 @app.route('/get_images', methods=['GET'])
 @login_required
 def get_images():
-    # Load image keywords data
-    if os.path.exists('image_keywords.json'):
-        with open('image_keywords.json', 'r') as f:
-            try:
-                image_data = json.load(f)
-            except json.JSONDecodeError:
-                image_data = {}
-    else:
-        image_data = {}
-
-    # Get list of actual image files in the pics directory
-    pic_files = []
-    if os.path.exists('pics'):
-        pic_files = [f for f in os.listdir('pics') if os.path.isfile(os.path.join('pics', f))
-                     and allowed_image_file(f)]
-
-    # Create a list of images with their keywords
-    images = []
-    for keyword, files in image_data.items():
-        for file in files:
-            if file in pic_files:  # Only include files that actually exist
-                image_info = {
-                    "filename": file,
-                    "path": f"/pics/{file}",
-                    "keywords": []
-                }
-                # Find all keywords associated with this file
-                for k, f_list in image_data.items():
-                    if file in f_list:
-                        image_info["keywords"].append(k)
-
-                # Only add each image once
-                if not any(img["filename"] == file for img in images):
-                    images.append(image_info)
-
-    return jsonify({"images": images})
+    # Optionally only list the images of one keyword
+    keyword = request.args.get('keyword', '').strip().lower() or None
+    return jsonify({"images": image_catalog.images(keyword)})
 
 
 @app.route('/pics/<filename>')
 @login_required
 def serve_image(filename):
-    return send_file(os.path.join('pics', filename))
+    return send_upload(os.path.join('pics', filename))
+
+
+@app.route('/pics/thumbs/<filename>')
+@login_required
+def serve_thumbnail(filename):
+    return send_upload(os.path.join('pics', THUMBNAILS_SUBFOLDER, filename))
 
 
 @app.route('/delete_image', methods=['POST'])
@@ -1036,29 +1162,11 @@ def delete_image():
         return jsonify({"message": "File not found", "success": False})
 
     try:
-        # Remove the file
-        os.remove(file_path)
-
-        # Update the image_keywords.json file
-        if os.path.exists('image_keywords.json'):
-            with open('image_keywords.json', 'r') as f:
-                try:
-                    image_data = json.load(f)
-
-                    # Remove the filename from all keyword lists
-                    for keyword in image_data:
-                        if filename in image_data[keyword]:
-                            image_data[keyword].remove(filename)
-
-                    # Remove any empty keyword entries
-                    image_data = {k: v for k, v in image_data.items() if v}
-
-                    # Save the updated data
-                    with open('image_keywords.json', 'w') as f:
-                        json.dump(image_data, f, indent=2)
+        # Remove the file and its thumbnail
+        remove_image_files(PICS_FOLDER, filename, image_catalog.metadata(filename))
 
-                except json.JSONDecodeError:
-                    pass
+        # Remove the filename from all keyword lists
+        image_catalog.remove(filename)
 
         return jsonify({
             "message": "Image deleted successfully",
@@ -1073,79 +1181,187 @@ def allowed_image_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
 
+# Keyword <-> image index over image_keywords.json and pics/
+image_catalog = ImageCatalog(IMAGE_KEYWORDS_FILE, PICS_FOLDER,
+                             is_image=allowed_image_file)
+
+
 @app.route('/get_ignore_list')
 @login_required
 def get_ignore_list():
-    """Endpoint to get the numbers that are in the ignore list"""
+    """Endpoint to get a page of the numbers in the ignore list, optionally searched"""
     try:
-        ignore_list_file = 'ignore_list.json'
-        if os.path.exists(ignore_list_file):
-            with open(ignore_list_file, 'r') as f:
-                try:
-                    data = f.read()
-                    # Remove BOM and other potential invalid characters
-                    if data and data[0] == '\ufeff':
-                        data = data[1:]
-                    # Clean the data of any non-printable characters
-                    data = data.replace('\x00', '')
-                    data = data.replace('/[^\x20-\x7E\r\n]/g', '')
-
-                    # Handle empty or malformed file
-                    if data.strip() == '':
-                        return jsonify({"success": True, "ignored_numbers": []})
-
-                    # Try to parse the JSON
-                    ignore_list = json.loads(data)
-                    return jsonify({"success": True, "ignored_numbers": ignore_list})
-                except json.JSONDecodeError as e:
-                    return jsonify({"success": False, "message": f"Error parsing ignore list: {str(e)}"})
-        else:
-            return jsonify({"success": True, "ignored_numbers": []})
+        result = ignore_list_store.page(
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', IGNORE_LIST_PAGE_SIZE, type=int),
+            query=request.args.get('q', ''))
+        return jsonify({
+            "success": True,
+            "ignored_numbers": result['numbers'],
+            "total": result['total'],
+            "page": result['page'],
+            "per_page": result['per_page'],
+            "pages": result['pages'],
+            "seq": result['seq']
+        })
     except Exception as e:
         return jsonify({"success": False, "message": f"Error getting ignore list: {str(e)}"})
 
 
+def update_ignore_list(added=(), removed=()):
+    """Add and remove ignore list numbers; returns the (added, removed) that changed.
+
+    The running bot owns the file, so the change goes through it; without a
+    bot the file is written here and the bot loads it when it starts.
+    """
+    try:
+        bot_bridge.update_ignore_list(added, removed)
+    except BotBridgeError:
+        if is_bot_running():
+            raise
+        added, removed = ignore_list_store.apply(added, removed)
+        if added or removed:
+            ignore_list_store.save()
+    else:
+        added, removed = ignore_list_store.apply(added, removed)
+
+    if added or removed:
+        suppression_index.refresh()
+    return added, removed
+
+
+def ignore_list_request_numbers():
+    """Numbers from a JSON body with "numbers" (a list) or "number"."""
+    data = request.get_json(silent=True) or {}
+    values = data.get('numbers')
+    if values is None:
+        values = [data.get('number') or request.form.get('number', '')]
+    if not isinstance(values, list):
+        values = [values]
+    return clean_numbers(values)
+
+
+@app.route('/add_to_ignore_list', methods=['POST'])
+@login_required
+def add_to_ignore_list():
+    """Endpoint to add numbers to the ignore list"""
+    try:
+        numbers, invalid = ignore_list_request_numbers()
+        if not numbers:
+            return jsonify({"success": False, "message": "No valid phone numbers given"})
+        added, _ = update_ignore_list(added=numbers)
+        return jsonify({"success": True, "added": added, "invalid": invalid})
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error updating ignore list: {str(e)}"})
+
+
+@app.route('/remove_from_ignore_list', methods=['POST'])
+@login_required
+def remove_from_ignore_list():
+    """Endpoint to remove numbers from the ignore list"""
+    try:
+        numbers, invalid = ignore_list_request_numbers()
+        if not numbers:
+            return jsonify({"success": False, "message": "No valid phone numbers given"})
+        _, removed = update_ignore_list(removed=numbers)
+        return jsonify({"success": True, "removed": removed, "invalid": invalid})
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error updating ignore list: {str(e)}"})
+
+
+@app.route('/ignore_list_changes')
+@login_required
+def get_ignore_list_changes():
+    """Endpoint for clients that missed updates: the deltas after ?since=<seq>"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        changes = ignore_list_store.changes_since(since)
+        if changes is None:
+            # Too far behind; the client re-reads the list instead
+            return jsonify({"success": True, "resync": True, "seq": ignore_list_store.version})
+        return jsonify({"success": True, "resync": False, "changes": changes,
+                        "seq": ignore_list_store.version})
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error getting ignore list changes: {str(e)}"})
+
+
+def on_ignore_list_change(delta):
+    """Apply an ignore list delta to the suppression index and broadcast it"""
+    suppression_index.catch_up()
+    notify_ignore_list_change(delta)
+
+
 # Function to broadcast ignore list changes to connected clients
-def notify_ignore_list_change():
-    """Broadcast to all clients that the ignore list has changed"""
+def notify_ignore_list_change(delta):
+    """Broadcast an ignore list delta (seq, added, removed, total) to all clients.
+
+    Only logged-in dashboards can connect (see handle_connect).
+    """
     try:
-        socketio.emit('ignore_list_updated')
+        socketio.emit('ignore_list_updated', delta)
     except Exception as e:
         app.logger.error(f"Error emitting ignore list update: {str(e)}")
 
 
 @app.route('/notify_ignore_list_update', methods=['POST'])
+@bot_required
 def notify_ignore_list_update():
-    """Endpoint to notify all connected clients that the ignore list has been updated"""
+    """Endpoint for the bot to report ignore list changes.
+
+    The file is re-read and compared with the cached list; the difference
+    is broadcast to the dashboards as a delta. A body is ignored, so the
+    file the bot wrote stays the only source of the list.
+    """
     try:
-        notify_ignore_list_change()
-        return jsonify({"success": True})
+        # Don't wait for the file's mtime to tell us
+        ignore_list_store.refresh(force=True)
+        return jsonify({"success": True, "seq": ignore_list_store.version})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
 
-if __name__ == '__main__':
-    app.logger.info("Starting the Flask application...")
+@app.route('/suppression')
+@login_required
+def get_suppression_stats():
+    """Sizes of the suppression index sources"""
+    try:
+        suppression_index.refresh()
+        return jsonify({"success": True, "suppression": suppression_index.stats()})
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error getting suppression stats: {str(e)}"})
 
-    # Start background task in a separate thread
-    background_thread = threading.Thread(target=background_update_task)
-    background_thread.daemon = True
-    background_thread.start()
 
+@app.route('/opt_out', methods=['POST'])
+@login_required
+def opt_out():
+    """Add a number to (or with "remove": true, take it off) the opt-out list"""
     try:
-        # Update the SocketIO run method to fix WebSocket issues
-        # Note: We're specifically using gevent-websocket for the WebSocket transport
-        # Create a middleware for the WebSocket handler
-        from geventwebsocket.handler import WebSocketHandler
-        from gevent.pywsgi import WSGIServer
-
-        # Use gevent with WebSocketHandler
-        server = WSGIServer(('0.0.0.0', 8080), app,
-                            handler_class=WebSocketHandler)
-        socketio.init_app(app)
-        server.serve_forever()
-    finally:
-        # Signal background thread to stop
-        should_run_background_tasks = False
-        if background_thread.is_alive():
-            background_thread.join(timeout=5)
+        data = request.get_json(silent=True) or request.form
+        number = data.get('number', '')
+        if data.get('remove') in (True, 'true', '1'):
+            changed = suppression_index.remove_opt_out(number)
+            message = "Opt-out removed"
+        else:
+            changed = suppression_index.add_opt_out(number)
+            message = "Number opted out"
+        if not changed:
+            return jsonify({"success": False, "message": "Invalid phone number"})
+        return jsonify({"success": True, "message": message})
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error updating opt-outs: {str(e)}"})
+
+
+if __name__ == '__main__':
+    app.logger.info("Starting the Flask application...")
+
+    # Update the SocketIO run method to fix WebSocket issues
+    # Note: We're specifically using gevent-websocket for the WebSocket transport
+    # Create a middleware for the WebSocket handler
+    from geventwebsocket.handler import WebSocketHandler
+    from gevent.pywsgi import WSGIServer
+
+    # Use gevent with WebSocketHandler
+    server = WSGIServer(('0.0.0.0', 8080), app,
+                        handler_class=WebSocketHandler)
+    socketio.init_app(app)
+    server.serve_forever()
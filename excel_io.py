@@ -0,0 +1,117 @@
+"""Streaming access to bulk messaging contact sheets.
+
+Contact sheets have the name in column A, the phone number in column B and
+the send status in column C, with a header in the first row. Readers here
+open workbooks in read-only mode and walk the rows with ``iter_rows`` so
+memory stays flat however long the sheet is.
+"""
+import os
+import tempfile
+
+import openpyxl
+from openpyxl.styles import PatternFill
+
+# Status values written into column C (compared case-insensitively)
+STATUS_SUCCESS = "success"
+STATUS_FAIL = "fail"
+STATUS_NOT_ON_WHATSAPP = "number doesn't exist on whatsapp"
+# Set when the sheet is loaded, for numbers that are never sent to
+STATUS_INVALID_NUMBER = "invalid number"
+STATUS_DUPLICATE = "duplicate number"
+# Set at load or send time for numbers in the suppression index
+STATUS_SUPPRESSED = "suppressed"
+PROCESSED_STATUSES = {STATUS_SUCCESS, STATUS_FAIL, STATUS_NOT_ON_WHATSAPP,
+                      STATUS_INVALID_NUMBER, STATUS_DUPLICATE, STATUS_SUPPRESSED}
+
+# Labels written back into the sheet for each status
+STATUS_LABELS = {
+    STATUS_SUCCESS: "Success",
+    STATUS_FAIL: "Fail",
+    STATUS_NOT_ON_WHATSAPP: "Number Doesn't Exist on WhatsApp",
+    STATUS_INVALID_NUMBER: "Invalid Number",
+    STATUS_DUPLICATE: "Duplicate Number",
+    STATUS_SUPPRESSED: "Suppressed",
+}
+
+# Status cell colors
+STATUS_FILLS = {
+    STATUS_SUCCESS: PatternFill(
+        start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),
+    STATUS_FAIL: PatternFill(
+        start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),
+    STATUS_NOT_ON_WHATSAPP: PatternFill(
+        start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"),
+    STATUS_INVALID_NUMBER: PatternFill(
+        start_color="D9D9D9", end_color="D9D9D9", fill_type="solid"),
+    STATUS_DUPLICATE: PatternFill(
+        start_color="DDEBF7", end_color="DDEBF7", fill_type="solid"),
+    STATUS_SUPPRESSED: PatternFill(
+        start_color="E4DFEC", end_color="E4DFEC", fill_type="solid"),
+}
+
+NAME_COLUMN = 1
+PHONE_COLUMN = 2
+STATUS_COLUMN = 3
+
+
+def _cell_text(value):
+    return str(value if value is not None else "")
+
+
+def open_contact_sheet(file_path):
+    """Open a workbook in streaming mode and return (workbook, active sheet)."""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    return workbook, workbook.active
+
+
+def count_columns(sheet):
+    """Return the number of columns, even if the file has no dimension info."""
+    if sheet.max_column and sheet.max_column > 1:
+        return sheet.max_column
+    for header in sheet.iter_rows(min_row=1, max_row=1, values_only=True):
+        return len(header)
+    return 0
+
+
+def iter_contact_rows(file_path):
+    """Yield (row_number, name, phone_number, status) for every data row.
+
+    ``status`` is stripped and lower-cased; empty cells come back as "".
+    """
+    workbook, sheet = open_contact_sheet(file_path)
+    try:
+        rows = sheet.iter_rows(min_row=2, max_col=STATUS_COLUMN, values_only=True)
+        for row_number, values in enumerate(rows, start=2):
+            # Short rows are not padded in read-only mode
+            values = tuple(values) + (None,) * (STATUS_COLUMN - len(values))
+            name, phone_number, status = values[:STATUS_COLUMN]
+            yield (row_number, _cell_text(name), _cell_text(phone_number),
+                   _cell_text(status).strip().lower())
+    finally:
+        workbook.close()
+
+
+def save_workbook_atomic(workbook, file_path):
+    """Save next to the target and rename over it so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    temp_fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix='.tmp_', suffix=os.path.splitext(file_path)[1])
+    os.close(temp_fd)
+    try:
+        workbook.save(temp_path)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_statuses(file_path, statuses):
+    """Write (row_number, status) pairs into the status column of a workbook."""
+    workbook = openpyxl.load_workbook(file_path)
+    sheet = workbook.active
+    for row_number, status in statuses:
+        cell = sheet.cell(row=row_number, column=STATUS_COLUMN)
+        cell.value = STATUS_LABELS[status]
+        cell.fill = STATUS_FILLS[status]
+    save_workbook_atomic(workbook, file_path)
@@ -16,7 +16,14 @@ const tokenizer = new natural.WordTokenizer();
 const threadBackups = {}; // Store thread backups in case of errors
 
 const IGNORE_LIST_FILE = path.join(__dirname, 'ignore_list.json');
+// Changes within this many milliseconds are written to disk together
+const IGNORE_LIST_SAVE_DELAY_MS = 200;
 const ignoreList = new Set();
+let ignoreListSaveTimer = null;
+let ignoreListWriting = false;
+let ignoreListDirty = false;
+// Changes the dashboard is told about once they are on disk
+const ignoreListPendingDelta = { added: new Set(), removed: new Set() };
 
 // Load image keywords data
 let imageKeywordsData = {};
@@ -172,12 +179,40 @@ async function sendImagesToUser(client, senderNumber, images) {
 }
 
 function saveIgnoreList() {
-    const ignoreArray = Array.from(ignoreList);
+    // Coalesce bursts of changes into one write, and never run two at once
+    ignoreListDirty = true;
+    if (ignoreListSaveTimer || ignoreListWriting) {
+        return;
+    }
+    ignoreListSaveTimer = setTimeout(writeIgnoreList, IGNORE_LIST_SAVE_DELAY_MS);
+}
+
+async function writeIgnoreList() {
+    ignoreListSaveTimer = null;
+    ignoreListWriting = true;
+    ignoreListDirty = false;
+    const delta = {
+        added: Array.from(ignoreListPendingDelta.added),
+        removed: Array.from(ignoreListPendingDelta.removed)
+    };
+    ignoreListPendingDelta.added.clear();
+    ignoreListPendingDelta.removed.clear();
+    // Write a temporary file and rename it so readers never see a partial list
+    const tempFile = `${IGNORE_LIST_FILE}.tmp`;
     try {
-        const jsonData = JSON.stringify(ignoreArray, null, 2);
-        fs.writeFileSync(IGNORE_LIST_FILE, jsonData, { encoding: 'utf8' });
+        const jsonData = JSON.stringify(Array.from(ignoreList));
+        await fs.promises.writeFile(tempFile, jsonData, { encoding: 'utf8' });
+        await fs.promises.rename(tempFile, IGNORE_LIST_FILE);
+        if (delta.added.length > 0 || delta.removed.length > 0) {
+            notifyIgnoreListUpdate();
+        }
     } catch (error) {
         console.error('Error saving ignore list:', error);
+    } finally {
+        ignoreListWriting = false;
+        if (ignoreListDirty) {
+            saveIgnoreList();
+        }
     }
 }
 
@@ -223,34 +258,56 @@ function loadIgnoreList() {
     }
 }
 
-function addToIgnoreList(number) {
-    ignoreList.add(number);
-    saveIgnoreList();
-    // Notify dashboard of the change
+// Tell the dashboard the list changed; it re-reads the file and broadcasts
+// the delta to browsers. The token proves the request comes from the bot
+function notifyIgnoreListUpdate() {
     try {
         const fetch = require('node-fetch');
         fetch('http://0.0.0.0:8080/notify_ignore_list_update', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
+            headers: { 'X-Bot-Token': process.env.BOT_NOTIFY_TOKEN || '' }
         }).catch(err => console.error('Error notifying dashboard of ignore list update:', err));
     } catch (error) {
         console.error('Error requiring node-fetch or notifying dashboard:', error);
     }
 }
 
-function removeFromIgnoreList(number) {
-    ignoreList.delete(number);
-    saveIgnoreList();
-    // Notify dashboard of the change
-    try {
-        const fetch = require('node-fetch');
-        fetch('http://0.0.0.0:8080/notify_ignore_list_update', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
-        }).catch(err => console.error('Error notifying dashboard of ignore list update:', err));
-    } catch (error) {
-        console.error('Error requiring node-fetch or notifying dashboard:', error);
+// Apply a change to the ignore list and return the numbers that actually changed
+function updateIgnoreList(added = [], removed = [], notify = true) {
+    const changed = { added: [], removed: [] };
+    const pending = ignoreListPendingDelta;
+    added.forEach(number => {
+        if (!ignoreList.has(number)) {
+            ignoreList.add(number);
+            changed.added.push(number);
+            // Adding back a number removed since the last save cancels out
+            if (notify && !pending.removed.delete(number)) {
+                pending.added.add(number);
+            }
+        }
+    });
+    removed.forEach(number => {
+        if (ignoreList.delete(number)) {
+            changed.removed.push(number);
+            if (notify && !pending.added.delete(number)) {
+                pending.removed.add(number);
+            }
+        }
+    });
+
+    if (changed.added.length > 0 || changed.removed.length > 0) {
+        // The dashboard is notified of the change after it is saved
+        saveIgnoreList();
     }
+    return changed;
+}
+
+function addToIgnoreList(number) {
+    updateIgnoreList([number], []);
+}
+
+function removeFromIgnoreList(number) {
+    updateIgnoreList([], [number]);
 }
 
 function isIgnored(number) {
@@ -1163,6 +1220,7 @@ module.exports = {
     isIgnored,
     addToIgnoreList,
     removeFromIgnoreList,
+    updateIgnoreList,
     handleHumanRequest,
     isRequestingImages,
     findImagesByKeywords,
@@ -0,0 +1,56 @@
+"""Cache validators and policies for files served by the dashboard.
+
+Files get a strong ETag built from their nanosecond mtime and size, and
+conditional (If-None-Match / If-Modified-Since) and Range requests are
+answered by werkzeug. Uploads named with a fresh UUID, like the images in
+``pics/``, never change and are cached for a long time; any other file, such
+as the QR code, which is rewritten in place, must be revalidated on every
+use, which costs a 304 at most.
+"""
+import os
+import re
+
+from flask import current_app, send_file
+
+IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', str(365 * 24 * 3600)))
+
+# <uuid4>.<ext>, the names image_ingest gives uploads
+_UUID_FILENAME = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.[A-Za-z0-9]+')
+
+
+def file_version(path):
+    """Strong validator for ``path``, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def send_cached_file(path, mimetype=None, max_age=None, immutable=False):
+    """``send_file`` with a strong ETag and an explicit Cache-Control.
+
+    Without ``max_age`` the response must be revalidated before every reuse.
+    Responses are ``private`` since every route is behind the login.
+    """
+    # Resolve relative paths the way send_file does
+    path = os.path.join(current_app.root_path, path)
+    response = send_file(path, mimetype=mimetype, etag=file_version(path),
+                         conditional=True, max_age=max_age)
+    cache_control = response.cache_control
+    cache_control.public = False
+    cache_control.private = True
+    if max_age:
+        cache_control.immutable = immutable
+    else:
+        cache_control.no_cache = True
+        cache_control.max_age = 0
+    return response
+
+
+def send_upload(path):
+    """Serve an uploaded file, caching it as immutable only if it is UUID-named."""
+    if _UUID_FILENAME.fullmatch(os.path.basename(path)):
+        return send_cached_file(path, max_age=IMAGE_CACHE_MAX_AGE, immutable=True)
+    return send_cached_file(path)
@@ -0,0 +1,212 @@
+"""The bot's ignore list, cached for the dashboard.
+
+The bot keeps the numbers its AI assistant doesn't answer in
+``ignore_list.json`` and calls ``/notify_ignore_list_update`` after each
+change. The store parses the file once and keeps it in memory; it is only
+re-read when its mtime or size changes or when the hook invalidates it.
+Reads page and search the cached list, and changes made from the dashboard
+are applied as deltas instead of rewriting the list.
+
+Every change gets the next sequence number (``version``) and is reported to
+``on_change`` as a delta of added and removed numbers. The last few deltas
+are kept so a client that missed some can catch up without re-reading the
+whole list.
+"""
+import collections
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from phone_numbers import whatsapp_number, E164_MIN_DIGITS, E164_MAX_DIGITS
+
+IGNORE_LIST_FILE = 'ignore_list.json'
+IGNORE_LIST_PAGE_SIZE = 100
+IGNORE_LIST_MAX_PAGE_SIZE = 1000
+# Deltas kept for clients catching up; older clients re-read the list
+IGNORE_LIST_HISTORY = 100
+
+_NON_PRINTABLE = re.compile(r'[^\x20-\x7E\r\n]')
+_NON_DIGITS = re.compile(r'\D')
+
+logger = logging.getLogger(__name__)
+
+
+def clean_numbers(values):
+    """Split ``values`` into (numbers as the bot stores them, invalid values)."""
+    numbers, invalid = [], []
+    for value in values:
+        number = whatsapp_number(value)
+        if E164_MIN_DIGITS <= len(number) <= E164_MAX_DIGITS:
+            numbers.append(number)
+        else:
+            invalid.append(value)
+    return list(dict.fromkeys(numbers)), invalid
+
+
+def _parse(data):
+    # Same cleanup as loadIgnoreList in functions.js
+    data = _NON_PRINTABLE.sub('', data.lstrip('\ufeff'))
+    if not data.strip():
+        return []
+    numbers = json.loads(data)
+    if not isinstance(numbers, list):
+        raise ValueError('Ignore list is not a JSON array')
+    return [str(number) for number in numbers]
+
+
+class IgnoreListStore:
+    """In-memory copy of ``ignore_list.json``.
+
+    ``version`` increases whenever the cached list changes, so consumers can
+    tell whether anything they derived from it is stale.
+    ``on_change(delta)`` is called after each change with the delta dict
+    (``seq``, ``added``, ``removed``, ``total``).
+    """
+
+    def __init__(self, path=IGNORE_LIST_FILE, on_change=None,
+                 history=IGNORE_LIST_HISTORY):
+        self.path = path
+        self.on_change = on_change
+        self.version = 0
+        self._numbers = []
+        self._members = set()
+        self._stat = None
+        self._history = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self, force=False):
+        """Re-read the file if it changed (or always, with ``force``)."""
+        stat = self._file_stat()
+        if stat == self._stat and not force:
+            return False
+        try:
+            if stat is None:
+                numbers = []
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    numbers = _parse(f.read())
+        except (OSError, ValueError) as e:
+            # Keep the cached list; the bot resets a broken file when it loads it
+            logger.error(f"Error reading ignore list: {str(e)}")
+            return False
+        with self._lock:
+            numbers = list(dict.fromkeys(numbers))
+            members = set(numbers)
+            first_load = self.version == 0
+            added = [number for number in numbers if number not in self._members]
+            removed = [number for number in self._numbers if number not in members]
+            self._numbers = numbers
+            self._members = members
+            self._stat = stat
+            if first_load:
+                # The baseline; there is nothing to catch up from
+                self.version = 1
+                return True
+            delta = self._record(added, removed)
+        self._notify(delta)
+        return delta is not None
+
+    def _record(self, added, removed):
+        # Called with the lock held; returns the delta or None if nothing changed
+        if not added and not removed:
+            return None
+        self.version += 1
+        delta = {'seq': self.version, 'added': added, 'removed': removed,
+                 'total': len(self._numbers)}
+        self._history.append(delta)
+        return delta
+
+    def _notify(self, delta):
+        if delta is None or self.on_change is None:
+            return
+        try:
+            self.on_change(delta)
+        except Exception as e:
+            logger.error(f"Error reporting ignore list change {delta['seq']}: {str(e)}")
+
+    def changes_since(self, seq):
+        """Deltas after ``seq``, oldest first, or None if they are no longer kept."""
+        self.refresh()
+        with self._lock:
+            if seq == self.version:
+                return []
+            changes = [delta for delta in self._history if delta['seq'] > seq]
+            if seq > self.version or not changes or changes[0]['seq'] != seq + 1:
+                return None
+            return changes
+
+    def numbers(self):
+        self.refresh()
+        return list(self._numbers)
+
+    def __contains__(self, number):
+        self.refresh()
+        return whatsapp_number(number) in self._members
+
+    def __len__(self):
+        self.refresh()
+        return len(self._numbers)
+
+    def page(self, page=1, per_page=IGNORE_LIST_PAGE_SIZE, query=''):
+        """One page of the list, optionally only numbers containing ``query``."""
+        self.refresh()
+        numbers = self._numbers
+        query = _NON_DIGITS.sub('', query or '')
+        if query:
+            numbers = [number for number in numbers if query in number]
+        per_page = min(max(1, per_page), IGNORE_LIST_MAX_PAGE_SIZE)
+        pages = max(1, -(-len(numbers) // per_page))
+        page = min(max(1, page), pages)
+        start = (page - 1) * per_page
+        return {
+            'numbers': numbers[start:start + per_page],
+            'total': len(numbers),
+            'page': page,
+            'per_page': per_page,
+            'pages': pages,
+            'seq': self.version,
+        }
+
+    def apply(self, added=(), removed=()):
+        """Apply a delta in memory; returns the (added, removed) numbers that changed."""
+        self.refresh()
+        with self._lock:
+            added = [number for number in dict.fromkeys(added)
+                     if number not in self._members]
+            removed = [number for number in dict.fromkeys(removed)
+                       if number in self._members and number not in added]
+            if removed:
+                gone = set(removed)
+                self._numbers = [number for number in self._numbers if number not in gone]
+                self._members -= gone
+            self._numbers.extend(added)
+            self._members.update(added)
+            delta = self._record(added, removed)
+        self._notify(delta)
+        return added, removed
+
+    def save(self):
+        """Write the cached list to the file, for when the bot isn't running."""
+        with self._lock:
+            data = json.dumps(self._numbers)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.ignore_list_')
+            try:
+                with os.fdopen(temp_fd, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(temp_path, self.path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._stat = self._file_stat()
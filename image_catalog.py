@@ -0,0 +1,204 @@
+"""In-memory index of the image keyword catalogue.
+
+``image_keywords.json`` maps each keyword to the image files in ``pics/``
+(the Node bot reads it in that shape). The catalogue keeps it in memory as a
+keyword -> files and file -> keywords index, re-reads it only when its mtime
+changes (e.g. the bot edited it) and writes it back atomically on changes.
+
+Per-image metadata (content hash, dimensions, byte sizes, thumbnail) lives in
+a separate ``image_metadata.json`` so the bot's file format stays unchanged.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+
+IMAGE_KEYWORDS_FILE = 'image_keywords.json'
+IMAGE_METADATA_FILE = 'image_metadata.json'
+
+logger = logging.getLogger(__name__)
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file next to ``path`` and rename it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix='.json')
+    try:
+        with os.fdopen(temp_fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ImageCatalog:
+    """Bidirectional keyword <-> image file index backed by a JSON file."""
+
+    def __init__(self, path=IMAGE_KEYWORDS_FILE, pics_folder='pics', is_image=None,
+                 metadata_path=IMAGE_METADATA_FILE):
+        self.path = path
+        self.metadata_path = metadata_path
+        self.pics_folder = pics_folder
+        self.is_image = is_image or (lambda filename: True)
+        self._lock = threading.RLock()
+        self._keywords = {}
+        self._files = {}
+        # False until the first load, then the (mtime, size) seen on disk
+        self._stat = False
+        self._pic_files = set()
+        self._pics_stat = False
+        self._metadata = {}
+        self._hashes = {}
+        self._metadata_stat = False
+
+    @staticmethod
+    def _read_json(path):
+        data = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError:
+                    logger.warning(f"Could not parse {path}, treating it as empty")
+        return data if isinstance(data, dict) else {}
+
+    def _load(self):
+        data = self._read_json(self.path)
+
+        keywords = {}
+        files = {}
+        for keyword, filenames in data.items():
+            keywords[keyword] = list(dict.fromkeys(filenames))
+            for filename in keywords[keyword]:
+                files.setdefault(filename, []).append(keyword)
+        self._keywords = keywords
+        self._files = files
+
+    def _load_metadata(self):
+        self._metadata = self._read_json(self.metadata_path)
+        self._hashes = {
+            meta['content_hash']: filename
+            for filename, meta in self._metadata.items()
+            if meta.get('content_hash')
+        }
+
+    def _refresh(self):
+        """Reload the JSON and the pics listing if they changed on disk."""
+        stat = _stat_key(self.path)
+        if stat != self._stat:
+            self._load()
+            self._stat = stat
+
+        metadata_stat = _stat_key(self.metadata_path)
+        if metadata_stat != self._metadata_stat:
+            self._load_metadata()
+            self._metadata_stat = metadata_stat
+
+        pics_stat = _stat_key(self.pics_folder)
+        if pics_stat != self._pics_stat:
+            self._pic_files = set()
+            if pics_stat is not None:
+                self._pic_files = {
+                    entry.name for entry in os.scandir(self.pics_folder)
+                    if entry.is_file() and self.is_image(entry.name)
+                }
+            self._pics_stat = pics_stat
+
+    def _save(self):
+        write_json_atomic(self.path, self._keywords)
+        self._stat = _stat_key(self.path)
+
+    def _save_metadata(self):
+        write_json_atomic(self.metadata_path, self._metadata)
+        self._metadata_stat = _stat_key(self.metadata_path)
+
+    def _entry(self, filename):
+        entry = {
+            "filename": filename,
+            "path": f"/pics/{filename}",
+            # Images uploaded before ingestion have no thumbnail
+            "thumbnail_path": f"/pics/{filename}",
+            "keywords": list(self._files[filename])
+        }
+        meta = self._metadata.get(filename)
+        if meta:
+            entry.update(meta)
+            if meta.get('thumbnail'):
+                entry["thumbnail_path"] = f"/pics/thumbs/{meta['thumbnail']}"
+        return entry
+
+    def images(self, keyword=None):
+        """List existing images with their keywords, optionally for one keyword."""
+        with self._lock:
+            self._refresh()
+            filenames = self._keywords.get(keyword, []) if keyword else self._files
+            return [
+                self._entry(filename)
+                for filename in filenames
+                # Only include files that actually exist
+                if filename in self._pic_files
+            ]
+
+    def files_for_keyword(self, keyword):
+        with self._lock:
+            self._refresh()
+            return list(self._keywords.get(keyword, []))
+
+    def metadata(self, filename):
+        with self._lock:
+            self._refresh()
+            return self._metadata.get(filename)
+
+    def find_by_hash(self, content_hash):
+        """Filename of the existing image with this content hash, if any."""
+        with self._lock:
+            self._refresh()
+            filename = self._hashes.get(content_hash)
+            return filename if filename in self._pic_files else None
+
+    def add(self, filename, keywords, metadata=None):
+        """Tag an image with keywords and persist the catalogue."""
+        with self._lock:
+            self._refresh()
+            if metadata is not None:
+                self._metadata[filename] = metadata
+                if metadata.get('content_hash'):
+                    self._hashes[metadata['content_hash']] = filename
+                self._save_metadata()
+            file_keywords = self._files.setdefault(filename, [])
+            for keyword in keywords:
+                # Add the image if not already present
+                if keyword not in file_keywords:
+                    self._keywords.setdefault(keyword, []).append(filename)
+                    file_keywords.append(keyword)
+            self._save()
+
+    def remove(self, filename):
+        """Drop an image from every keyword; empty keywords are removed."""
+        with self._lock:
+            self._refresh()
+            keywords = self._files.pop(filename, [])
+            for keyword in keywords:
+                filenames = self._keywords[keyword]
+                filenames.remove(filename)
+                if not filenames:
+                    del self._keywords[keyword]
+            if keywords:
+                self._save()
+            meta = self._metadata.pop(filename, None)
+            if meta is not None:
+                if self._hashes.get(meta.get('content_hash')) == filename:
+                    del self._hashes[meta['content_hash']]
+                self._save_metadata()
+            return bool(keywords)
@@ -0,0 +1,154 @@
+"""Ingestion of uploaded images into ``pics/``.
+
+Uploads are hashed so the same picture is only stored once, then re-encoded
+into a send variant no larger than ``IMAGE_SEND_MAX_DIMENSION`` (what the bot
+sends over WhatsApp) and a small JPEG thumbnail for the dashboard. The
+original upload isn't kept: the send variant replaces it.
+"""
+import hashlib
+import io
+import logging
+import os
+import uuid
+
+from PIL import Image, ImageOps
+
+IMAGE_SEND_MAX_DIMENSION = int(os.environ.get('IMAGE_SEND_MAX_DIMENSION', '1600'))
+IMAGE_SEND_QUALITY = int(os.environ.get('IMAGE_SEND_QUALITY', '85'))
+IMAGE_THUMBNAIL_SIZE = int(os.environ.get('IMAGE_THUMBNAIL_SIZE', '320'))
+IMAGE_THUMBNAIL_QUALITY = 75
+THUMBNAILS_SUBFOLDER = 'thumbs'
+ORIENTATION_TAG = 0x0112
+
+logger = logging.getLogger(__name__)
+
+
+class ImageIngestError(Exception):
+    """Raised when an upload can't be decoded as an image."""
+
+
+class DuplicateImageError(ImageIngestError):
+    """Raised when the same image content is already in the catalogue."""
+
+    def __init__(self, filename):
+        super().__init__(f"This image was already uploaded as {filename}")
+        self.filename = filename
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or \
+        (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _flatten(image):
+    """RGB copy of ``image``, with transparency composited onto white."""
+    if not _has_alpha(image):
+        return image.convert('RGB')
+    rgba = image.convert('RGBA')
+    background = Image.new('RGB', rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel('A'))
+    return background
+
+
+def _encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    if fmt == 'PNG':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _send_variant(image, original, original_format, rotated):
+    """Encoded bytes, extension and size of the image the bot will send."""
+    resized = max(image.size) > IMAGE_SEND_MAX_DIMENSION
+    if resized:
+        image = image.copy()
+        image.thumbnail((IMAGE_SEND_MAX_DIMENSION, IMAGE_SEND_MAX_DIMENSION),
+                        Image.LANCZOS)
+
+    # Transparent images stay PNG, everything else is sent as JPEG
+    if _has_alpha(image):
+        data, ext = _encode(image, 'PNG', None), 'png'
+    else:
+        data, ext = _encode(_flatten(image), 'JPEG', IMAGE_SEND_QUALITY), 'jpg'
+
+    # Re-encoding a small, already compressed upload can make it bigger
+    if not (resized or rotated) and len(original) <= len(data) and \
+            original_format in ('JPEG', 'PNG'):
+        data, ext = original, 'png' if original_format == 'PNG' else 'jpg'
+    return data, ext, image.size
+
+
+def ingest_image(data, pics_folder, find_by_hash=None):
+    """Store an uploaded image's send variant and thumbnail under ``pics_folder``.
+
+    ``find_by_hash(content_hash)`` returns the filename of an existing image
+    with the same content, if any. Returns the new image's filename and its
+    catalogue metadata; raises DuplicateImageError or ImageIngestError.
+    """
+    digest = content_hash(data)
+    if find_by_hash is not None:
+        existing = find_by_hash(digest)
+        if existing:
+            raise DuplicateImageError(existing)
+
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            original_format = source.format
+            source.load()
+            rotated = source.getexif().get(ORIENTATION_TAG, 1) != 1
+            # Apply the camera orientation, so the re-encoded files look right
+            image = ImageOps.exif_transpose(source)
+    except Exception as e:
+        raise ImageIngestError(f"Invalid image file: {str(e)}")
+    original_size = image.size
+
+    send_data, ext, send_size = _send_variant(image, data, original_format, rotated)
+
+    thumbnail = _flatten(image)
+    thumbnail.thumbnail((IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_SIZE), Image.LANCZOS)
+    thumbnail_data = _encode(thumbnail, 'JPEG', IMAGE_THUMBNAIL_QUALITY)
+
+    image_id = str(uuid.uuid4())
+    filename = f"{image_id}.{ext}"
+    thumbnail_name = f"{image_id}.jpg"
+    thumbs_folder = os.path.join(pics_folder, THUMBNAILS_SUBFOLDER)
+    os.makedirs(thumbs_folder, exist_ok=True)
+
+    thumbnail_path = os.path.join(thumbs_folder, thumbnail_name)
+    with open(thumbnail_path, 'wb') as f:
+        f.write(thumbnail_data)
+    # The send variant is written last: once it exists the image is usable
+    with open(os.path.join(pics_folder, filename), 'wb') as f:
+        f.write(send_data)
+
+    logger.info(f"Ingested image {filename}: {len(data)} -> {len(send_data)} bytes, "
+                f"thumbnail {len(thumbnail_data)} bytes")
+    return filename, {
+        "content_hash": digest,
+        "width": send_size[0],
+        "height": send_size[1],
+        "bytes": len(send_data),
+        "original_width": original_size[0],
+        "original_height": original_size[1],
+        "original_bytes": len(data),
+        "thumbnail": thumbnail_name,
+        "thumbnail_width": thumbnail.width,
+        "thumbnail_height": thumbnail.height,
+        "thumbnail_bytes": len(thumbnail_data),
+    }
+
+
+def remove_image_files(pics_folder, filename, metadata=None):
+    """Delete an image's send variant and, if known, its thumbnail."""
+    os.remove(os.path.join(pics_folder, filename))
+    if metadata and metadata.get('thumbnail'):
+        thumbnail_path = os.path.join(pics_folder, THUMBNAILS_SUBFOLDER,
+                                      metadata['thumbnail'])
+        if os.path.exists(thumbnail_path):
+            os.remove(thumbnail_path)
@@ -3,6 +3,7 @@ const { Client, LocalAuth } = require('whatsapp-web.js');
 const qrcode = require('qrcode');
 const OpenAI = require('openai');
 const functions = require('./functions');
+const bridge = require('./bridge');
 const fs = require('fs');
 const path = require('path');
 const fetch = require('node-fetch');
@@ -51,6 +52,9 @@ if (!fs.existsSync(picsFolder)) {
     fs.mkdirSync(picsFolder);
 }
 
+// Command channel used by the dashboard for bulk sends
+bridge.startBridge(client);
+
 let isResetMode = false;
 let isInitialized = false;
 let isCheckingMessages = false;
@@ -80,7 +84,18 @@ client.on('qr', (qr) => {
     }, (err) => {
         if (err) {
             console.error('Error generating QR code:', err);
+            return;
         }
+
+        // Let the dashboard know a new QR code is ready to scan
+        fetch('http://0.0.0.0:8080/set_qr_ready', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Bot-Token': process.env.BOT_NOTIFY_TOKEN || '',
+            },
+        })
+            .catch(error => console.error('Error announcing QR code:', error));
     });
 });
 
@@ -115,6 +130,7 @@ client.on('ready', () => {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'X-Bot-Token': process.env.BOT_NOTIFY_TOKEN || '',
         },
     })
         .then(response => response.json())
@@ -172,6 +188,7 @@ async function handleReconnection() {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'X-Bot-Token': process.env.BOT_NOTIFY_TOKEN || '',
                 },
                 body: JSON.stringify({ status: 'disconnected' })
             });
@@ -302,6 +319,7 @@ client.on('disconnected', async (reason) => {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'X-Bot-Token': process.env.BOT_NOTIFY_TOKEN || '',
             },
         });
     } catch (error) {
@@ -0,0 +1,164 @@
+"""Background jobs for slow request work such as parsing uploaded sheets.
+
+Jobs run on a small pool of worker threads and report their state through
+``on_update(job)``. Two limits keep simultaneous uploads from starving the
+dashboard: at most ``JOB_WORKERS`` jobs run at once, and at most
+``JOB_QUEUE_LIMIT`` wait behind them. Under gevent the workers are
+greenlets, so long jobs call ``job.heartbeat()`` regularly to yield.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', '20'))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', '3600'))
+# Minimum seconds between progress updates of one job
+JOB_UPDATE_INTERVAL = 1.0
+# Pause of a heartbeat; gevent doesn't run timers or I/O on a sleep(0)
+JOB_YIELD_SECONDS = 0.001
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = {SUCCEEDED, FAILED}
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """Raised for unknown jobs or when the queue is full."""
+
+
+class Job:
+    """One unit of background work, its progress and its outcome."""
+
+    def __init__(self, kind, func, args, kwargs, notify):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._notify = notify
+        self._last_update = 0.0
+
+    def heartbeat(self, **progress):
+        """Record progress, publish it now and then, and yield to other greenlets."""
+        self.progress.update(progress)
+        now = time.monotonic()
+        if now - self._last_update >= JOB_UPDATE_INTERVAL:
+            self._last_update = now
+            self._notify(self)
+        # Lets the event loop serve requests while the job runs
+        time.sleep(JOB_YIELD_SECONDS)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool running ``func(job, *args, **kwargs)`` jobs.
+
+    The function's return value becomes the job result; an exception fails
+    the job with its message.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_LIMIT,
+                 retention=JOB_RETENTION_SECONDS, on_update=None):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.retention = retention
+        self.on_update = on_update
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _ensure_workers(self):
+        # Workers are started lazily so importing the app doesn't spawn threads
+        with self._lock:
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name=f'job-worker-{len(self._workers)}')
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _notify(self, job):
+        if self.on_update is None:
+            return
+        try:
+            self.on_update(job)
+        except Exception as e:
+            logger.error(f"Error reporting state of job {job.id}: {str(e)}")
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.state = RUNNING
+                job.started_at = time.time()
+                self._notify(job)
+                job.result = job.func(job, *job.args, **job.kwargs)
+                job.state = SUCCEEDED
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+                job.state = FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+            self._notify(job)
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.state in FINISHED_STATES and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Queue ``func``; raises JobError if too many jobs are already waiting."""
+        with self._lock:
+            self._purge()
+            queued = sum(1 for job in self._jobs.values() if job.state == QUEUED)
+            if queued >= self.max_pending:
+                raise JobError('Too many jobs are waiting, please try again shortly')
+            job = Job(kind, func, args, kwargs, self._notify)
+            self._jobs[job.id] = job
+        self._ensure_workers()
+        self._queue.put(job)
+        self._notify(job)
+        return job
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobError('Job not found')
+        return job
+
+    def list(self, kind=None):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if kind in (None, job.kind)]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
@@ -0,0 +1,195 @@
+"""Logging setup for the dashboard.
+
+``configure_logging`` replaces ``logging.basicConfig``. Records are handed
+to a queue and formatted and written by a native thread (not a greenlet),
+so neither the request nor gevent's loop waits on a slow stderr. The
+environment controls the output:
+
+- ``LOG_FORMAT``: ``text`` (default) or ``json``, one object per line;
+- ``LOG_LEVEL``: the root level (default INFO);
+- ``LOG_LEVELS``: per-logger levels, e.g. ``engineio.server=DEBUG,bot_bridge=WARNING``;
+- ``LOG_SOCKET_RATE_LIMIT``: records per second let through from the
+  Socket.IO and Engine.IO loggers (0 disables the limit). The rest are
+  dropped and counted, and the count is logged once the next second starts.
+
+Context passed with ``extra=`` (such as ``campaign_id`` and ``row``) is
+written as JSON fields, or as ``key=value`` pairs after a text message.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    from gevent import monkey
+except ImportError:
+    monkey = None
+
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_SOCKET_RATE_LIMIT = float(os.environ.get('LOG_SOCKET_RATE_LIMIT', '20'))
+
+# Loggers of python-socketio and python-engineio, which log every packet
+SOCKET_LOGGERS = ('socketio.server', 'engineio.server')
+# Levels used unless LOG_LEVELS says otherwise
+DEFAULT_LOGGER_LEVELS = {'socketio.server': 'INFO', 'engineio.server': 'WARNING'}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Attributes every LogRecord has; anything else came from extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+def _native(module, name):
+    # The object as it was before gevent's monkey.patch_all
+    if monkey is not None:
+        return monkey.get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+def record_context(record):
+    """The ``extra=`` fields of a record."""
+    return {key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(record_context(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual text line, followed by the record's context as key=value."""
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        context = record_context(record)
+        if context:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in context.items())
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the message and traceback now, as their objects may change,
+        # but leave the formatting (and the context fields) to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    # gevent turns threading.Thread into greenlets, so start the writer
+    # with the original _thread functions
+    def start(self):
+        self._done = _native('_thread', 'allocate_lock')()
+        self._done.acquire()
+        _native('_thread', 'start_new_thread')(self._run, ())
+
+    def _run(self):
+        try:
+            self._monitor()
+        finally:
+            self._done.release()
+
+    def stop(self, timeout=5):
+        self.enqueue_sentinel()
+        self._done.acquire(timeout=timeout)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most ``per_second`` records through per second and counts the rest."""
+
+    def __init__(self, per_second):
+        super().__init__()
+        self.per_second = per_second
+        self._window = 0
+        self._passed = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        window = int(time.monotonic())
+        with self._lock:
+            if window != self._window:
+                dropped, self._dropped = self._dropped, 0
+                self._window = window
+                self._passed = 0
+                if dropped:
+                    record.msg = f"[{dropped} similar records dropped] {record.msg}"
+            if self._passed >= self.per_second:
+                self._dropped += 1
+                return False
+            self._passed += 1
+            return True
+
+
+def parse_levels(spec):
+    """``name=LEVEL,...`` as a dict; malformed entries are skipped."""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(fmt=LOG_FORMAT, level=LOG_LEVEL, levels=LOG_LEVELS,
+                      socket_rate_limit=LOG_SOCKET_RATE_LIMIT):
+    """Send all logging through a queue to stderr, configured from the environment."""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    # Only the writer thread uses the handler
+    handler.lock = _native('threading', 'RLock')()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter(TEXT_FORMAT))
+
+    log_queue = _native('queue', 'SimpleQueue')()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    for name, logger_level in dict(DEFAULT_LOGGER_LEVELS, **parse_levels(levels)).items():
+        try:
+            logging.getLogger(name).setLevel(logger_level)
+        except ValueError:
+            root.warning(f"Ignoring unknown log level {logger_level} for {name}")
+    if socket_rate_limit > 0:
+        for name in SOCKET_LOGGERS:
+            logging.getLogger(name).addFilter(RateLimitFilter(socket_rate_limit))
+
+    _listener = _QueueListener(log_queue, handler)
+    _listener.start()
+    # Write out what is still queued when the process exits
+    atexit.register(_listener.stop)
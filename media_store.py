@@ -0,0 +1,123 @@
+"""Content-addressed store for campaign media.
+
+Uploads are streamed to disk in chunks while being hashed, then renamed to
+``media/<sha256>.<ext>``. The hash is the media ID campaigns refer to, so
+the same image uploaded twice is stored once, and a stored file never
+changes, which lets the bot cache its encoded payload by ID.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+
+MEDIA_FOLDER = os.environ.get('MEDIA_FOLDER', 'media')
+MEDIA_CHUNK_SIZE = 64 * 1024
+MEDIA_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+_MEDIA_ID = re.compile(r'^[0-9a-f]{64}$')
+
+logger = logging.getLogger(__name__)
+
+
+class MediaError(Exception):
+    """Raised for unsupported or unknown media."""
+
+
+def media_extension(filename=None, mimetype=None):
+    """Normalised extension for an upload, from its name or its MIME type."""
+    ext = None
+    if filename and '.' in filename:
+        ext = filename.rsplit('.', 1)[1].lower()
+    if ext not in MEDIA_TYPES and mimetype:
+        ext = next((e for e, t in MEDIA_TYPES.items() if t == mimetype), None)
+    if ext not in MEDIA_TYPES:
+        raise MediaError('Unsupported media type')
+    return 'jpg' if ext == 'jpeg' else ext
+
+
+class MediaStore:
+    """Stores media files under their content hash."""
+
+    def __init__(self, folder=MEDIA_FOLDER):
+        self.folder = folder
+        # media_id -> path; stored files never change so this never goes stale
+        self._paths = {}
+
+    def _info(self, media_id, path):
+        ext = path.rsplit('.', 1)[1]
+        return {
+            'media_id': media_id,
+            'path': path,
+            'mimetype': MEDIA_TYPES[ext],
+            'bytes': os.path.getsize(path),
+        }
+
+    def put_stream(self, stream, ext):
+        """Copy ``stream`` into the store in chunks; returns the media info."""
+        os.makedirs(self.folder, exist_ok=True)
+        digest = hashlib.sha256()
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.folder, prefix='.upload_')
+        try:
+            with os.fdopen(temp_fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(MEDIA_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            media_id = digest.hexdigest()
+            path = os.path.join(self.folder, f"{media_id}.{ext}")
+            if os.path.exists(path):
+                # Already stored, keep the existing file
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._paths[media_id] = path
+        return self._info(media_id, path)
+
+    def put_data_url(self, data_url):
+        """Store a base64 ``data:`` URL, as sent by older dashboards."""
+        header, _, payload = data_url.rpartition(',')
+        mimetype = header[5:].split(';')[0] if header.startswith('data:') else None
+        try:
+            data = base64.b64decode(payload)
+        except (binascii.Error, ValueError) as e:
+            raise MediaError(f"Invalid image data: {str(e)}")
+        return self.put_stream(io.BytesIO(data),
+                               media_extension(mimetype=mimetype or 'image/jpeg'))
+
+    def get(self, media_id):
+        """Media info for ``media_id``, or None if it isn't stored."""
+        if not media_id or not _MEDIA_ID.match(media_id):
+            return None
+        path = self._paths.get(media_id)
+        if path is None or not os.path.exists(path):
+            path = None
+            for ext in set(MEDIA_TYPES) - {'jpeg'}:
+                candidate = os.path.join(self.folder, f"{media_id}.{ext}")
+                if os.path.exists(candidate):
+                    path = self._paths[media_id] = candidate
+                    break
+        return self._info(media_id, path) if path else None
+
+    def path(self, media_id):
+        media = self.get(media_id)
+        if media is None:
+            raise MediaError(f"Media {media_id} not found")
+        return media['path']
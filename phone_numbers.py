@@ -0,0 +1,160 @@
+"""Normalisation and validation of phone number columns.
+
+Each cell gets either its canonical E.164 number or a rejection reason, and
+``PhoneNormalizer`` rejects repeats of a number it has already accepted.
+
+Cell values may be strings in any common format (``+52 55 1234-5678``,
+``(55) 1234 5678``, ``0052...``) or numeric cells, either as the ints and
+floats openpyxl returns or as their text (``5215512345678``,
+``5215512345678.0``, ``5.215512345678e+12``).
+"""
+import os
+import re
+from decimal import Decimal, InvalidOperation
+
+# Country code for national numbers written without one; empty means numbers
+# are expected to include their country code (optionally without the +)
+DEFAULT_COUNTRY_CODE = os.environ.get('DEFAULT_COUNTRY_CODE', '').lstrip('+')
+# National numbers (without country code) are at most this long
+NATIONAL_NUMBER_MAX_DIGITS = 10
+
+# Rejection reasons
+EMPTY = 'empty'
+INVALID_CHARACTERS = 'invalid_characters'
+INVALID_COUNTRY_CODE = 'invalid_country_code'
+TOO_SHORT = 'too_short'
+TOO_LONG = 'too_long'
+MISSING_COUNTRY_CODE = 'missing_country_code'
+DUPLICATE = 'duplicate'
+
+E164_MIN_DIGITS = 8
+E164_MAX_DIGITS = 15
+
+# Characters people use to format numbers
+_FORMATTING = str.maketrans('', '', ' \t\r\n-.()/\u00a0\u2010\u2011\u2012\u2013\u2014')
+# Numeric cells that came through as text
+_INTEGRAL_FLOAT_TEXT = re.compile(r'(\+?[0-9]+)\.0+')
+_EXPONENT_TEXT = re.compile(r'\+?[0-9]+(?:\.[0-9]+)?[eE]\+?[0-9]+')
+_NON_DIGITS = re.compile(r'[^0-9]')
+
+
+def _numeric_text(text):
+    """``text`` without the float notation of a numeric cell, if it has one."""
+    match = _INTEGRAL_FLOAT_TEXT.fullmatch(text)
+    if match:
+        return match.group(1)
+    if _EXPONENT_TEXT.fullmatch(text):
+        try:
+            value = Decimal(text.lstrip('+'))
+        except InvalidOperation:
+            return text
+        if value == value.to_integral_value():
+            return ('+' if text.startswith('+') else '') + str(int(value))
+    return text
+
+
+def canonical_number(value, default_country_code=DEFAULT_COUNTRY_CODE):
+    """Return (number, reason) for one cell.
+
+    ``number`` is the E.164 form (``+525512345678``) or None, and ``reason``
+    is None or why the cell was rejected.
+    """
+    if value is None:
+        return None, EMPTY
+    if type(value) is int:
+        text = str(value)
+    elif isinstance(value, float):
+        # Phone numbers stored as numbers have no fractional part
+        if not value.is_integer():
+            return None, INVALID_CHARACTERS
+        text = str(int(value))
+    else:
+        text = str(value).strip()
+        if '.' in text or 'e' in text or 'E' in text:
+            text = _numeric_text(text)
+
+    # Spaces and dashes are by far the most common; str.replace is much
+    # cheaper than str.translate, which is only needed for the rest
+    digits = text.replace(' ', '').replace('-', '')
+    if not digits.lstrip('+').isdigit():
+        digits = digits.translate(_FORMATTING)
+    if digits.startswith('+'):
+        digits = digits[1:]
+        international = True
+    elif digits.startswith('00'):
+        digits = digits[2:]
+        international = True
+    else:
+        international = False
+    if not digits:
+        return None, EMPTY
+    if not (digits.isascii() and digits.isdigit()):
+        return None, INVALID_CHARACTERS
+
+    if not international and len(digits) <= NATIONAL_NUMBER_MAX_DIGITS:
+        if default_country_code:
+            digits = default_country_code + digits
+        elif digits != text:
+            # A formatted number like "(55) 1234 5678" is a national number.
+            # Bare digits (as numeric cells are) may include their country
+            # code, as they always could
+            return None, MISSING_COUNTRY_CODE
+    if digits[0] == '0':
+        return None, INVALID_COUNTRY_CODE
+    if len(digits) == 13 and digits.startswith('521'):
+        # Mexican mobile numbers no longer use the 1 after the country code
+        digits = '52' + digits[3:]
+    if len(digits) < E164_MIN_DIGITS:
+        return None, TOO_SHORT
+    if len(digits) > E164_MAX_DIGITS:
+        return None, TOO_LONG
+    return '+' + digits, None
+
+
+class PhoneNormalizer:
+    """Normalises phone columns, deduping across every batch it has seen."""
+
+    def __init__(self, default_country_code=DEFAULT_COUNTRY_CODE):
+        self.default_country_code = default_country_code
+        self._seen = set()
+
+    def normalize(self, values):
+        """Return (numbers, reasons) lists aligned with ``values``.
+
+        ``numbers[i]`` is the E.164 form or None; ``reasons[i]`` is None for
+        accepted numbers, else why the cell was rejected. Repeats of a number
+        seen earlier (in this or a previous batch) are rejected as DUPLICATE.
+        """
+        numbers = []
+        reasons = []
+        seen = self._seen
+        for value in values:
+            number, reason = canonical_number(value, self.default_country_code)
+            if number is not None:
+                if number in seen:
+                    number, reason = None, DUPLICATE
+                else:
+                    seen.add(number)
+            numbers.append(number)
+            reasons.append(reason)
+        return numbers, reasons
+
+
+def normalize_numbers(values, default_country_code=DEFAULT_COUNTRY_CODE):
+    """One-shot PhoneNormalizer.normalize over a whole column."""
+    return PhoneNormalizer(default_country_code).normalize(values)
+
+
+def whatsapp_number(number):
+    """Digits WhatsApp uses as the chat ID of a number.
+
+    Accepts E.164 or raw input. Mexican mobiles keep the legacy 1 after the
+    country code on WhatsApp (the same rule as formatMexicanNumber in
+    functions.js).
+    """
+    digits = _NON_DIGITS.sub('', str(number))
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith('52') and len(digits) == 12:
+        digits = f'521{digits[2:]}'
+    return digits
@@ -0,0 +1,214 @@
+"""Application metrics in the Prometheus text format.
+
+Metrics are defined at import time with ``counter``, ``gauge`` and
+``histogram`` and rendered by ``render()`` for ``/metrics``. Recording is
+kept cheap: each labelled series has its own lock, held only for an
+increment, and the registry lock is only taken the first time a label set
+is seen. ``callback_gauge`` reads a value (such as a supervisor's restart
+count) only when the metrics are scraped.
+
+Every worker process has its own metrics; with several gunicorn workers a
+scrape sees the worker that answered it.
+"""
+import bisect
+import math
+import threading
+
+# Request latencies are mostly milliseconds; bulk sends and workbook saves seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_metrics = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+
+    def _get(self, label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            with _registry_lock:
+                series = self._series.get(label_values)
+                if series is None:
+                    series = self._series[label_values] = self._new_series()
+        return series
+
+    def _key(self, labels):
+        try:
+            if len(labels) == len(self.labels):
+                return tuple([str(labels[name]) for name in self.labels])
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type_name}']
+        with _registry_lock:
+            series_items = sorted(self._series.items())
+        for label_values, series in series_items:
+            lines.extend(self._render_series(label_values, series))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_series(self):
+        return _Value()
+
+    def inc(self, amount=1, **labels):
+        series = self._get(self._key(labels))
+        with series.lock:
+            series.value += amount
+
+    def _render_series(self, label_values, series):
+        return [f'{self.name}{_format_labels(self.labels, label_values)} '
+                f'{_format_value(series.value)}']
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        series = self._get(self._key(labels))
+        with series.lock:
+            series.value = value
+
+
+class CallbackGauge(_Metric):
+    """A gauge (or counter) whose value is read from ``read()`` at scrape time."""
+
+    def __init__(self, name, documentation, read, type_name='gauge'):
+        super().__init__(name, documentation)
+        self.read = read
+        self.type_name = type_name
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        return [f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.type_name}',
+                f'{self.name} {_format_value(value)}']
+
+
+class _Buckets:
+    __slots__ = ('counts', 'sum', 'lock')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_series(self):
+        return _Buckets(len(self.buckets))
+
+    def observe(self, value, **labels):
+        series = self._get(self._key(labels))
+        # Counts are per bucket; render() accumulates them
+        index = bisect.bisect_left(self.buckets, value)
+        with series.lock:
+            series.counts[index] += 1
+            series.sum += value
+
+    def totals(self, **labels):
+        """(count, sum) of the observations so far."""
+        series = self._series.get(self._key(labels))
+        if series is None:
+            return 0, 0.0
+        with series.lock:
+            return sum(series.counts), series.sum
+
+    def _render_series(self, label_values, series):
+        with series.lock:
+            counts = list(series.counts)
+            total = series.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labels, label_values,
+                                    (('le', _format_value(float(bound))),))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def counter(name, documentation, labels=()):
+    return _register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=()):
+    return _register(Gauge(name, documentation, labels))
+
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, labels, buckets))
+
+
+def callback_gauge(name, documentation, read, type_name='gauge'):
+    return _register(CallbackGauge(name, documentation, read, type_name))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(_metrics):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
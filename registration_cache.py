@@ -0,0 +1,78 @@
+"""Persistent cache of WhatsApp registration lookups.
+
+``client.isRegisteredUser`` answers are stored in SQLite keyed by the
+number's WhatsApp chat ID digits (``phone_numbers.whatsapp_number``) and
+trusted for ``REGISTRATION_CACHE_TTL_HOURS``, so re-running a campaign or
+uploading overlapping lists doesn't ask WhatsApp about the same numbers
+again.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from phone_numbers import whatsapp_number
+
+REGISTRATION_CACHE_DB = os.environ.get(
+    'REGISTRATION_CACHE_DB', 'registration_cache.db')
+REGISTRATION_CACHE_TTL_HOURS = float(
+    os.environ.get('REGISTRATION_CACHE_TTL_HOURS', '72'))
+
+
+class RegistrationCache:
+    """TTL cache of number -> registered on WhatsApp."""
+
+    def __init__(self, db_path=REGISTRATION_CACHE_DB,
+                 ttl_seconds=REGISTRATION_CACHE_TTL_HOURS * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS registrations ('
+            'number TEXT PRIMARY KEY, registered INTEGER NOT NULL, checked_at REAL NOT NULL)')
+
+    def get_many(self, numbers):
+        """Return {number: registered} for the numbers with a fresh answer."""
+        keys = {whatsapp_number(n): n for n in numbers}
+        oldest = time.time() - self.ttl_seconds
+        found = {}
+        key_list = list(keys)
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT number, registered FROM registrations '
+                    f'WHERE checked_at >= ? AND number IN ({placeholders})',
+                    [oldest] + chunk).fetchall()
+                for key, registered in rows:
+                    found[keys[key]] = bool(registered)
+        return found
+
+    def get(self, number):
+        """True/False if the answer is cached and fresh, else None."""
+        return self.get_many([number]).get(number)
+
+    def set_many(self, results):
+        """Store {number: registered} answers."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO registrations (number, registered, checked_at) '
+                'VALUES (?, ?, ?)',
+                [(whatsapp_number(n), int(bool(r)), now) for n, r in results.items()])
+
+    def set(self, number, registered):
+        self.set_many({number: registered})
+
+    def purge_expired(self):
+        """Drop answers older than the TTL; returns how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM registrations WHERE checked_at < ?',
+                (time.time() - self.ttl_seconds,))
+            return cursor.rowcount
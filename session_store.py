@@ -0,0 +1,287 @@
+"""Server-side login sessions.
+
+Flask's default session keeps everything in a signed cookie. Here the cookie
+only carries a signed random session ID and the data is stored on the
+server, so a logout really ends the session and every worker sees the same
+sessions. ``SESSION_TYPE`` picks the backend:
+
+- ``sqlite`` (default): a table in ``SESSION_SQLITE_PATH``;
+- ``filesystem``: one file per session in ``SESSION_FILE_DIR``;
+- ``cookie``: Flask's signed-cookie sessions, as before.
+
+Sessions expire ``SESSION_LIFETIME_HOURS`` after they were last renewed;
+expired ones are purged every ``SESSION_PURGE_SECONDS``. Each worker keeps
+the sessions it has read in a small LRU cache and trusts a cached copy for
+``SESSION_CACHE_SECONDS``, so ``login_required`` usually costs a signature
+check and a dict lookup. A logout on another worker is therefore noticed
+within that many seconds.
+"""
+import collections
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask_session.sessions import SessionInterface, ServerSideSession
+from itsdangerous import BadSignature
+
+SESSION_TYPE = os.environ.get('SESSION_TYPE', 'sqlite')
+SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH', 'sessions.db')
+SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR', 'flask_session')
+SESSION_LIFETIME_HOURS = float(os.environ.get('SESSION_LIFETIME_HOURS', '24'))
+SESSION_CACHE_SECONDS = float(os.environ.get('SESSION_CACHE_SECONDS', '5'))
+SESSION_CACHE_SIZE = 1000
+SESSION_PURGE_SECONDS = 300
+
+# Session IDs are uuid4 strings; anything else in a cookie is ignored
+_SESSION_ID = re.compile(r'^[0-9a-f-]{36}$')
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite table, shared by the workers on one host."""
+
+    def __init__(self, path=SESSION_SQLITE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+
+    def get(self, sid):
+        """(data, expires_at) of a live session, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?',
+                (sid, time.time())).fetchone()
+        return row
+
+    def set(self, sid, data, expires_at):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+                (sid, data, expires_at))
+
+    def delete(self, sid):
+        with self._lock:
+            self._conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purge_expired(self):
+        with self._lock:
+            return self._conn.execute(
+                'DELETE FROM sessions WHERE expires_at <= ?', (time.time(),)).rowcount
+
+
+class FileSystemSessionBackend:
+    """One file per session: the expiry time on the first line, then the data."""
+
+    def __init__(self, directory=SESSION_FILE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                expires_at, _, data = f.read().partition('\n')
+            return data, float(expires_at)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, sid):
+        row = self._read(self._path(sid))
+        if row is None or row[1] <= time.time():
+            return None
+        return row
+
+    def set(self, sid, data, expires_at):
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.session_')
+        try:
+            with os.fdopen(temp_fd, 'w', encoding='utf-8') as f:
+                f.write(f"{expires_at}\n{data}")
+            os.replace(temp_path, self._path(sid))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self):
+        now = time.time()
+        purged = 0
+        for entry in os.scandir(self.directory):
+            if not _SESSION_ID.match(entry.name):
+                continue
+            row = self._read(entry.path)
+            if row is None or row[1] <= now:
+                self.delete(entry.name)
+                purged += 1
+        return purged
+
+
+class CachedSessionInterface(SessionInterface):
+    """Flask session interface over a backend, with a per-worker read cache.
+
+    The cookie holds the session ID signed with the app's secret key. Data is
+    written through to the backend when the session changes, and the expiry
+    is pushed back (one backend write) once less than half the lifetime is
+    left, rather than on every request.
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, backend, lifetime_seconds=SESSION_LIFETIME_HOURS * 3600,
+                 cache_seconds=SESSION_CACHE_SECONDS, cache_size=SESSION_CACHE_SIZE,
+                 purge_seconds=SESSION_PURGE_SECONDS):
+        self.backend = backend
+        self.lifetime_seconds = lifetime_seconds
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self.purge_seconds = purge_seconds
+        # sid -> (data dict, expires_at, fetched_at), least recently used first
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    # Cache
+
+    def _cached(self, sid, now):
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= now or now - entry[2] > self.cache_seconds:
+                del self._cache[sid]
+                return None
+            self._cache.move_to_end(sid)
+            return entry
+
+    def _remember(self, sid, data, expires_at, now):
+        with self._lock:
+            self._cache[sid] = (data, expires_at, now)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+
+    def _load(self, sid, now):
+        entry = self._cached(sid, now)
+        if entry is not None:
+            return entry[0], entry[1]
+        row = self.backend.get(sid)
+        if row is None:
+            return None
+        try:
+            data = self.serializer.loads(row[0])
+        except ValueError as e:
+            logger.error(f"Discarding unreadable session: {str(e)}")
+            return None
+        self._remember(sid, data, row[1], now)
+        return data, row[1]
+
+    def _purge(self, now):
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_seconds
+        try:
+            purged = self.backend.purge_expired()
+            if purged:
+                logger.info(f"Purged {purged} expired sessions")
+        except Exception as e:
+            logger.error(f"Error purging expired sessions: {str(e)}")
+
+    # Flask hooks
+
+    def _new_session(self):
+        return self.session_class(sid=self._generate_sid())
+
+    def open_session(self, app, request):
+        signer = self._get_signer(app)
+        if signer is None:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+        try:
+            sid = signer.unsign(cookie).decode()
+        except BadSignature:
+            return self._new_session()
+        if not _SESSION_ID.match(sid):
+            return self._new_session()
+
+        now = time.time()
+        loaded = self._load(sid, now)
+        if loaded is None:
+            return self._new_session()
+        data, expires_at = loaded
+        session = self.session_class(dict(data), sid=sid)
+        session.expires_at = expires_at
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = time.time()
+        self._purge(now)
+        expires_at = getattr(session, 'expires_at', None)
+
+        if not session:
+            if session.modified or expires_at is not None:
+                # Emptied (e.g. a logout): drop it everywhere
+                self._forget(session.sid)
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        renew = expires_at is None or expires_at - now < self.lifetime_seconds / 2
+        if not session.modified and not renew:
+            return
+        expires_at = now + self.lifetime_seconds
+        data = dict(session)
+        self.backend.set(session.sid, self.serializer.dumps(data), expires_at)
+        self._remember(session.sid, data, expires_at, now)
+        session.expires_at = expires_at
+
+        response.set_cookie(
+            name, self._get_signer(app).sign(session.sid).decode(),
+            expires=expires_at, httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path, secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+
+
+def init_session_store(app, session_type=SESSION_TYPE):
+    """Install the configured session backend on ``app``."""
+    app.permanent_session_lifetime = timedelta(hours=SESSION_LIFETIME_HOURS)
+    if session_type == 'cookie':
+        return None
+    if session_type == 'sqlite':
+        backend = SQLiteSessionBackend()
+    elif session_type == 'filesystem':
+        backend = FileSystemSessionBackend()
+    else:
+        raise ValueError(f"Unsupported SESSION_TYPE: {session_type}")
+    app.session_interface = CachedSessionInterface(backend)
+    return app.session_interface
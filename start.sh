@@ -39,5 +39,13 @@ echo "======================================"
 # Wait briefly to ensure the port is free
 sleep 2
 
+# The bot, campaigns, upload jobs and the ignore list live in the worker's
+# memory, so only one worker is supported (gunicorn reads WEB_CONCURRENCY)
+WEB_CONCURRENCY=${WEB_CONCURRENCY:-1}
+if [ "$WEB_CONCURRENCY" != "1" ]; then
+    echo "WEB_CONCURRENCY is $WEB_CONCURRENCY; the dashboard supports only one worker"
+    exit 1
+fi
+
 # Start the Flask application with Gunicorn using gevent worker
-exec gunicorn --worker-class geventwebsocket.gunicorn.workers.GeventWebSocketWorker --bind 0.0.0.0:$PORT dashboard:app
+exec gunicorn --worker-class geventwebsocket.gunicorn.workers.GeventWebSocketWorker --workers 1 --bind 0.0.0.0:$PORT dashboard:app
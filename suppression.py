@@ -0,0 +1,164 @@
+"""Numbers that bulk campaigns must not message.
+
+The index holds three sources in memory, keyed by the digits WhatsApp uses
+as the chat ID of a number, so a lookup is one hash probe:
+
+- the bot's ignore list (an ignore_list.IgnoreListStore), following its deltas;
+- opt-outs, stored in SQLite;
+- numbers a campaign messaged within the last ``SUPPRESSION_WINDOW_DAYS``,
+  also stored in SQLite (0, the default, disables this source).
+
+It is loaded once and then kept current incrementally: sends and opt-outs
+update the in-memory sets and write through to the database, and ignore
+list changes are applied by ``catch_up`` from the store's change hook.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from phone_numbers import whatsapp_number
+
+SUPPRESSION_DB = os.environ.get('SUPPRESSION_DB', 'suppression.db')
+SUPPRESSION_WINDOW_DAYS = float(os.environ.get('SUPPRESSION_WINDOW_DAYS', '0'))
+
+# Why a number is suppressed
+IGNORED = 'ignored'
+OPTED_OUT = 'opted_out'
+RECENTLY_CONTACTED = 'recently_contacted'
+
+logger = logging.getLogger(__name__)
+
+
+def suppression_key(number):
+    """Key of a number in the index, or None if it has no digits.
+
+    The key is the digit string, not an int, so leading zeros are kept.
+    """
+    return whatsapp_number(number) or None
+
+
+class SuppressionIndex:
+    """In-memory set of suppressed numbers backed by SQLite."""
+
+    def __init__(self, ignore_list, db_path=SUPPRESSION_DB,
+                 window_seconds=SUPPRESSION_WINDOW_DAYS * 86400):
+        self.ignore_list = ignore_list
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS opt_outs ('
+            'number TEXT PRIMARY KEY, opted_out_at REAL NOT NULL)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS contacted ('
+            'number TEXT PRIMARY KEY, contacted_at REAL NOT NULL)')
+
+        self._ignored = set()
+        self._ignore_list_version = None
+        self._opted_out = {row[0] for row in self._conn.execute(
+            'SELECT number FROM opt_outs')}
+        # number -> last contacted time, only within the window
+        self._contacted = {}
+        if self.window_seconds > 0:
+            self._contacted = dict(self._conn.execute(
+                'SELECT number, contacted_at FROM contacted WHERE contacted_at >= ?',
+                (time.time() - self.window_seconds,)))
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the ignore list if its file changed, then catch up."""
+        self.ignore_list.refresh()
+        self.catch_up()
+
+    def catch_up(self):
+        """Apply the ignore list changes since the last catch-up."""
+        version = self.ignore_list.version
+        if version == self._ignore_list_version:
+            return
+        changes = None
+        if self._ignore_list_version is not None:
+            changes = self.ignore_list.changes_since(self._ignore_list_version)
+        if changes is None:
+            # Too far behind (or the first load): re-key the whole list
+            keys = (suppression_key(number) for number in self.ignore_list.numbers())
+            self._ignored = {key for key in keys if key is not None}
+        else:
+            for delta in changes:
+                for number in delta['removed']:
+                    self._ignored.discard(suppression_key(number))
+                for number in delta['added']:
+                    key = suppression_key(number)
+                    if key is not None:
+                        self._ignored.add(key)
+                version = delta['seq']
+        self._ignore_list_version = version
+
+    def reason(self, number):
+        """Why ``number`` is suppressed, or None if it may be messaged."""
+        key = suppression_key(number)
+        if key is None:
+            return None
+        if key in self._ignored:
+            return IGNORED
+        if key in self._opted_out:
+            return OPTED_OUT
+        contacted_at = self._contacted.get(key)
+        if contacted_at is not None and contacted_at >= time.time() - self.window_seconds:
+            return RECENTLY_CONTACTED
+        return None
+
+    def __contains__(self, number):
+        return self.reason(number) is not None
+
+    def record_contacted(self, number):
+        """Remember that a campaign just messaged ``number``."""
+        key = suppression_key(number)
+        if key is None or self.window_seconds <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._contacted[key] = now
+            self._conn.execute(
+                'INSERT OR REPLACE INTO contacted (number, contacted_at) VALUES (?, ?)',
+                (key, now))
+
+    def add_opt_out(self, number):
+        key = suppression_key(number)
+        if key is None:
+            return False
+        with self._lock:
+            self._opted_out.add(key)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO opt_outs (number, opted_out_at) VALUES (?, ?)',
+                (key, time.time()))
+        return True
+
+    def remove_opt_out(self, number):
+        key = suppression_key(number)
+        if key is None:
+            return False
+        with self._lock:
+            self._opted_out.discard(key)
+            self._conn.execute('DELETE FROM opt_outs WHERE number = ?', (key,))
+        return True
+
+    def purge_expired(self):
+        """Drop contacts older than the window from memory and disk."""
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            self._contacted = {key: contacted_at for key, contacted_at
+                               in self._contacted.items() if contacted_at >= cutoff}
+            self._conn.execute('DELETE FROM contacted WHERE contacted_at < ?', (cutoff,))
+
+    def stats(self):
+        return {
+            'ignored': len(self._ignored),
+            'opted_out': len(self._opted_out),
+            'recently_contacted': len(self._contacted),
+            'window_days': self.window_seconds / 86400,
+        }
@@ -0,0 +1,149 @@
+"""System facts and live process metrics for the dashboard.
+
+Static facts (Node and Python versions, boot time) are computed once.
+Live metrics for the dashboard and bot processes are sampled with psutil on
+a fixed interval into a ring buffer and served from memory.
+"""
+import collections
+import functools
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+
+import psutil
+
+SYSTEM_METRICS_INTERVAL = float(os.environ.get('SYSTEM_METRICS_INTERVAL', '10'))
+SYSTEM_METRICS_HISTORY = int(os.environ.get('SYSTEM_METRICS_HISTORY', '360'))
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def static_system_info():
+    """Facts that don't change while the server runs, computed once.
+
+    Only the first call runs ``node --version``; later ones read the cache.
+    """
+    try:
+        node_version = subprocess.check_output(
+            ['node', '--version'], timeout=10).decode().strip()
+    except Exception:
+        node_version = "Not installed"
+
+    try:
+        boot_time = psutil.boot_time()
+    except Exception:
+        boot_time = None
+
+    return {
+        "node_version": node_version,
+        "python_version": f"{platform.python_version()} ({platform.python_implementation()})",
+        "boot_time": boot_time,
+    }
+
+
+class MetricsSampler:
+    """Samples CPU, RSS, open fds and uptime of named processes.
+
+    ``get_processes()`` returns {name: pid or None}. Samples are kept in a
+    ring buffer of ``history`` entries; ``on_sample(sample)`` is called after
+    each one, e.g. to push it to dashboards.
+    """
+
+    def __init__(self, get_processes, interval=SYSTEM_METRICS_INTERVAL,
+                 history=SYSTEM_METRICS_HISTORY, on_sample=None):
+        self.get_processes = get_processes
+        self.interval = interval
+        self.on_sample = on_sample
+        self._samples = collections.deque(maxlen=history)
+        # psutil needs the same Process object between calls for cpu_percent
+        self._procs = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _process(self, pid):
+        proc = self._procs.get(pid)
+        if proc is None:
+            proc = self._procs[pid] = psutil.Process(pid)
+            # The first call only primes the CPU counter
+            proc.cpu_percent(None)
+        return proc
+
+    def _process_metrics(self, pid, now):
+        proc = self._process(pid)
+        with proc.oneshot():
+            try:
+                open_fds = proc.num_fds()
+            except (AttributeError, psutil.Error):
+                # num_fds is POSIX only
+                open_fds = None
+            return {
+                "pid": pid,
+                "cpu_percent": proc.cpu_percent(None),
+                "rss_bytes": proc.memory_info().rss,
+                "open_fds": open_fds,
+                "uptime_seconds": int(now - proc.create_time()),
+            }
+
+    def sample(self):
+        """Take one sample now, store it and return it."""
+        now = time.time()
+        sample = {"timestamp": now, "processes": {}}
+        live_pids = set()
+        for name, pid in self.get_processes().items():
+            if pid is None:
+                sample["processes"][name] = None
+                continue
+            try:
+                sample["processes"][name] = self._process_metrics(pid, now)
+                live_pids.add(pid)
+            except psutil.Error:
+                sample["processes"][name] = None
+
+        # Forget processes that went away
+        for pid in list(self._procs):
+            if pid not in live_pids:
+                del self._procs[pid]
+
+        self._samples.append(sample)
+        if self.on_sample is not None:
+            try:
+                self.on_sample(sample)
+            except Exception as e:
+                logger.error(f"Error publishing system metrics: {str(e)}")
+        return sample
+
+    def latest(self):
+        return self._samples[-1] if self._samples else None
+
+    def history(self):
+        return list(self._samples)
+
+    def start(self):
+        """Start sampling in the background; does nothing if already started."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+
+            def run():
+                while True:
+                    try:
+                        self.sample()
+                    except Exception as e:
+                        logger.error(f"Error sampling system metrics: {str(e)}")
+                    if self._stop.wait(self.interval):
+                        break
+
+            self._thread = threading.Thread(target=run, name='metrics-sampler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            self._thread = None
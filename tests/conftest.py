@@ -0,0 +1,43 @@
+"""Fixtures for tests that go through the dashboard's routes."""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+BOT_NOTIFY_TOKEN = 'test-bot-notify-token'
+
+# Read at import time by the dashboard's modules, so set before any test imports them
+_data_dir = tempfile.mkdtemp(prefix='dashboard-tests-')
+os.environ['SESSION_TYPE'] = 'cookie'
+os.environ['SUPPRESSION_DB'] = os.path.join(_data_dir, 'suppression.db')
+os.environ['REGISTRATION_CACHE_DB'] = os.path.join(_data_dir, 'registration_cache.db')
+os.environ['BOT_NOTIFY_TOKEN'] = BOT_NOTIFY_TOKEN
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    """The dashboard module, serving files from ``tmp_path``."""
+    import dashboard
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dashboard.app, 'root_path', str(tmp_path))
+    (tmp_path / 'pics').mkdir()
+    return dashboard
+
+
+@pytest.fixture
+def client(dashboard):
+    """A test client with a logged-in session."""
+    client = dashboard.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
+
+
+@pytest.fixture
+def anonymous_client(dashboard):
+    return dashboard.app.test_client()
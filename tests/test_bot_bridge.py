@@ -0,0 +1,109 @@
+"""Round trips over BotBridge against a stub bridge peer."""
+import json
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from bot_bridge import BotBridge, BotBridgeError, SEND_ERROR, SEND_SUCCESS
+
+
+class StubBot:
+    """Answers bridge commands; ``drop`` names commands whose answer is lost."""
+
+    def __init__(self):
+        self.received = []
+        self.drop = set()
+        self.connections = []
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stub.connections.append(self.request)
+                for line in self.rfile:
+                    request = json.loads(line)
+                    stub.received.append(request['cmd'])
+                    if request['cmd'] in stub.drop:
+                        # The command arrived but the connection dies before the answer
+                        stub.drop.discard(request['cmd'])
+                        self.request.shutdown(socket.SHUT_RDWR)
+                        return
+                    response = {'id': request['id'], 'ok': True}
+                    if request['cmd'] == 'check_numbers':
+                        response['registered'] = {n: n.endswith('1') for n in request['numbers']}
+                    elif request['cmd'] == 'send_message':
+                        response['status'] = SEND_SUCCESS
+                    self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+@pytest.fixture
+def stub():
+    stub = StubBot()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def bridge(stub):
+    bridge = BotBridge(port=stub.port, timeout=5)
+    yield bridge
+    bridge.close()
+
+
+def test_round_trips_share_one_connection(stub, bridge):
+    assert bridge.ping()
+    assert bridge.check_numbers(['5211', '5212']) == {'5211': True, '5212': False}
+    assert bridge.send_message('5211', 'Hello') == {'status': SEND_SUCCESS}
+    assert stub.received == ['ping', 'check_numbers', 'send_message']
+
+
+def test_lost_send_answer_is_not_repeated(stub, bridge):
+    stub.drop.add('send_message')
+    assert bridge.send_message('5211', 'Hello')['status'] == SEND_ERROR
+    assert stub.received.count('send_message') == 1
+    # The next request opens a new connection
+    assert bridge.send_message('5211', 'Hello') == {'status': SEND_SUCCESS}
+
+
+def test_lost_idempotent_answer_is_retried(stub, bridge):
+    stub.drop.add('check_numbers')
+    assert bridge.check_numbers(['5211']) == {'5211': True}
+    assert stub.received == ['check_numbers', 'check_numbers']
+
+
+def test_reconnects_after_the_bot_restarts(stub, bridge):
+    assert bridge.ping()
+    stub.stop()
+    restarted = StubBot()
+    bridge.port = restarted.port
+    try:
+        # The closed connection is noticed before sending, so the send goes out once
+        assert bridge.send_message('5211', 'Hello') == {'status': SEND_SUCCESS}
+        assert restarted.received == ['send_message']
+    finally:
+        restarted.stop()
+
+
+def test_unreachable_bot_raises():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    bridge = BotBridge(port=port, timeout=1)
+    assert not bridge.ping()
+    with pytest.raises(BotBridgeError):
+        bridge.request('ping')
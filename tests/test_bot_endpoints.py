@@ -0,0 +1,28 @@
+"""Routes only the bot may call need its X-Bot-Token."""
+import pytest
+
+from conftest import BOT_NOTIFY_TOKEN
+
+BOT_ROUTES = ['/set_qr_ready', '/set_bot_connected', '/set_bot_disconnected',
+              '/notify_ignore_list_update']
+
+
+@pytest.mark.parametrize('route', BOT_ROUTES)
+def test_bot_routes_reject_requests_without_the_token(client, route):
+    # Even a logged-in browser session is not the bot
+    assert client.post(route).status_code == 403
+    assert client.post(route, headers={'X-Bot-Token': 'wrong'}).status_code == 403
+
+
+@pytest.mark.parametrize('route', BOT_ROUTES)
+def test_bot_routes_accept_the_token(anonymous_client, route):
+    response = anonymous_client.post(route, headers={'X-Bot-Token': BOT_NOTIFY_TOKEN})
+    assert response.status_code == 200
+
+
+def test_bot_connected_flag_follows_the_bot(anonymous_client, dashboard):
+    headers = {'X-Bot-Token': BOT_NOTIFY_TOKEN}
+    anonymous_client.post('/set_bot_connected', headers=headers)
+    assert dashboard.is_bot_connected()
+    anonymous_client.post('/set_bot_disconnected', headers=headers)
+    assert not dashboard.is_bot_connected()
@@ -0,0 +1,240 @@
+"""Campaign state transitions and token-bucket pacing."""
+import threading
+import time
+
+import pytest
+
+import campaign_scheduler
+from campaign_scheduler import (CampaignScheduler, CampaignError, TokenBucket,
+                                QUEUED, RUNNING, PAUSED, CANCELLING, CANCELLED,
+                                COMPLETED, FAILED)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the scheduler')
+        time.sleep(0.005)
+
+
+class FakeTime:
+    """Stands in for the time module; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(campaign_scheduler, 'time', fake)
+    return fake
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate(clock):
+    bucket = TokenBucket(rate=0.5, capacity=3)
+    for _ in range(3):
+        assert bucket.acquire()
+    assert clock.slept == []
+
+    assert bucket.acquire()
+    assert clock.slept == [pytest.approx(2.0)]
+
+
+def test_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 3600
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_bucket_wait_is_cut_short_by_the_stop_event(clock):
+    bucket = TokenBucket(rate=1 / 60, capacity=1)
+    assert bucket.acquire()
+    stop = threading.Event()
+    stop.set()
+    assert not bucket.acquire(stop)
+
+
+def test_campaigns_on_one_account_share_its_bucket():
+    scheduler = CampaignScheduler(lambda campaign: None, rate_per_minute=60)
+    first = scheduler.submit('a', 'a.xlsx', account='one')
+    second = scheduler.submit('b', 'b.xlsx', account='one')
+    other = scheduler.submit('c', 'c.xlsx', account='two')
+    assert first.bucket is second.bucket
+    assert other.bucket is not first.bucket
+
+
+class Sender:
+    """Runner that sends until released, recording every state change."""
+
+    def __init__(self):
+        self.sent = []
+        self.release = threading.Event()
+        self.states = []
+
+    def run(self, campaign):
+        while not self.release.is_set():
+            if not campaign.wait_turn():
+                return
+            self.sent.append(campaign.id)
+            self.release.wait(0.005)
+
+    def scheduler(self, **kwargs):
+        kwargs.setdefault('rate_per_minute', 60000)
+        kwargs.setdefault('burst', 1000)
+        return CampaignScheduler(
+            self.run, on_state_change=lambda c: self.states.append((c.id, c.state)),
+            **kwargs)
+
+
+def test_campaign_runs_to_completion():
+    sender = Sender()
+    scheduler = sender.scheduler()
+    campaign = scheduler.submit('a', 'a.xlsx')
+    wait_for(lambda: sender.sent)
+    assert campaign.state == RUNNING
+    sender.release.set()
+    wait_for(lambda: campaign.state == COMPLETED)
+    assert campaign.finished_at is not None
+    wait_for(lambda: len(sender.states) == 2)
+    assert sender.states == [('a', RUNNING), ('a', COMPLETED)]
+
+
+def test_pause_stops_sends_until_resumed():
+    sender = Sender()
+    scheduler = sender.scheduler()
+    campaign = scheduler.submit('a', 'a.xlsx')
+    wait_for(lambda: sender.sent)
+
+    scheduler.pause('a')
+    assert campaign.state == PAUSED
+    with pytest.raises(CampaignError):
+        scheduler.pause('a')
+    time.sleep(0.05)
+    sent = len(sender.sent)
+    time.sleep(0.05)
+    assert len(sender.sent) == sent
+
+    scheduler.resume('a')
+    assert campaign.state == RUNNING
+    wait_for(lambda: len(sender.sent) > sent)
+    with pytest.raises(CampaignError):
+        scheduler.resume('a')
+    sender.release.set()
+    wait_for(lambda: campaign.state == COMPLETED)
+
+
+def test_cancelled_campaign_is_cancelling_until_its_runner_returns():
+    finish = threading.Event()
+
+    def runner(campaign):
+        while campaign.wait_turn():
+            time.sleep(0.005)
+        # Still finishing its current row
+        finish.wait(5)
+
+    scheduler = CampaignScheduler(runner, rate_per_minute=60000, burst=1000)
+    campaign = scheduler.submit('a', 'a.xlsx')
+    wait_for(lambda: campaign.state == RUNNING)
+
+    scheduler.cancel('a')
+    assert campaign.state == CANCELLING
+    with pytest.raises(CampaignError):
+        scheduler.cancel('a')
+    # Still active, so it can't be started again yet
+    with pytest.raises(CampaignError):
+        scheduler.submit('a', 'a.xlsx')
+
+    finish.set()
+    wait_for(lambda: campaign.state == CANCELLED)
+    assert scheduler.submit('a', 'a.xlsx').state in (QUEUED, RUNNING)
+
+
+def test_cancelling_a_paused_campaign_wakes_it_to_stop():
+    sender = Sender()
+    scheduler = sender.scheduler()
+    campaign = scheduler.submit('a', 'a.xlsx')
+    wait_for(lambda: sender.sent)
+    scheduler.pause('a')
+    scheduler.cancel('a')
+    wait_for(lambda: campaign.state == CANCELLED)
+    assert ('a', CANCELLING) in sender.states
+
+
+def test_queued_campaign_is_cancelled_without_running():
+    sender = Sender()
+    scheduler = sender.scheduler(max_workers=1)
+    running = scheduler.submit('a', 'a.xlsx')
+    queued = scheduler.submit('b', 'b.xlsx')
+    wait_for(lambda: running.state == RUNNING)
+    assert queued.state == QUEUED
+
+    scheduler.cancel('b')
+    assert queued.state == CANCELLED
+    assert queued.finished_at is not None
+    sender.release.set()
+    wait_for(lambda: running.state == COMPLETED)
+    scheduler._queue.join()
+    assert 'b' not in sender.sent
+    assert queued.started_at is None
+
+
+def test_campaign_paused_while_queued_starts_paused():
+    release = threading.Event()
+    sent = []
+
+    def runner(campaign):
+        if campaign.id == 'a':
+            release.wait(5)
+        if campaign.wait_turn():
+            sent.append(campaign.id)
+
+    scheduler = CampaignScheduler(runner, max_workers=1, rate_per_minute=60000, burst=1000)
+    running = scheduler.submit('a', 'a.xlsx')
+    queued = scheduler.submit('b', 'b.xlsx')
+    scheduler.pause('b')
+    release.set()
+    wait_for(lambda: running.state == COMPLETED)
+    wait_for(lambda: queued.started_at is not None)
+    assert queued.state == PAUSED
+    time.sleep(0.02)
+    assert sent == ['a']
+
+    scheduler.resume('b')
+    wait_for(lambda: queued.state == COMPLETED)
+    assert sent == ['a', 'b']
+
+
+def test_runner_errors_fail_the_campaign():
+    def runner(campaign):
+        raise RuntimeError('bot went away')
+
+    scheduler = CampaignScheduler(runner)
+    campaign = scheduler.submit('a', 'a.xlsx')
+    wait_for(lambda: campaign.state == FAILED)
+    assert campaign.error == 'bot went away'
+    with pytest.raises(CampaignError):
+        scheduler.cancel('a')
+
+
+def test_unknown_campaigns_are_errors():
+    scheduler = CampaignScheduler(lambda campaign: None)
+    with pytest.raises(CampaignError):
+        scheduler.get('missing')
+    with pytest.raises(CampaignError):
+        scheduler.cancel('missing')
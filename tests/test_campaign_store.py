@@ -0,0 +1,105 @@
+"""Seeding, outcomes and counters of a campaign store."""
+import openpyxl
+import pytest
+
+from campaign_store import CampaignStore
+from excel_io import (iter_contact_rows, STATUS_SUCCESS, STATUS_FAIL, STATUS_SUPPRESSED,
+                      STATUS_INVALID_NUMBER, STATUS_DUPLICATE)
+from phone_numbers import DUPLICATE, INVALID_CHARACTERS
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / 'contacts.xlsx'
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Name', 'Phone', 'Status'])
+    sheet.append(['Ana', '+52 55 1234 5678', None])
+    sheet.append(['Ben', 5215512345678, None])          # Ana's number again
+    sheet.append(['Cy', 'n/a', None])
+    sheet.append(['Dee', '+44 20 7946 0958', 'Success'])  # sent in an earlier run
+    sheet.append(['Eve', '+52 55 8765 4321', None])
+    sheet.append(['Fay', None, None])
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def store(workbook, tmp_path):
+    store = CampaignStore(workbook, state_folder=str(tmp_path / 'state'))
+    yield store
+    store.close()
+
+
+def test_seeding_settles_numbers_that_cant_be_sent(store):
+    store.seed()
+    assert store.pending_rows() == [(2, 'Ana', '+525512345678'), (6, 'Eve', '+525587654321')]
+    assert store.rejection_reasons() == {DUPLICATE: 1, INVALID_CHARACTERS: 1}
+    progress = store.progress()
+    # The empty row isn't a contact
+    assert progress['total_numbers'] == 5
+    assert progress['processed_numbers'] == 3
+    assert progress['success_count'] == 1
+    assert progress['duplicate_count'] == 1
+    assert progress['invalid_count'] == 1
+    assert progress['progress_percentage'] == pytest.approx(60)
+
+
+def test_seeding_settles_suppressed_numbers(store):
+    store.seed(suppression_reason=lambda number: 'opted_out' if number == '+525587654321' else None)
+    assert store.pending_rows() == [(2, 'Ana', '+525512345678')]
+    assert store.progress()['suppressed_count'] == 1
+    assert store.rejection_reasons()['opted_out'] == 1
+
+
+def test_seed_runs_once(store):
+    store.seed()
+    store.record_outcome(2, STATUS_SUCCESS)
+    store.seed()
+    assert store.pending_rows() == [(6, 'Eve', '+525587654321')]
+
+
+def test_outcomes_update_the_counters(store):
+    store.seed()
+    store.record_outcome(2, STATUS_FAIL, cache_misses=1)
+    progress = store.progress()
+    assert progress['processed_numbers'] == 4
+    assert progress['fail_count'] == 1
+    assert progress['cache_hit_rate'] == 0
+
+    # A retry moves the row between counters without counting it twice
+    store.record_outcome(2, STATUS_SUCCESS, cache_hits=1)
+    progress = store.progress()
+    assert progress['processed_numbers'] == 4
+    assert progress['fail_count'] == 0
+    assert progress['success_count'] == 2
+    assert progress['cache_hit_rate'] == pytest.approx(0.5)
+
+
+def test_materialize_writes_statuses_only_when_they_changed(store, workbook):
+    store.seed()
+    # Rejected rows are written back even before anything is sent
+    assert store.materialize(blocking=True)
+    assert not store.materialize(blocking=True)
+
+    store.record_outcome(2, STATUS_SUCCESS)
+    store.add_counters(cache_hits=1)
+    assert store.materialize(blocking=True)
+    statuses = {row: status for row, _, _, status in iter_contact_rows(workbook)}
+    assert statuses[2] == 'success'
+    assert statuses[3] == STATUS_DUPLICATE
+    assert statuses[4] == STATUS_INVALID_NUMBER
+    assert statuses[6] == ''
+    assert STATUS_SUPPRESSED not in statuses.values()
+
+
+def test_state_survives_reopening(store, workbook, tmp_path):
+    store.seed()
+    store.record_outcome(6, STATUS_SUCCESS)
+    reopened = CampaignStore(workbook, state_folder=str(tmp_path / 'state'))
+    try:
+        reopened.seed()
+        assert reopened.pending_rows() == [(2, 'Ana', '+525512345678')]
+        assert reopened.progress()['success_count'] == 2
+    finally:
+        reopened.close()
@@ -0,0 +1,120 @@
+"""ETags, 304s and Cache-Control of the dashboard's image and QR code routes."""
+import os
+import uuid
+
+import pytest
+
+from http_cache import IMAGE_CACHE_MAX_AGE
+
+POLLS = 20
+
+
+@pytest.fixture
+def image_name(dashboard, tmp_path):
+    name = f'{uuid.uuid4()}.jpg'
+    (tmp_path / 'pics' / name).write_bytes(os.urandom(4096))
+    return name
+
+
+@pytest.fixture
+def qr_code(dashboard, tmp_path):
+    path = tmp_path / 'qr_code.png'
+    path.write_bytes(os.urandom(1024))
+    return path
+
+
+def poll(client, url, times):
+    """Bytes of body sent over ``times`` requests that reuse the last ETag."""
+    sent = 0
+    etag = None
+    for _ in range(times):
+        headers = {'If-None-Match': etag} if etag else {}
+        response = client.get(url, headers=headers)
+        assert response.status_code in (200, 304)
+        sent += len(response.get_data())
+        etag = response.headers.get('ETag', etag)
+    return sent
+
+
+def test_routes_need_a_login(anonymous_client, image_name, qr_code):
+    assert anonymous_client.get(f'/pics/{image_name}').status_code == 302
+    assert anonymous_client.get('/get_qr_code').status_code == 302
+
+
+def test_uuid_named_images_are_immutable_and_revalidate_to_304(client, image_name):
+    response = client.get(f'/pics/{image_name}')
+    assert response.status_code == 200
+    assert len(response.get_data()) == 4096
+    cache_control = response.headers['Cache-Control']
+    assert 'private' in cache_control
+    assert 'immutable' in cache_control
+    assert f'max-age={IMAGE_CACHE_MAX_AGE}' in cache_control
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    revalidated = client.get(f'/pics/{image_name}', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+
+
+def test_uuid_named_thumbnails_are_immutable(client, tmp_path, image_name):
+    (tmp_path / 'pics' / 'thumbs').mkdir()
+    (tmp_path / 'pics' / 'thumbs' / image_name).write_bytes(os.urandom(512))
+    response = client.get(f'/pics/thumbs/{image_name}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+@pytest.mark.parametrize('name', ['logo.png', 'c9bf9e57-1685-4c89-bafb-ff5af830be8a_old.jpg'])
+def test_other_files_in_pics_must_be_revalidated(client, tmp_path, name):
+    (tmp_path / 'pics' / name).write_bytes(os.urandom(256))
+    response = client.get(f'/pics/{name}')
+    assert response.status_code == 200
+    cache_control = response.headers['Cache-Control']
+    assert 'immutable' not in cache_control
+    assert 'no-cache' in cache_control
+    assert 'max-age=0' in cache_control
+    etag = response.headers['ETag']
+    assert client.get(f'/pics/{name}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_qr_code_must_be_revalidated(client, qr_code):
+    response = client.get('/get_qr_code')
+    assert response.status_code == 200
+    cache_control = response.headers['Cache-Control']
+    assert 'no-cache' in cache_control
+    assert 'max-age=0' in cache_control
+    assert 'immutable' not in cache_control
+    etag = response.headers['ETag']
+
+    assert client.get('/get_qr_code', headers={'If-None-Match': etag}).status_code == 304
+
+    # A rewritten QR code gets a new ETag and is sent again
+    stat = qr_code.stat()
+    qr_code.write_bytes(os.urandom(2048))
+    os.utime(qr_code, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    changed = client.get('/get_qr_code', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(changed.get_data()) == 2048
+
+
+def test_range_requests_return_the_requested_bytes(client, image_name):
+    response = client.get(f'/pics/{image_name}', headers={'Range': 'bytes=0-1023'})
+    assert response.status_code == 206
+    assert len(response.get_data()) == 1024
+    assert response.headers['Content-Range'] == 'bytes 0-1023/4096'
+
+
+def test_repeated_polls_send_each_body_once(client, image_name, qr_code):
+    uncached = POLLS * (4096 + 1024)
+    sent = poll(client, f'/pics/{image_name}', POLLS) + poll(client, '/get_qr_code', POLLS)
+    print(f'{POLLS} polls of an image and the QR code: {sent} bytes sent, '
+          f'{uncached} without validators')
+    assert sent == 4096 + 1024
+
+    # A new QR code costs one more full body, then 304s again
+    stat = qr_code.stat()
+    qr_code.write_bytes(os.urandom(1024))
+    os.utime(qr_code, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert poll(client, '/get_qr_code', POLLS) == 1024
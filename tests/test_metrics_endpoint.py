@@ -0,0 +1,38 @@
+"""Who may scrape /metrics."""
+import pytest
+
+
+@pytest.fixture
+def metrics_config(dashboard, monkeypatch):
+    def configure(token='', public=False):
+        monkeypatch.setattr(dashboard, 'METRICS_TOKEN', token)
+        monkeypatch.setattr(dashboard, 'METRICS_PUBLIC', public)
+    return configure
+
+
+def test_closed_by_default(anonymous_client, metrics_config):
+    metrics_config()
+    assert anonymous_client.get('/metrics').status_code == 401
+    # An empty token doesn't match an empty bearer
+    assert anonymous_client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+
+
+def test_logged_in_sessions_may_read_it(client, metrics_config):
+    metrics_config()
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'dashboard_http_requests_total' in response.get_data()
+
+
+def test_scrapers_need_the_token(anonymous_client, metrics_config):
+    metrics_config(token='scrape-me')
+    assert anonymous_client.get('/metrics').status_code == 401
+    assert anonymous_client.get(
+        '/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert anonymous_client.get(
+        '/metrics', headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+
+
+def test_public_scraping_is_an_explicit_opt_in(anonymous_client, metrics_config):
+    metrics_config(public=True)
+    assert anonymous_client.get('/metrics').status_code == 200
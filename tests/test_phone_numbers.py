@@ -0,0 +1,81 @@
+"""Accept and reject cases of the phone number normaliser."""
+import pytest
+
+from phone_numbers import (PhoneNormalizer, canonical_number, normalize_numbers,
+                           whatsapp_number, DUPLICATE, EMPTY, INVALID_CHARACTERS,
+                           INVALID_COUNTRY_CODE, MISSING_COUNTRY_CODE, TOO_LONG,
+                           TOO_SHORT)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('+52 55 1234-5678', '+525512345678'),
+    ('0052 (55) 1234.5678', '+525512345678'),
+    ('  +44 20 7946 0958\n', '+442079460958'),
+    # Numeric cells, as openpyxl returns them and as their text
+    (5215512345678, '+525512345678'),
+    (525512345678.0, '+525512345678'),
+    ('525512345678.0', '+525512345678'),
+    ('5.25512345678e+11', '+525512345678'),
+    # Mexican mobiles drop the legacy 1 after the country code
+    ('+52 1 55 1234 5678', '+525512345678'),
+])
+def test_accepts_common_formats(value, expected):
+    assert canonical_number(value, '') == (expected, None)
+
+
+@pytest.mark.parametrize('value', [
+    '4930123456',      # German number without the +
+    '6591234567',      # Singapore
+    91234567,          # 8 digits, as a numeric cell
+    '91234567',
+    4722334455,        # Norway
+])
+def test_bare_digits_keep_the_original_length_rule_without_a_country_code(value):
+    number, reason = canonical_number(value, '')
+    assert reason is None
+    assert number == f'+{value}'
+
+
+def test_formatted_national_number_needs_a_country_code():
+    assert canonical_number('(55) 1234 5678', '') == (None, MISSING_COUNTRY_CODE)
+    assert canonical_number('(55) 1234 5678', '52') == ('+525512345678', None)
+    # Bare national digits get the default country code too
+    assert canonical_number('5512345678', '52') == ('+525512345678', None)
+
+
+@pytest.mark.parametrize('value, reason', [
+    (None, EMPTY),
+    ('', EMPTY),
+    ('  ', EMPTY),
+    ('+', EMPTY),
+    ('n/a', INVALID_CHARACTERS),
+    ('٥٥١٢٣٤٥٦٧٨٩', INVALID_CHARACTERS),   # Arabic-Indic digits
+    (5215512345678.5, INVALID_CHARACTERS),
+    ('+0123456789', INVALID_COUNTRY_CODE),
+    ('1234567', TOO_SHORT),
+    ('+1234567', TOO_SHORT),
+    ('+1234567890123456', TOO_LONG),
+])
+def test_rejection_reasons(value, reason):
+    assert canonical_number(value, '') == (None, reason)
+
+
+def test_repeats_are_duplicates_across_batches():
+    normalizer = PhoneNormalizer('52')
+    numbers, reasons = normalizer.normalize(['+52 55 1234 5678', 'n/a', 5215512345678])
+    assert numbers == ['+525512345678', None, None]
+    assert reasons == [None, INVALID_CHARACTERS, DUPLICATE]
+
+    numbers, reasons = normalizer.normalize(['55 1234 5678', '55 8765 4321'])
+    assert numbers == [None, '+525587654321']
+    assert reasons == [DUPLICATE, None]
+
+
+def test_rejected_cells_are_not_duplicates_of_each_other():
+    assert normalize_numbers(['', '', 'x', 'x'], '')[1] == [
+        EMPTY, EMPTY, INVALID_CHARACTERS, INVALID_CHARACTERS]
+
+
+def test_whatsapp_number_keeps_the_mexican_mobile_1():
+    assert whatsapp_number('+525512345678') == '5215512345678'
+    assert whatsapp_number('0044 20 7946 0958') == '442079460958'
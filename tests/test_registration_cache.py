@@ -0,0 +1,21 @@
+"""Keys and expiry of the registration cache."""
+from registration_cache import RegistrationCache
+
+
+def test_formats_of_a_mexican_mobile_share_one_answer(tmp_path):
+    cache = RegistrationCache(str(tmp_path / 'registration_cache.db'))
+    cache.set('+52 55 1234 5678', True)
+    # With and without the legacy 1 WhatsApp keeps after +52
+    assert cache.get('+525512345678') is True
+    assert cache.get('5215512345678') is True
+    assert cache.get('0052 55 1234 5678') is True
+    assert cache.get('+525587654321') is None
+
+
+def test_answers_expire_after_the_ttl(tmp_path):
+    cache = RegistrationCache(str(tmp_path / 'registration_cache.db'))
+    cache.set_many({'+442079460958': False})
+    assert cache.get_many(['+442079460958']) == {'+442079460958': False}
+    cache.ttl_seconds = -1
+    assert cache.get('+442079460958') is None
+    assert cache.purge_expired() == 1
@@ -0,0 +1,90 @@
+"""Lookups in the suppression index."""
+import json
+
+import pytest
+
+from ignore_list import IgnoreListStore
+from suppression import (SuppressionIndex, suppression_key, IGNORED, OPTED_OUT,
+                         RECENTLY_CONTACTED)
+
+
+@pytest.fixture
+def ignore_list(tmp_path):
+    path = tmp_path / 'ignore_list.json'
+    path.write_text(json.dumps(['5215512345678']))
+    return IgnoreListStore(str(path))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'suppression.db')
+
+
+def test_keys_keep_leading_zeros():
+    assert suppression_key('0442079460958') == '0442079460958'
+    assert suppression_key('0442079460958') != suppression_key('442079460958')
+    # 00 is the international prefix, so these are the same number
+    assert suppression_key('0044 20 7946 0958') == '442079460958'
+    assert suppression_key('+52 55 1234 5678') == '5215512345678'
+    assert suppression_key('n/a') is None
+
+
+def test_leading_zero_opt_out_does_not_suppress_another_number(ignore_list, db_path):
+    index = SuppressionIndex(ignore_list, db_path)
+    index.add_opt_out('0442079460958')
+    assert index.reason('0442079460958') == OPTED_OUT
+    assert index.reason('442079460958') is None
+
+    # Still distinct once loaded back from the database
+    index = SuppressionIndex(ignore_list, db_path)
+    assert index.reason('0442079460958') == OPTED_OUT
+    assert index.reason('442079460958') is None
+
+
+def test_ignore_list_numbers_are_suppressed(ignore_list, db_path):
+    index = SuppressionIndex(ignore_list, db_path)
+    # Any format of the number matches the bot's chat ID digits
+    assert index.reason('+52 55 1234 5678') == IGNORED
+    assert '+525512345678' in index
+    assert '+525587654321' not in index
+
+
+def test_ignore_list_deltas_are_followed(ignore_list, db_path):
+    index = SuppressionIndex(ignore_list, db_path)
+    ignore_list.on_change = lambda delta: index.catch_up()
+    ignore_list.apply(added=['5215587654321'], removed=['5215512345678'])
+    assert index.reason('+525587654321') == IGNORED
+    assert index.reason('+525512345678') is None
+
+
+def test_opt_outs_persist_and_can_be_removed(ignore_list, db_path):
+    index = SuppressionIndex(ignore_list, db_path)
+    assert index.add_opt_out('+44 20 7946 0958')
+    assert not index.add_opt_out('')
+    assert index.reason('442079460958') == OPTED_OUT
+
+    index = SuppressionIndex(ignore_list, db_path)
+    assert index.reason('+442079460958') == OPTED_OUT
+    assert index.remove_opt_out('+442079460958')
+    assert index.reason('+442079460958') is None
+    assert SuppressionIndex(ignore_list, db_path).reason('+442079460958') is None
+
+
+def test_contacted_numbers_are_suppressed_within_the_window(ignore_list, db_path):
+    index = SuppressionIndex(ignore_list, db_path, window_seconds=3600)
+    index.record_contacted('+442079460958')
+    assert index.reason('+442079460958') == RECENTLY_CONTACTED
+    assert SuppressionIndex(ignore_list, db_path, window_seconds=3600).reason(
+        '+442079460958') == RECENTLY_CONTACTED
+
+    # Outside the window the contact no longer counts
+    index._contacted['442079460958'] -= 7200
+    assert index.reason('+442079460958') is None
+    index.purge_expired()
+    assert index.stats()['recently_contacted'] == 0
+
+
+def test_contacts_are_not_recorded_without_a_window(ignore_list, db_path):
+    index = SuppressionIndex(ignore_list, db_path, window_seconds=0)
+    index.record_contacted('+442079460958')
+    assert index.reason('+442079460958') is None
@@ -0,0 +1,33 @@
+"""The metrics sampler starts on first use, not when the dashboard is imported."""
+import os
+import subprocess
+import sys
+
+from system_metrics import MetricsSampler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_dashboard_starts_no_sampler(tmp_path):
+    code = ('import threading, dashboard\n'
+            'print(dashboard.metrics_sampler._thread is None, '
+            "'metrics-sampler' in [t.name for t in threading.enumerate()])")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=tmp_path,
+                                     env=env, timeout=60)
+    assert output.split() == [b'True', b'False']
+
+
+def test_system_metrics_starts_the_sampler(client, dashboard, monkeypatch):
+    sampler = MetricsSampler(get_processes=lambda: {'dashboard': os.getpid()}, interval=60)
+    monkeypatch.setattr(dashboard, 'metrics_sampler', sampler)
+    try:
+        response = client.get('/system_metrics')
+        assert response.status_code == 200
+        assert sampler._thread is not None
+        # Later requests reuse the running sampler
+        thread = sampler._thread
+        client.get('/system_metrics')
+        assert sampler._thread is thread
+    finally:
+        sampler.stop()